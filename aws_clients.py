@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Punto único para obtener clientes de S3/SQS/DynamoDB/Lambda.
+
+PIPELINE_BACKEND=aws   (por defecto) clientes boto3 reales con las credenciales del .env
+PIPELINE_BACKEND=local sustitutos sin red de local_backend.py (buckets -> directorios,
+                       cola -> SQLite, tabla -> almacén clave-valor local)
+
+Con AWS real hay una única sesión por proceso y un cliente cacheado por (servicio, región,
+ajustes), así que todos los hilos comparten el mismo pool de conexiones HTTP. El pool y
+los timeouts se ajustan con variables de entorno (o por llamada, p. ej.
+get_client("s3", max_pool_connections=64)):
+
+  AWS_MAX_POOL_CONNECTIONS  conexiones por cliente (por defecto 50; botocore usa 10)
+  AWS_CONNECT_TIMEOUT       segundos (por defecto 5)
+  AWS_READ_TIMEOUT          segundos (por defecto 60)
+  AWS_TCP_KEEPALIVE         1/0 (por defecto 1)
+  AWS_RETRY_MODE            standard | adaptive | legacy (por defecto standard)
+  AWS_MAX_ATTEMPTS          intentos de botocore por llamada (por defecto 5)
+"""
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+_resources = {}
+
+def backend():
+    return os.getenv("PIPELINE_BACKEND", "aws").lower()
+
+def is_local():
+    return backend() == "local"
+
+def resources_db():
+    """Shelve antiguo con los nombres de recursos (uno por backend); state_store.py lo importa."""
+    return "local_resources.db" if is_local() else "aws_resources.db"
+
+def default_region():
+    return os.getenv("AWS_DEFAULT_REGION", "us-east-1")
+
+def client_config(**overrides):
+    """botocore Config con los ajustes de entorno; `overrides` tiene prioridad."""
+    settings = {
+        "max_pool_connections": int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50")),
+        "connect_timeout": float(os.getenv("AWS_CONNECT_TIMEOUT", "5")),
+        "read_timeout": float(os.getenv("AWS_READ_TIMEOUT", "60")),
+        "tcp_keepalive": os.getenv("AWS_TCP_KEEPALIVE", "1").lower() not in ("0", "false", "no"),
+        "retries": {
+            "mode": os.getenv("AWS_RETRY_MODE", "standard"),
+            "max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", "5")),
+        },
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+def get_session():
+    """Sesión boto3 del proceso (una por pid: tras un fork no se comparte con el padre)."""
+    pid = os.getpid()
+    with _lock:
+        session = _sessions.get(pid)
+        if session is None:
+            session = boto3.session.Session(
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                aws_session_token=os.getenv("AWS_SESSION_TOKEN"),
+                region_name=default_region(),
+            )
+            _sessions[pid] = session
+        return session
+
+def _cache_key(service, region, overrides):
+    settings = tuple(sorted((name, repr(value)) for name, value in overrides.items()))
+    return (os.getpid(), service, region or default_region(), settings)
+
+def get_client(service, region=None, **config):
+    """Cliente cacheado por (servicio, región, ajustes). Los clientes boto3 son thread-safe."""
+    if is_local():
+        import local_backend
+        return local_backend.client(service, region)
+    key = _cache_key(service, region, config)
+    client = _clients.get(key)
+    if client is None:
+        session = get_session()
+        with _lock:
+            # Crear clientes desde la misma sesión no es thread-safe: se serializa
+            client = _clients.get(key)
+            if client is None:
+                client = session.client(service, region_name=key[2], config=client_config(**config))
+                _clients[key] = client
+    return client
+
+def get_resource(service, region=None, **config):
+    """Resource cacheado por hilo (a diferencia de los clientes, los resources no son thread-safe)."""
+    if is_local():
+        import local_backend
+        return local_backend.resource(service, region)
+    key = _cache_key(service, region, config) + (threading.get_ident(),)
+    resource = _resources.get(key)
+    if resource is None:
+        session = get_session()
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = session.resource(service, region_name=key[2], config=client_config(**config))
+                _resources[key] = resource
+    return resource
+
+def reset_clients():
+    """Olvida sesiones y clientes cacheados (p. ej. tras cambiar credenciales o activar moto)."""
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
+        _resources.clear()
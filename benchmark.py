@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end del pipeline sin cuenta AWS.
+
+Genera N imágenes sintéticas (distribución configurable de tamaños y formatos), las sube
+con ImageUploader y drena la cola llamando a lambda_handler, todo contra moto (S3, SQS y
+DynamoDB en memoria) o contra los sustitutos en disco de local_backend.py (--backend local). Informa del throughput, percentiles de latencia por etapa y memoria
+pico, y guarda el resultado en JSON para comparar entre commits. La latencia por imagen del
+handler es la de cada process_image (StartedAt/FinishedAt de la traza guardada en la tabla, en ms).
+
+Uso:
+  pip install "moto[s3,sqs,dynamodb]" pillow
+  python benchmark.py --images 500 --sizes 320x240:0.6,1920x1080:0.3,4000x3000:0.1 \\
+                      --formats jpeg:0.7,png:0.2,webp:0.1 --workers 8 --batch-size 10
+  python benchmark.py --images 500 --backend local --consumers 4
+  python benchmark.py --images 500 --compare bench_results/anterior.json
+"""
+import os
+import io
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import resource
+import threading
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # sin Pillow se generan ficheros con cabecera válida y contenido aleatorio
+    Image = None
+
+from sqs_event import to_lambda_event, successful_messages
+from retry_policy import FailedItemsLog
+from worker import load_handler
+
+FORMAT_EXT = {"jpeg": ".jpg", "png": ".png", "webp": ".webp"}
+# Cabeceras mínimas para los ficheros "falsos" cuando no hay Pillow
+FORMAT_MAGIC = {
+    "jpeg": b"\xff\xd8\xff\xe0\x00\x10JFIF\x00",
+    "png": b"\x89PNG\r\n\x1a\n",
+    "webp": b"RIFF\x00\x00\x00\x00WEBPVP8 ",
+}
+
+# ---------- Estadística ----------
+def percentile(values, p):
+    """Percentil por rango más cercano (p en 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Rango más cercano: el menor valor con al menos p% de las muestras por debajo o igual
+    k = max(0, min(len(ordered) - 1, math.ceil(p * len(ordered) / 100.0) - 1))
+    return ordered[k]
+
+def summarize(values):
+    """Resumen (ms) de una lista de latencias en segundos."""
+    if not values:
+        return {"n": 0}
+    ms = [v * 1000 for v in values]
+    return {
+        "n": len(ms),
+        "mean": round(sum(ms) / len(ms), 3),
+        "p50": round(percentile(ms, 50), 3),
+        "p90": round(percentile(ms, 90), 3),
+        "p99": round(percentile(ms, 99), 3),
+        "max": round(max(ms), 3),
+    }
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB, macOS en bytes
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+# ---------- Imágenes sintéticas ----------
+def parse_distribution(spec, parse_value=str):
+    """'a:0.6,b:0.4' -> [(a, 0.6), (b, 0.4)]"""
+    dist = []
+    for part in spec.split(","):
+        value, _, weight = part.strip().rpartition(":")
+        if not value:
+            value, weight = weight, "1"
+        dist.append((parse_value(value), float(weight)))
+    return dist
+
+def parse_size(value):
+    w, h = value.lower().split("x")
+    return int(w), int(h)
+
+def synthetic_image_bytes(width, height, fmt, rng):
+    if Image is not None:
+        noise = Image.effect_noise((width, height), 48)
+        gradient = Image.linear_gradient("L").resize((width, height))
+        img = Image.merge("RGB", (noise, gradient, noise.transpose(Image.FLIP_LEFT_RIGHT)))
+        buf = io.BytesIO()
+        img.save(buf, format=fmt.upper(), **({"quality": 85} if fmt in ("jpeg", "webp") else {}))
+        return buf.getvalue()
+    # Aproximación del tamaño comprimido: ~1/8 de los bytes RGB
+    size = max(256, width * height * 3 // 8)
+    return FORMAT_MAGIC[fmt] + rng.randbytes(size - len(FORMAT_MAGIC[fmt]))
+
+def generate_images(folder, count, sizes, formats, seed=42):
+    """Escribe `count` imágenes en `folder`; devuelve la lista de (nombre, bytes)."""
+    rng = random.Random(seed)
+    size_values, size_weights = zip(*sizes)
+    fmt_values, fmt_weights = zip(*formats)
+    generated = []
+    cache = {}
+    for i in range(count):
+        width, height = rng.choices(size_values, size_weights)[0]
+        fmt = rng.choices(fmt_values, fmt_weights)[0]
+        # Con Pillow, reutilizamos una imagen por (tamaño, formato): generar ruido es caro
+        cache_key = (width, height, fmt)
+        if cache_key not in cache or Image is None:
+            cache[cache_key] = synthetic_image_bytes(width, height, fmt, rng)
+        name = f"synthetic-{i:06d}-{width}x{height}{FORMAT_EXT[fmt]}"
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(cache[cache_key])
+        generated.append((name, len(cache[cache_key])))
+    return generated
+
+# ---------- Entorno local (moto o local_backend) ----------
+def start_local(root):
+    """Sustitutos en disco bajo `root`; se activan antes de importar setup/lambda_function."""
+    os.environ["PIPELINE_BACKEND"] = "local"
+    os.environ["LOCAL_AWS_DIR"] = root
+
+def start_moto():
+    try:
+        from moto import mock_aws
+    except ImportError:
+        raise SystemExit('Falta moto: pip install "moto[s3,sqs,dynamodb]"')
+    # Credenciales ficticias: nada sale de este proceso
+    for var, value in (("AWS_ACCESS_KEY_ID", "testing"), ("AWS_SECRET_ACCESS_KEY", "testing"),
+                       ("AWS_SESSION_TOKEN", "testing"), ("AWS_DEFAULT_REGION", "us-east-1")):
+        os.environ[var] = value
+    mock = mock_aws()
+    mock.start()
+    return mock
+
+def provision(suffix):
+    """Crea buckets, cola y tabla reutilizando las funciones de setup.py."""
+    import setup
+    images_bucket = f"{setup.IMAGES_BASE}-{suffix}"
+    thumbs_bucket = f"{setup.THUMBS_BASE}-{suffix}"
+    setup.ensure_bucket(images_bucket)
+    setup.ensure_bucket(thumbs_bucket)
+    queue_url, queue_arn = setup.ensure_queue(f"{setup.QUEUE_BASE}-{suffix}")
+    setup.ensure_table(setup.TABLE_NAME)
+    return {
+        "images_bucket": images_bucket,
+        "thumbs_bucket": thumbs_bucket,
+        "queue_url": queue_url,
+        "queue_arn": queue_arn,
+        "table": setup.TABLE_NAME,
+    }
+
+# ---------- Etapas ----------
+def run_upload(sqs, s3, queue_url, bucket, folder, workers, keys_per_message):
+    from upload_folder_images import ImageUploader
+
+    latencies = []
+    lock = threading.Lock()
+
+    class TimedUploader(ImageUploader):
+        def process_item(self, item):
+            start = time.perf_counter()
+            super().process_item(item)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    uploader = TimedUploader(
+        s3, sqs, queue_url,
+        max_workers=workers,
+        keys_per_message=keys_per_message,
+        failed_log=FailedItemsLog(os.path.join(folder, "failed_uploads.jsonl")),
+    )
+    start = time.perf_counter()
+    ok, failed = uploader.upload_folder_images(bucket, folder)
+    return time.perf_counter() - start, ok, failed, latencies
+
+def run_consumers(sqs, queue_url, queue_arn, handler, batch_size, consumers):
+    """Drena la cola como lo haría el event source mapping: lotes de `batch_size`."""
+    batch_latencies = []
+    counters = {"images": 0, "failed_messages": 0}
+    lock = threading.Lock()
+
+    def consume():
+        while True:
+            resp = sqs.receive_message(
+                QueueUrl=queue_url,
+                MaxNumberOfMessages=min(batch_size, 10),
+                AttributeNames=["All"],
+                MessageAttributeNames=["All"],
+            )
+            messages = resp.get("Messages", [])
+            if not messages:
+                return
+            start = time.perf_counter()
+            result = handler(to_lambda_event(messages, queue_arn, "us-east-1"), None)
+            elapsed = time.perf_counter() - start
+            done = successful_messages(messages, result)
+            if done:
+                sqs.delete_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(done)],
+                )
+            processed = json.loads(result["body"]).get("processed", len(messages))
+            with lock:
+                batch_latencies.append(elapsed)
+                counters["images"] += processed
+                counters["failed_messages"] += len(messages) - len(done)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=consumers) as pool:
+        for future in [pool.submit(consume) for _ in range(consumers)]:
+            future.result()
+    return time.perf_counter() - start, counters, batch_latencies
+
+def processing_latencies(table_name):
+    """Duración real de cada imagen: StartedAt -> FinishedAt de la traza que process_image guarda en la tabla."""
+    from latency_report import scan_traces, spans
+
+    latencies = []
+    for item in scan_traces(table_name):
+        ms = spans(item["Trace"]).get("processing")
+        if ms is not None:
+            latencies.append(ms / 1000)
+    return latencies
+
+# ---------- Resultados ----------
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\n=== Comparación con {previous_path} ({previous['meta'].get('commit')}) ===")
+    for name in ("upload_images_per_s", "process_images_per_s", "end_to_end_images_per_s"):
+        old, new = previous["throughput"].get(name), current["throughput"].get(name)
+        if old and new:
+            print(f"{name:26}: {old:10.1f} -> {new:10.1f}  ({(new - old) / old * 100:+.1f}%)")
+    for stage, stats in current["latency_ms"].items():
+        old = previous["latency_ms"].get(stage, {})
+        if old.get("p50") and stats.get("p50"):
+            print(f"{stage + ' p50/p99 (ms)':26}: {old['p50']:.1f}/{old['p99']:.1f} -> {stats['p50']:.1f}/{stats['p99']:.1f}")
+    old_mem, new_mem = previous["memory"].get("peak_rss_mb"), current["memory"].get("peak_rss_mb")
+    print(f"{'peak RSS (MB)':26}: {old_mem} -> {new_mem}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end del pipeline contra moto.")
+    parser.add_argument("--images", type=int, default=200, help="Número de imágenes sintéticas")
+    parser.add_argument("--sizes", default="320x240:0.6,1280x720:0.3,3000x2000:0.1",
+                        help="Distribución de tamaños WxH:peso (por defecto: %(default)s)")
+    parser.add_argument("--formats", default="jpeg:0.7,png:0.2,webp:0.1",
+                        help="Distribución de formatos (jpeg/png/webp):peso (por defecto: %(default)s)")
+    parser.add_argument("--backend", choices=("moto", "local"), default="moto",
+                        help="moto (en memoria) o local (disco + SQLite, ver local_backend.py)")
+    parser.add_argument("--workers", type=int, default=8, help="Hilos del uploader")
+    parser.add_argument("--keys-per-message", type=int, default=1, help="Claves por mensaje SQS")
+    parser.add_argument("--batch-size", type=int, default=10, help="Mensajes por invocación del handler")
+    parser.add_argument("--consumers", type=int, default=1, help="Invocaciones concurrentes del handler")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Medir también el pico de memoria Python con tracemalloc (más lento)")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar los logs por imagen")
+    parser.add_argument("--output", help="Fichero JSON de resultados (por defecto: bench_results/<fecha>-<commit>.json)")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior con el que comparar")
+    args = parser.parse_args()
+
+    sizes = parse_distribution(args.sizes, parse_size)
+    formats = parse_distribution(args.formats)
+    unknown = [fmt for fmt, _ in formats if fmt not in FORMAT_EXT]
+    if unknown:
+        parser.error(f"Formatos no soportados: {unknown}")
+
+    folder = tempfile.mkdtemp(prefix="bench-images-")
+    local_root = tempfile.mkdtemp(prefix="bench-local-aws-") if args.backend == "local" else None
+    mock = start_moto() if args.backend == "moto" else start_local(local_root)
+    try:
+        print(f"[Bench] Generando {args.images} imágenes en {folder} (Pillow: {'sí' if Image else 'no'})")
+        generated = generate_images(folder, args.images, sizes, formats, args.seed)
+        total_bytes = sum(size for _, size in generated)
+
+        from aws_clients import get_client
+        resources = provision("bench")
+        handler = load_handler(resources["thumbs_bucket"], resources["table"])
+        s3 = get_client("s3")
+        sqs = get_client("sqs")
+
+        if args.tracemalloc:
+            tracemalloc.start()
+        # Los prints por imagen del uploader y del handler se descartan salvo con --verbose
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            upload_s, ok, failed, upload_lat = run_upload(
+                sqs, s3, resources["queue_url"], resources["images_bucket"], folder,
+                args.workers, args.keys_per_message,
+            )
+            process_s, counters, batch_lat = run_consumers(
+                sqs, resources["queue_url"], resources["queue_arn"], handler, args.batch_size, args.consumers,
+            )
+        traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+        image_lat = processing_latencies(resources["table"])
+    finally:
+        if mock:
+            mock.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+        if local_root:
+            shutil.rmtree(local_root, ignore_errors=True)
+
+    total_s = upload_s + process_s
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "pillow": Image is not None,
+            "params": vars(args),
+        },
+        "dataset": {"images": len(generated), "bytes": total_bytes},
+        "results": {
+            "uploaded": ok,
+            "upload_failed": failed,
+            "processed": counters["images"],
+            "failed_messages": counters["failed_messages"],
+        },
+        "throughput": {
+            "upload_images_per_s": round(ok / upload_s, 2) if upload_s else None,
+            "upload_mb_per_s": round(total_bytes / (1024 * 1024) / upload_s, 2) if upload_s else None,
+            "process_images_per_s": round(counters["images"] / process_s, 2) if process_s else None,
+            "end_to_end_images_per_s": round(counters["images"] / total_s, 2) if total_s else None,
+        },
+        "latency_ms": {
+            "upload_per_image": summarize(upload_lat),
+            "handler_per_batch": summarize(batch_lat),
+            "handler_per_image": summarize(image_lat),
+        },
+        "memory": {
+            "peak_rss_mb": peak_rss_mb(),
+            "tracemalloc_peak_mb": round(traced_peak / (1024 * 1024), 1) if traced_peak else None,
+        },
+    }
+
+    output = args.output or os.path.join(
+        "bench_results", f"{time.strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print("\n=== RESULTADOS ===")
+    print(json.dumps({k: result[k] for k in ("results", "throughput", "latency_ms", "memory")}, indent=2))
+    print(f"Guardado en {output}")
+    if args.compare:
+        compare(result, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Cabeceras de caché y compresión de lo que se publica en el bucket de thumbnails (página,
+manifiesto, thumbnails y renditions). Una sola tabla de reglas para setup.py,
+setup_scripts/deploy_static_site.py y gallery_manifest.py; la Lambda repite las suyas porque
+el ZIP sólo lleva lambda_function.py.
+
+- Inmutable (un año): objetos cuya URL cambia cuando cambia el contenido. Los shards del
+  manifiesto, las hojas de sprites y los datos de búsqueda llevan el hash en el nombre y los
+  deltas no se reescriben nunca.
+- TTL corto: todo lo que se reescribe en el mismo nombre. index.html, sw.js y los índices
+  (manifest/, sprites/ y search/index.json), y también thumbnails, renditions y teselas Deep
+  Zoom (tiles/), que la Lambda vuelve a escribir al reprocesar una imagen. S3 no distingue
+  la query string, así que aunque la página los pida con ?v=<ETag> la cabecera vale también
+  para la URL sin versión (el enlace de DynamoDB, uno copiado a mano...). Las versionadas sí
+  se guardan para siempre en el service worker.
+- HTML y JSON se suben ya comprimidos (Content-Encoding). S3 no negocia Accept-Encoding,
+  así que cada objeto tiene una sola codificación: gzip, que aceptan todos los navegadores.
+  Brotli (paquete opcional `brotli`) sólo sirve detrás de HTTPS, p. ej. CloudFront: los
+  navegadores no lo anuncian sobre HTTP, que es lo único que da el endpoint website de S3.
+"""
+import os
+import gzip
+import mimetypes
+
+try:
+    import brotli
+except ImportError:  # opcional: sin él sólo hay gzip
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+SHORT_TTL = "public, max-age=60, stale-while-revalidate=300"
+
+# Prefijos cuyo contenido nunca cambia bajo la misma URL
+IMMUTABLE_PREFIXES = ("manifest/shards/", "manifest/deltas/", "sprites/sheets/", "search/data/")
+
+COMPRESSIBLE_TYPES = ("text/html", "text/css", "application/json", "application/javascript", "text/javascript",
+                      "image/svg+xml")
+GZIP = "gzip"
+BROTLI = "br"
+IDENTITY = "identity"
+ENCODINGS = (GZIP, BROTLI, IDENTITY)
+
+
+def cache_control(key):
+    return IMMUTABLE if key.startswith(IMMUTABLE_PREFIXES) else SHORT_TTL
+
+
+def content_type(key):
+    guessed = mimetypes.guess_type(key)[0] or "application/octet-stream"
+    return f"{guessed}; charset=utf-8" if guessed.startswith("text/") else guessed
+
+
+def resolve_encoding(encoding):
+    if encoding == BROTLI and brotli is None:
+        print("[Cache] El paquete 'brotli' no está instalado: se usa gzip")
+        return GZIP
+    return encoding
+
+
+def compress(body, encoding):
+    if encoding == GZIP:
+        # mtime=0: la misma entrada produce los mismos bytes (y el mismo ETag)
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == BROTLI:
+        return brotli.compress(body, quality=11)
+    return body
+
+
+def decode_body(response):
+    """Cuerpo de un get_object ya descomprimido según su Content-Encoding."""
+    body = response["Body"].read()
+    encoding = response.get("ContentEncoding")
+    if encoding == GZIP:
+        return gzip.decompress(body)
+    if encoding == BROTLI:
+        return brotli.decompress(body)
+    return body
+
+
+def put_asset(s3, bucket, key, body, encoding=GZIP, mime=None, compressible=None):
+    """
+    Sube `body` con su Content-Type, Cache-Control según la clave y, si es texto/JSON (o
+    `compressible`) y sale a cuenta, comprimido. Devuelve los bytes subidos.
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    kwargs = {
+        "ContentType": mime or content_type(key),
+        "CacheControl": cache_control(key),
+    }
+    encoding = resolve_encoding(encoding)
+    if compressible is None:
+        compressible = kwargs["ContentType"].split(";")[0] in COMPRESSIBLE_TYPES
+    if encoding != IDENTITY and compressible:
+        packed = compress(body, encoding)
+        if len(packed) < len(body):
+            body = packed
+            kwargs["ContentEncoding"] = encoding
+    s3.put_object(Bucket=bucket, Key=key, Body=body, **kwargs)
+    return body
+
+
+# Ficheros de s3_static_website/ que se publican; sw.js antes que la página que lo registra
+SITE_FILES = ("sw.js", "index.html")
+
+
+def upload_site_file(s3, bucket, path, key, encoding=GZIP):
+    with open(path, "rb") as f:
+        body = f.read()
+    sent = put_asset(s3, bucket, key, body, encoding)
+    print(f"[S3] {key} subido desde {path} ({len(body)} -> {len(sent)} bytes, {cache_control(key)})")
+    return sent
+
+
+def publish_site(s3, bucket, site_dir="s3_static_website", encoding=GZIP):
+    """Sube la página y su service worker a la raíz del bucket."""
+    for name in SITE_FILES:
+        upload_site_file(s3, bucket, os.path.join(site_dir, name), name, encoding)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Manifiesto JSON de la galería: la página lo descarga en lugar de paginar ListObjectsV2
+(1.000 claves por petición, en serie) sobre thumbnails/.
+
+Formato (en el bucket de thumbnails):
+  manifest/index.json                  índice pequeño, se reescribe en cada build/compactación
+    {"v": 1, "prefix": "thumbnails/", "count": N, "generated": "...",
+     "fields": ["k", "w", "h", "p", "e", "r", "z"],
+     "shards": [{"path": "manifest/shards/<hash>.json", "count": n, "first": k, "last": k}, ...],
+     "deltas": "manifest/deltas/", "compactedThrough": "manifest/deltas/<último delta incluido>"}
+  manifest/shards/<hash>.json          ~SHARD_SIZE entradas en columnas, ordenadas por clave
+    {"k": [clave sin prefijo, ...], "w": [ancho], "h": [alto], "p": [color o null], "e": [ETag],
+     "r": [densidad máxima de renditions/ (0-3)], "z": [1 si hay pirámide Deep Zoom en tiles/, si no 0]}
+  manifest/deltas/<ms>-<id>.json       entradas nuevas de una invocación de la Lambda (mismo formato)
+
+Los shards llevan el hash de su contenido en el nombre (inmutables: un shard que no cambia
+conserva el nombre y la caché del navegador); index.json es lo único que hay que revalidar.
+Todo se sube comprimido con gzip y con las cabeceras de caché de cache_policy.py.
+Con 200k thumbnails, la primera pintura necesita dos peticiones (índice + primer shard).
+
+Las dimensiones, el color de placeholder y las renditions del srcset los escribe la Lambda en
+DynamoDB (Width, Height, Placeholder, Renditions, DeepZoom); las claves y ETags salen del listado del bucket, que es la fuente de verdad.
+
+Entre builds, cada invocación de la Lambda deja un delta pequeño; la página los lista
+(ListBucket sólo sobre manifest/deltas/) a partir de compactedThrough y los muestra encima de
+la base. --compact los funde en los shards afectados (el resto conserva nombre y caché) y
+borra exactamente los deltas fundidos, así que se puede ejecutar periódicamente. Sólo se funden los deltas con
+más de DELTA_SETTLE_S segundos: compactedThrough es un cursor lexicográfico y un delta cuyo PUT tarda no debe
+quedar por debajo de él.
+
+Uso:
+  python gallery_manifest.py                       # bucket y tabla del registro
+  python gallery_manifest.py --shard-size 2000 --segments 8
+  python gallery_manifest.py --compact             # fundir los deltas pendientes
+  python gallery_manifest.py --compact --min-deltas 20 --every 300
+"""
+import json
+import time
+import bisect
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from aws_clients import get_client, get_resource
+from cache_policy import decode_body, put_asset
+from state_store import open_state
+
+THUMB_PREFIX = "thumbnails/"
+MANIFEST_PREFIX = "manifest/"
+INDEX_KEY = f"{MANIFEST_PREFIX}index.json"
+SHARDS_PREFIX = f"{MANIFEST_PREFIX}shards/"
+DELTAS_PREFIX = f"{MANIFEST_PREFIX}deltas/"
+SHARD_SIZE = 5000
+# Un delta se hace visible al terminar su PUT, pero su nombre lleva el instante de antes: uno
+# lento puede aparecer por debajo de un cursor ya avanzado. Sólo se compacta (y sólo avanza
+# compactedThrough) hasta los deltas con más de DELTA_SETTLE_S segundos, muy por encima del
+# tiempo de un PUT con sus reintentos.
+DELTA_SETTLE_S = 60
+FIELDS = ["k", "w", "h", "p", "e", "r", "z"]
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff")
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+# ---------- Fuentes ----------
+def list_thumbnails(s3, bucket, prefix=THUMB_PREFIX):
+    """{clave: ETag} de las imágenes bajo `prefix`."""
+    listing = {}
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if obj["Key"].lower().endswith(IMAGE_EXTENSIONS):
+                listing[obj["Key"]] = obj["ETag"].strip('"')
+    return listing
+
+
+def _scan_segment(table_name, segment, total):
+    table = get_resource("dynamodb").Table(table_name)
+    kwargs = {"ProjectionExpression": "ImageID, Width, Height, Placeholder, Renditions, DeepZoom",
+              "Segment": segment, "TotalSegments": total}
+    found = {}
+    while True:
+        page = table.scan(**kwargs)
+        for item in page.get("Items", []):
+            found[item["ImageID"]] = (
+                int(item["Width"]) if "Width" in item else None,
+                int(item["Height"]) if "Height" in item else None,
+                item.get("Placeholder"),
+                int(item.get("Renditions", 0)),
+                int(item.get("DeepZoom", 0)),
+            )
+        if "LastEvaluatedKey" not in page:
+            return found
+        kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def scan_metadata(table_name, segments=4):
+    """{ImageID: (ancho, alto, placeholder, renditions, deep zoom)} con un scan paralelo de `segments` segmentos."""
+    metadata = {}
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        for part in pool.map(lambda s: _scan_segment(table_name, s, segments), range(segments)):
+            metadata.update(part)
+    return metadata
+
+
+def build_entries(listing, metadata, prefix=THUMB_PREFIX):
+    """Entradas [clave sin prefijo, ancho, alto, placeholder, etag, renditions, deep zoom] ordenadas por clave."""
+    entries = []
+    for key in sorted(listing):
+        image_id = key[len(prefix):]
+        width, height, placeholder, renditions, deep_zoom = metadata.get(image_id, (None, None, None, 0, 0))
+        entries.append([image_id, width, height, placeholder, listing[key], renditions, deep_zoom])
+    return entries
+
+
+# ---------- Escritura ----------
+def shard_document(entries):
+    return {field: [entry[i] for entry in entries] for i, field in enumerate(FIELDS)}
+
+
+def document_entries(document):
+    """Inversa de shard_document: columnas -> [[clave, ancho, alto, placeholder, etag, renditions, deep zoom], ...]."""
+    # Las columnas añadidas después ("r", "z") faltan en shards y deltas antiguos
+    defaults = {"r": 0, "z": 0}
+    return [list(row) for row in zip(*(document.get(field) or [defaults.get(field)] * len(document["k"])
+                                       for field in FIELDS))]
+
+
+def _read_json(s3, bucket, key):
+    return json.loads(decode_body(s3.get_object(Bucket=bucket, Key=key)))
+
+
+def read_index(s3, bucket):
+    try:
+        return _read_json(s3, bucket, INDEX_KEY)
+    except s3.exceptions.NoSuchKey:
+        return None
+
+
+def split_entries(entries, shard_size=SHARD_SIZE):
+    return [entries[start:start + shard_size] for start in range(0, len(entries), shard_size)]
+
+
+def _delete_keys(s3, bucket, keys):
+    for start in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in keys[start:start + 1000]],
+                                                 "Quiet": True})
+
+
+def write_manifest(s3, bucket, chunks, previous=None, compacted_through=None, workers=8, prefix=THUMB_PREFIX):
+    """
+    Sube los shards (uno por lista de `chunks`, sólo los que no existían) y después el
+    índice. `compacted_through` es el último delta ya incluido. Devuelve el índice.
+    """
+    previous = previous or {"shards": []}
+    shards = []
+    uploads = []
+    for chunk in chunks:
+        body = _dumps(shard_document(chunk)).encode("utf-8")
+        # Nombre = hash del contenido: un shard que no cambia conserva su URL (y la caché)
+        path = f"{SHARDS_PREFIX}{hashlib.sha256(body).hexdigest()[:16]}.json"
+        shards.append({"path": path, "count": len(chunk), "first": chunk[0][0], "last": chunk[-1][0]})
+        uploads.append((path, body))
+
+    unchanged = {s["path"] for s in previous["shards"]}
+    pending = [(path, body) for path, body in uploads if path not in unchanged]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda u: put_asset(s3, bucket, u[0], u[1]), pending))
+
+    index = {
+        "v": 1,
+        "prefix": prefix,
+        "count": sum(s["count"] for s in shards),
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "fields": FIELDS,
+        "shards": shards,
+        "deltas": DELTAS_PREFIX,
+        "compactedThrough": compacted_through or previous.get("compactedThrough"),
+    }
+    # El índice se sube el último: quien lo lea encuentra todos sus shards ya publicados
+    put_asset(s3, bucket, INDEX_KEY, _dumps(index))
+
+    # Se conservan los shards del índice anterior: un navegador puede estar leyéndolo todavía
+    keep = {s["path"] for s in shards} | unchanged
+    stale = [obj["Key"] for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=SHARDS_PREFIX)
+             for obj in page.get("Contents", []) if obj["Key"] not in keep]
+    _delete_keys(s3, bucket, stale)
+    print(f"[Manifest] {index['count']} imágenes en {len(shards)} shards "
+          f"({len(pending)} subidos, {len(stale)} obsoletos borrados)")
+    return index
+
+
+# ---------- Deltas (los escribe la Lambda) y compactación ----------
+def list_deltas(s3, bucket, after=None):
+    """Claves de los deltas pendientes, en orden de escritura (el nombre empieza por el timestamp)."""
+    kwargs = {"Bucket": bucket, "Prefix": DELTAS_PREFIX}
+    if after:
+        kwargs["StartAfter"] = after
+    return [obj["Key"] for page in s3.get_paginator("list_objects_v2").paginate(**kwargs)
+            for obj in page.get("Contents", [])]
+
+
+def delta_time_ms(key):
+    """Instante (ms) con el que la Lambda nombró el delta, o None si el nombre no lo lleva."""
+    try:
+        return int(key[len(DELTAS_PREFIX):].split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def settled_deltas(keys, settle_s=DELTA_SETTLE_S, now=None):
+    """Los deltas de `keys` nombrados hace más de `settle_s` segundos (los únicos seguros para el cursor)."""
+    cutoff = int(((now if now is not None else time.time()) - settle_s) * 1000)
+    return [key for key in keys if (delta_time_ms(key) or 0) < cutoff]
+
+
+def read_deltas(s3, bucket, keys, workers=8):
+    """{clave de imagen: entrada} aplicando los deltas en orden (el último gana)."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        documents = list(pool.map(lambda k: _read_json(s3, bucket, k), keys))
+    latest = {}
+    for document in documents:
+        for entry in document_entries(document):
+            latest[entry[0]] = entry
+    return latest
+
+
+def merge_into_chunks(chunks, updates, shard_size=SHARD_SIZE):
+    """
+    Inserta/actualiza `updates` en los shards existentes sin mover sus fronteras (sólo
+    cambian los shards que reciben entradas); un shard que pasa de 2 x shard_size se parte.
+    """
+    if not chunks:
+        return split_entries(sorted(updates.values()), shard_size)
+    firsts = [chunk[0][0] for chunk in chunks]
+    touched = {}
+    for key, entry in updates.items():
+        n = max(0, bisect.bisect_right(firsts, key) - 1)
+        touched.setdefault(n, {}).update({key: entry})
+    merged = []
+    for n, chunk in enumerate(chunks):
+        if n not in touched:
+            merged.append(chunk)
+            continue
+        rows = {entry[0]: entry for entry in chunk}
+        rows.update(touched[n])
+        rows = [rows[key] for key in sorted(rows)]
+        merged.extend(split_entries(rows, shard_size) if len(rows) > 2 * shard_size else [rows])
+    return merged
+
+
+def compact(s3, bucket, shard_size=SHARD_SIZE, min_deltas=1, workers=8, settle_s=DELTA_SETTLE_S):
+    """
+    Funde los deltas pendientes con más de `settle_s` segundos en los shards base y los borra.
+    Los más recientes se quedan para la próxima pasada. Devuelve cuántos se fundieron.
+    """
+    index = read_index(s3, bucket)
+    pending = list_deltas(s3, bucket, after=(index or {}).get("compactedThrough"))
+    deltas = settled_deltas(pending, settle_s)
+    if len(deltas) < min_deltas:
+        print(f"[Manifest] {len(pending)} deltas pendientes ({len(deltas)} asentados): nada que compactar")
+        return 0
+    updates = read_deltas(s3, bucket, deltas, workers)
+    shards = (index or {"shards": []})["shards"]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        chunks = [document_entries(d) for d in pool.map(lambda s: _read_json(s3, bucket, s["path"]), shards)]
+    write_manifest(s3, bucket, merge_into_chunks(chunks, updates, shard_size), index,
+                   compacted_through=deltas[-1], workers=workers)
+    # Sólo se borran los deltas leídos: los escritos durante la compactación siguen pendientes
+    _delete_keys(s3, bucket, deltas)
+    print(f"[Manifest] {len(deltas)} deltas compactados ({len(updates)} imágenes)")
+    return len(deltas)
+
+
+def current_entries(s3, bucket, workers=8):
+    """Todas las entradas publicadas (shards base + deltas pendientes), ordenadas por clave."""
+    index = read_index(s3, bucket) or {"shards": []}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        shards = list(pool.map(lambda s: _read_json(s3, bucket, s["path"]), index["shards"]))
+    latest = {entry[0]: entry for shard in shards for entry in document_entries(shard)}
+    latest.update(read_deltas(s3, bucket, list_deltas(s3, bucket, after=index.get("compactedThrough")), workers))
+    return [latest[key] for key in sorted(latest)]
+
+
+def build(bucket, table_name, shard_size=SHARD_SIZE, segments=4):
+    """Reconstrucción completa desde el bucket y la tabla; absorbe también los deltas existentes."""
+    s3 = get_client("s3")
+    # Los deltas anteriores al listado ya están reflejados en él; los recientes se quedan como
+    # pendientes (el cursor no puede pasar de ellos, ver DELTA_SETTLE_S)
+    deltas = settled_deltas(list_deltas(s3, bucket))
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        listing = pool.submit(list_thumbnails, s3, bucket)
+        metadata = pool.submit(scan_metadata, table_name, segments)
+        listing, metadata = listing.result(), metadata.result()
+    entries = build_entries(listing, metadata)
+    missing = sum(1 for e in entries if e[1] is None)
+    if missing:
+        print(f"[Manifest] {missing} imágenes sin dimensiones en {table_name} (procesadas antes de registrarlas)")
+    index = write_manifest(s3, bucket, split_entries(entries, shard_size), read_index(s3, bucket),
+                           compacted_through=deltas[-1] if deltas else None)
+    _delete_keys(s3, bucket, deltas)
+    return index
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Genera o compacta el manifiesto JSON de la galería.")
+    parser.add_argument("--bucket", help="Bucket de thumbnails (por defecto: thumbnails-bucket del registro)")
+    parser.add_argument("--table", help="Tabla de metadatos (por defecto: dynamodb-table del registro)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Entradas por shard (por defecto: %(default)s)")
+    parser.add_argument("--segments", type=int, default=4, help="Segmentos del scan paralelo de DynamoDB")
+    parser.add_argument("--compact", action="store_true",
+                        help="Fundir los deltas de la Lambda en los shards en vez de reconstruir todo")
+    parser.add_argument("--min-deltas", type=int, default=1, help="Con --compact: compactar sólo si hay al menos N")
+    parser.add_argument("--every", type=float, default=None, metavar="SEGUNDOS",
+                        help="Con --compact: repetir cada N segundos (Ctrl+C para salir)")
+    parser.add_argument("--settle", type=float, default=DELTA_SETTLE_S, metavar="SEGUNDOS",
+                        help="Con --compact: fundir sólo los deltas con más de N segundos (por defecto: %(default)s)")
+    args = parser.parse_args()
+
+    resources = open_state().as_dict()
+    bucket = args.bucket or resources.get("thumbnails-bucket")
+    table_name = args.table or resources.get("dynamodb-table", "ImageMetadata")
+    if not bucket:
+        raise SystemExit("No hay bucket de thumbnails en el registro: ejecuta setup.py o pasa --bucket")
+    if not args.compact:
+        build(bucket, table_name, args.shard_size, args.segments)
+    else:
+        s3 = get_client("s3")
+        while True:
+            compact(s3, bucket, args.shard_size, args.min_deltas, settle_s=args.settle)
+            if args.every is None:
+                break
+            try:
+                time.sleep(args.every)
+            except KeyboardInterrupt:
+                break
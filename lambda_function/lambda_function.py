@@ -1,55 +1,498 @@
 import os
+import io
+import gzip
 import json
+import math
+import time
+import uuid
+import struct
+import threading
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.config import Config
 
-s3_client = boto3.client("s3")
-dynamodb = boto3.resource("dynamodb")
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # the default ZIP is pure Python: dimensions come from the file header
+    Image = ImageOps = None
+
+if os.getenv("PIPELINE_BACKEND", "aws") == "local":
+    # Offline run (local_worker.py): filesystem/SQLite stand-ins. Not packaged in the ZIP.
+    import local_backend
+    s3_client = local_backend.client("s3")
+
+    def new_dynamodb_resource():
+        return local_backend.resource("dynamodb")
+else:
+    # Clients are created once per container and reused across invocations. aws_clients.py
+    # is not in the ZIP, so its botocore tuning is repeated here.
+    _config = Config(
+        max_pool_connections=int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "10")),
+        tcp_keepalive=True,
+        connect_timeout=5,
+        read_timeout=30,
+        retries={"mode": "standard", "max_attempts": 5},
+    )
+    s3_client = boto3.client("s3", config=_config)
+
+    def new_dynamodb_resource():
+        # Own session per resource: creating resources from a shared session is not thread-safe
+        return boto3.session.Session().resource("dynamodb", config=_config)
 
 THUMB_BUCKET = os.environ["THUMB_BUCKET"]                 # thumbnails bucket (env var)
 TABLE_NAME   = os.getenv("TABLE_NAME", "ImageMetadata")
 
-table = dynamodb.Table(TABLE_NAME)
+# boto3 resources are not thread-safe (clients are). Lambda calls the handler from a single
+# thread, but worker.py --threads N runs N handlers per process: one Table per thread.
+_thread_state = threading.local()
 
-def lambda_handler(event, context):
+def metadata_table():
+    table = getattr(_thread_state, "table", None)
+    if table is None:
+        table = _thread_state.table = new_dynamodb_resource().Table(TABLE_NAME)
+    return table
+
+metadata_table()   # the handler's thread gets its Table during init, as before
+
+# Gallery manifest deltas (see gallery_manifest.py): same columnar format as the base shards
+MANIFEST_DELTAS_PREFIX = "manifest/deltas/"
+MANIFEST_FIELDS = ["k", "w", "h", "p", "e", "r", "z"]
+
+# Gallery cell (CSS: 180px wide columns, 160px tall images); renditions at 1x/2x/3x of it
+GRID_CELL = (180, 160)
+RENDITION_DENSITIES = (1, 2, 3)
+RENDITIONS_PREFIX = "renditions/"
+RENDITION_QUALITY = 80
+
+# Deep Zoom pyramids for very large originals (optional: DZI_MIN_PIXELS comes from
+# dzi_min_megapixels in lambda_profile.json). Layout read by the gallery's tiled viewer:
+#   tiles/<key>.dzi                                  descriptor (size, tile size, overlap)
+#   tiles/<key>_files/<level>/<col>_<row>.jpg       level L = original scaled by 2^(L - max level)
+DZI_MIN_PIXELS = int(os.getenv("DZI_MIN_PIXELS", "0"))    # 0 = no pyramids
+DZI_TILE_SIZE = 254             # + 1 px overlap on each side = 256 px tiles
+DZI_OVERLAP = 1
+DZI_QUALITY = 85
+DZI_UPLOAD_WORKERS = 8
+TILES_PREFIX = "tiles/"
+
+# Largest original decoded with Pillow: about 5 bytes per pixel (RGB plus the next pyramid
+# level) must fit in the function's memory, e.g. ~214 Mpx with 1024 MB. Larger originals keep
+# their header dimensions but get no placeholder, renditions or pyramid. Lambda sets
+# AWS_LAMBDA_FUNCTION_MEMORY_SIZE; worker.py and power_tuning.py set it from the profile.
+DECODE_BYTES_PER_PIXEL = 5
+MAX_DECODE_PIXELS = int(os.getenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "1024")) * 1024 * 1024 // DECODE_BYTES_PER_PIXEL
+
+if Image is not None:
+    # Pillow's own limit (~89 Mpx warning, ~179 Mpx error) would reject exactly the large scans
+    # that the size check in process_image already admits
+    Image.MAX_IMAGE_PIXELS = MAX_DECODE_PIXELS
+
+# Same rules as cache_policy.py (not in the ZIP). Deltas are never rewritten, so browsers may keep
+# them for a year. Thumbnails, renditions and tiles are rewritten in place when an image is
+# reprocessed, and S3 sends the same header for the unversioned URL (ThumbnailURL, the original's
+# link) as for the gallery's ?v=<ETag> one: short TTL, like every rewritten key.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REWRITTEN_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+
+# End-to-end tracing (see latency_report.py): the uploader stamps each message with TraceId and
+# UploadedAt attributes; every item stores them with per-stage timestamps (ms since epoch).
+# Spans logged per image, as (name, start, end):
+TRACE_SPANS = (
+    ("upload_to_send", "UploadedAt", "SentAt"),      # uploader batching multi-image messages
+    ("queue", "SentAt", "ReceivedAt"),               # SQS wait until the invocation started
+    ("batch", "ReceivedAt", "StartedAt"),            # earlier images of the same invocation
+    ("processing", "StartedAt", "FinishedAt"),
+    ("total", "UploadedAt", "FinishedAt"),
+)
+
+HEADER_BYTES = 64 * 1024          # enough for PNG/GIF/WebP/BMP and most JPEGs
+MAX_HEADER_BYTES = 512 * 1024     # JPEGs with large EXIF/ICC blocks before the SOF marker
+
+# EXIF Orientation values 5-8 rotate by 90/270 degrees: the displayed image is the stored one
+# with width and height swapped (browsers apply the tag to <img> by default).
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def _exif_orientation(segment):
+    """Orientation tag from the body of an APP1 segment (EXIF header + TIFF), or 1 if absent."""
+    if segment[:6] != b"Exif\x00\x00":
+        return 1
+    tiff = segment[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None or len(tiff) < 10:
+        return 1
+    ifd = struct.unpack(endian + "I", tiff[4:8])[0]
+    if ifd + 2 > len(tiff):
+        return 1
+    count = struct.unpack(endian + "H", tiff[ifd:ifd + 2])[0]
+    for entry in range(ifd + 2, min(ifd + 2 + 12 * count, len(tiff) - 11), 12):
+        tag, kind = struct.unpack(endian + "HH", tiff[entry:entry + 4])
+        if tag == EXIF_ORIENTATION_TAG and kind == 3:     # SHORT, stored in the value field
+            return struct.unpack(endian + "H", tiff[entry + 8:entry + 10])[0]
+    return 1
+
+def _jpeg_size(data):
+    i = 2
+    orientation = 1
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:                      # fill byte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            i += 2                              # standalone markers, no length
+            continue
+        # SOF0..SOF15 carry the frame size (C4/C8/CC are DHT/JPG/DAC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return (height, width) if orientation in TRANSPOSED_ORIENTATIONS else (width, height)
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker == 0xE1 and orientation == 1:  # APP1: EXIF comes before the frame header
+            orientation = _exif_orientation(data[i + 4:i + 2 + length])
+        i += 2 + length
+    return None
+
+def image_size(data):
+    """
+    Displayed (width, height) parsed from the first bytes of a PNG/JPEG/GIF/WebP/BMP, or None.
+    JPEGs honour the EXIF Orientation tag, like the decoded path in read_dimensions.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        return _jpeg_size(data)
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    if data[:2] == b"BM" and len(data) >= 26:
+        width, height = struct.unpack("<ii", data[18:26])
+        return width, abs(height)
+    return None
+
+def rendition_key(density, image_key):
+    """Key of the cover-cropped grid rendition at `density` (1, 2 or 3)."""
+    width, height = GRID_CELL
+    return f"{RENDITIONS_PREFIX}{width * density}x{height * density}/{image_key}.jpg"
+
+def write_renditions(img, image_key):
+    """
+    Cover-cropped JPEGs of the gallery cell at 1x/2x/3x (never upscaled past the original,
+    except 1x). Returns the highest density written; the page builds its srcset from it.
+    """
+    rgb = img if img.mode == "RGB" else img.convert("RGB")
+    written = 0
+    for density in RENDITION_DENSITIES:
+        width, height = GRID_CELL[0] * density, GRID_CELL[1] * density
+        if density > 1 and (rgb.width < width or rgb.height < height):
+            break
+        out = io.BytesIO()
+        ImageOps.fit(rgb, (width, height), Image.LANCZOS).save(out, "JPEG", quality=RENDITION_QUALITY,
+                                                               optimize=True, progressive=True)
+        s3_client.put_object(Bucket=THUMB_BUCKET, Key=rendition_key(density, image_key), Body=out.getvalue(),
+                             ContentType="image/jpeg", CacheControl=REWRITTEN_CACHE_CONTROL)
+        written = density
+    return written
+
+def read_header(src_bucket, image_key, size_bytes):
+    """
+    First bytes of the original (ranged GET; all of it for small files) and the displayed
+    (width, height) parsed from them, or None for formats image_size does not know.
+    """
+    for length in (HEADER_BYTES, MAX_HEADER_BYTES):
+        data = s3_client.get_object(Bucket=src_bucket, Key=image_key, Range=f"bytes=0-{length - 1}")["Body"].read()
+        size = image_size(data)
+        if size or size_bytes <= length:
+            break
+    return data, size
+
+def read_original(src_bucket, image_key, size_bytes, header):
+    """The whole original: `header` (from read_header) plus only the bytes still missing."""
+    if len(header) >= size_bytes:
+        return header
+    rest = s3_client.get_object(Bucket=src_bucket, Key=image_key, Range=f"bytes={len(header)}-")["Body"].read()
+    return header + rest
+
+def read_dimensions(src_bucket, image_key, data):
+    """
+    Pixel size, placeholder colour and grid renditions decoded from `data`, the original's
+    bytes. If Pillow cannot decode them, the size still comes from the header parser, with
+    no placeholder or renditions; the gallery falls back to the copied thumbnail.
+    """
     try:
-        for record in event["Records"]:
-            body = json.loads(record["body"])
-            src_bucket = body["bucket_name"]
-            image_key  = body["image_key"]
-
-            # 1) Get the original object (metadata + body stream)
-            head = s3_client.head_object(Bucket=src_bucket, Key=image_key)
-            content_type = head.get("ContentType", "application/octet-stream")
-            size_bytes   = head.get("ContentLength", 0)
-
-            # 2) Copy it as a "thumbnail" without modifying bytes (no native libs needed)
-            #    If you want a prefix always, keep thumbnails/<key>. If key already includes folders,
-            #    we keep the path under thumbnails/.
-            thumbnail_key = f"thumbnails/{image_key}"
-
-            # Efficient server-side copy (no data round-trip)
-            s3_client.copy_object(
-                Bucket=THUMB_BUCKET,
-                Key=thumbnail_key,
-                CopySource={"Bucket": src_bucket, "Key": image_key},
-                MetadataDirective="REPLACE",               # ensure we set content-type below
-                ContentType=content_type
-            )
-
-            # 3) Store metadata in DynamoDB (no pixel dimensions without an image lib)
-            table.put_item(Item={
-                "ImageID": image_key,
-                "OriginalURL":  f"https://{src_bucket}.s3.amazonaws.com/{image_key}",
-                "ThumbnailURL": f"https://{THUMB_BUCKET}.s3.amazonaws.com/{thumbnail_key}",
-                "Bytes": size_bytes,
-                "Note": "No resize performed (pure-Python build)."
-            })
-
-            print(f"Processed (copied as thumbnail): s3://{src_bucket}/{image_key} -> s3://{THUMB_BUCKET}/{thumbnail_key}")
-
-        return {"statusCode": 200, "body": json.dumps("Processing completed.")}
+        with Image.open(io.BytesIO(data)) as img:
+            # Size as displayed: exif_transpose below swaps the axes for orientations 5-8
+            width, height = img.size
+            if img.getexif().get(EXIF_ORIENTATION_TAG, 1) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            # JPEG: decode at the smallest scale that still covers the 3x rendition
+            largest = RENDITION_DENSITIES[-1]
+            img.draft("RGB", (GRID_CELL[0] * largest, GRID_CELL[1] * largest))
+            img = ImageOps.exif_transpose(img.convert("RGB"))
+            r, g, b = img.resize((1, 1)).getpixel((0, 0))
+            renditions = write_renditions(img, image_key)
+        return width, height, f"#{r:02x}{g:02x}{b:02x}", renditions
     except Exception as e:
-        print(f"Error: {e}")
-        return {"statusCode": 500, "body": json.dumps(f"Error: {e}")}
+        print(f"Could not decode s3://{src_bucket}/{image_key}: {e}")
+        width, height = image_size(data) or (None, None)
+        return width, height, None, 0
+
+def dzi_key(image_key):
+    return f"{TILES_PREFIX}{image_key}.dzi"
+
+def dzi_tile_key(image_key, level, col, row):
+    return f"{TILES_PREFIX}{image_key}_files/{level}/{col}_{row}.jpg"
+
+def _put_tile(img, box, key):
+    out = io.BytesIO()
+    img.crop(box).save(out, "JPEG", quality=DZI_QUALITY)
+    s3_client.put_object(Bucket=THUMB_BUCKET, Key=key, Body=out.getvalue(),
+                         ContentType="image/jpeg", CacheControl=REWRITTEN_CACHE_CONTROL)
+
+def write_dzi(src_bucket, image_key, data):
+    """
+    Deep Zoom pyramid of the full-resolution original, from the top level down (each level
+    is the previous one halved, rounding up as the DZI spec does). Tiles are encoded and
+    uploaded in parallel one level at a time, so at most two levels are held in memory.
+    The .dzi descriptor goes last: a viewer never finds a half-written pyramid.
+    `data` holds the original's bytes (the ones read_dimensions decoded). Returns the number
+    of tiles written.
+    """
+    level_img = Image.open(io.BytesIO(data))
+    if level_img.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1:
+        level_img = ImageOps.exif_transpose(level_img)   # only copy the full image when rotated
+    if level_img.mode != "RGB":
+        level_img = level_img.convert("RGB")
+    level_img.load()                                       # decode once, before the threads crop it
+    width, height = level_img.size
+    max_level = math.ceil(math.log2(max(width, height)))
+    step, overlap = DZI_TILE_SIZE, DZI_OVERLAP
+    tiles = 0
+    with ThreadPoolExecutor(max_workers=DZI_UPLOAD_WORKERS) as pool:
+        for level in range(max_level, -1, -1):
+            w, h = level_img.size
+            futures = [
+                pool.submit(_put_tile, level_img,
+                            (max(0, x - overlap), max(0, y - overlap), min(w, x + step + overlap), min(h, y + step + overlap)),
+                            dzi_tile_key(image_key, level, x // step, y // step))
+                for y in range(0, h, step) for x in range(0, w, step)
+            ]
+            for future in futures:
+                future.result()                 # first failed upload fails the image (SQS retries it)
+            tiles += len(futures)
+            if level:
+                level_img = level_img.reduce(2)   # box filter, size rounded up
+    descriptor = (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                  f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{step}" Overlap="{overlap}" '
+                  f'Format="jpg"><Size Width="{width}" Height="{height}"/></Image>\n')
+    s3_client.put_object(Bucket=THUMB_BUCKET, Key=dzi_key(image_key), Body=descriptor.encode("utf-8"),
+                         ContentType="application/xml", CacheControl=REWRITTEN_CACHE_CONTROL)
+    print(f"Deep Zoom: {tiles} tiles in {max_level + 1} levels for {width}x{height} s3://{src_bucket}/{image_key}")
+    return tiles
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+def _iso_ms(value):
+    """ms since epoch of an ISO-8601 timestamp such as S3's eventTime, or None."""
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+    except (AttributeError, ValueError):
+        return None
+
+def trace_context(record):
+    """(TraceId, [upload time per key in ms or None], SQS send time in ms) of an SQS record."""
+    attributes = record.get("messageAttributes") or {}
+    trace_id = (attributes.get("TraceId") or {}).get("stringValue") or record.get("messageId")
+    uploaded = (attributes.get("UploadedAt") or {}).get("stringValue") or ""
+    uploaded_at = [int(v) if v.isdigit() else None for v in uploaded.split(",")] if uploaded else []
+    sent_at = (record.get("attributes") or {}).get("SentTimestamp")
+    return trace_id, uploaded_at, int(sent_at) if sent_at else None
+
+def log_trace(image_key, trace):
+    """One JSON line per image, easy to aggregate with CloudWatch Logs Insights."""
+    spans = {name: trace[end] - trace[start] for name, start, end in TRACE_SPANS
+             if trace.get(start) and trace.get(end)}
+    print(json.dumps({"trace": trace.get("TraceId"), "key": image_key, "ms": spans}))
+
+def parse_message(body):
+    """
+    Yield (bucket, key, uploaded_at) from an SQS message body; uploaded_at (ms) is only known
+    here for S3 event notifications (eventTime), otherwise it is None. Formats accepted:
+      - the uploader's own message: {"bucket_name": ..., "image_key": ...}
+      - a multi-image message (v2): {"v": 2, "b": bucket, "k": [key, key, ...]}
+      - an S3 event notification (ObjectCreated:*) delivered straight to the queue.
+    """
+    if body.get("v") == 2:
+        for image_key in body["k"]:
+            yield body["b"], image_key, None
+    elif "Records" in body:
+        for s3_record in body["Records"]:
+            if s3_record.get("eventSource") != "aws:s3":
+                continue
+            if not s3_record.get("eventName", "").startswith("ObjectCreated:"):
+                continue
+            s3_info = s3_record["s3"]
+            # Keys in S3 events are URL-encoded (spaces arrive as '+')
+            yield s3_info["bucket"]["name"], unquote_plus(s3_info["object"]["key"]), _iso_ms(s3_record.get("eventTime"))
+    elif body.get("Event") == "s3:TestEvent":
+        # Sent once by S3 when the notification is configured; nothing to process
+        return
+    else:
+        yield body["bucket_name"], body["image_key"], None
+
+def process_image(src_bucket, image_key, trace=None):
+    # Stage timestamps are added to the message's trace context (TraceId, UploadedAt, SentAt, ReceivedAt)
+    trace = dict(trace or {}, StartedAt=_now_ms())
+
+    # 1) Get the original object (metadata + body stream)
+    head = s3_client.head_object(Bucket=src_bucket, Key=image_key)
+    content_type = head.get("ContentType", "application/octet-stream")
+    size_bytes   = head.get("ContentLength", 0)
+
+    # 2) Copy it as a "thumbnail" without modifying bytes (no native libs needed)
+    #    If you want a prefix always, keep thumbnails/<key>. If key already includes folders,
+    #    we keep the path under thumbnails/.
+    thumbnail_key = f"thumbnails/{image_key}"
+
+    # Efficient server-side copy (no data round-trip)
+    copy = s3_client.copy_object(
+        Bucket=THUMB_BUCKET,
+        Key=thumbnail_key,
+        CopySource={"Bucket": src_bucket, "Key": image_key},
+        MetadataDirective="REPLACE",               # ensure we set content-type below
+        ContentType=content_type,
+        CacheControl=REWRITTEN_CACHE_CONTROL,      # rewritten when the image is reprocessed
+    )
+
+    trace["CopiedAt"] = _now_ms()
+
+    # 3) Pixel size, placeholder colour and srcset renditions for the gallery (gallery_manifest.py).
+    #    The size comes from the header (ranged GET). Only what Pillow will decode is downloaded
+    #    in full, once: the renditions and, for very large originals, the Deep Zoom pyramid.
+    header, size = read_header(src_bucket, image_key, size_bytes)
+    width, height = size or (None, None)
+    placeholder, renditions, original = None, 0, None
+    if Image is not None and (size is None or width * height <= MAX_DECODE_PIXELS):
+        original = read_original(src_bucket, image_key, size_bytes, header)
+        width, height, placeholder, renditions = read_dimensions(src_bucket, image_key, original)
+    elif Image is not None:
+        print(f"Not decoding {width}x{height} s3://{src_bucket}/{image_key}: above {MAX_DECODE_PIXELS} px "
+              f"for {os.getenv('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '1024')} MB")
+    trace["DerivedAt"] = _now_ms()
+
+    # 4) Deep Zoom tiles for very large originals (needs Pillow and DZI_MIN_PIXELS)
+    deep_zoom = 0
+    if original is not None and DZI_MIN_PIXELS and width and height and width * height >= DZI_MIN_PIXELS:
+        deep_zoom = 1 if write_dzi(src_bucket, image_key, original) else 0
+        trace["TiledAt"] = _now_ms()
+
+    # 5) Store metadata in DynamoDB.
+    #    ProcessedDate/ProcessedAt/ContentType are the keys of the table's GSIs
+    #    (see table_schema.py): "processed on day X" and "latest images of type Y".
+    processed_at = datetime.now(timezone.utc)
+    trace["FinishedAt"] = int(processed_at.timestamp() * 1000)
+    thumbnail_etag = copy["CopyObjectResult"]["ETag"].strip('"')
+    item = {
+        "ImageID": image_key,
+        "OriginalURL":  f"https://{src_bucket}.s3.amazonaws.com/{image_key}",
+        # Versioned like the gallery's URLs: a reprocessed image gets a new one
+        "ThumbnailURL": f"https://{THUMB_BUCKET}.s3.amazonaws.com/{thumbnail_key}?v={thumbnail_etag}",
+        "Bytes": size_bytes,
+        "ContentType": content_type,
+        "ProcessedDate": processed_at.strftime("%Y-%m-%d"),
+        "ProcessedAt": processed_at.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        "ThumbnailETag": thumbnail_etag,
+        "Note": "Thumbnail copied as-is; grid renditions resized with Pillow." if renditions
+                else "No resize performed (pure-Python build)."
+    }
+    # DynamoDB rejects None: unknown formats simply have no dimensions
+    item.update({k: v for k, v in (("Width", width), ("Height", height), ("Placeholder", placeholder),
+                                   ("Renditions", renditions), ("DeepZoom", deep_zoom),
+                                   ("TraceId", trace.get("TraceId"))) if v})
+    item["Trace"] = {k: v for k, v in trace.items() if k != "TraceId" and v is not None}
+    metadata_table().put_item(Item=item)
+
+    print(f"[{trace.get('TraceId')}] Processed (copied as thumbnail): "
+          f"s3://{src_bucket}/{image_key} -> s3://{THUMB_BUCKET}/{thumbnail_key}")
+    log_trace(image_key, trace)
+    # Manifest entry: [key, width, height, placeholder, etag, renditions, deep zoom]
+    return [image_key, width, height, placeholder, item["ThumbnailETag"], renditions, deep_zoom]
+
+def write_manifest_delta(entries):
+    """
+    One small delta per invocation so the gallery shows new images before the next
+    compaction. The key starts with the time in ms: listing order is write order.
+    """
+    key = f"{MANIFEST_DELTAS_PREFIX}{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}.json"
+    document = {field: [entry[i] for entry in entries] for i, field in enumerate(MANIFEST_FIELDS)}
+    body = json.dumps(document, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    s3_client.put_object(
+        Bucket=THUMB_BUCKET,
+        Key=key,
+        Body=gzip.compress(body, mtime=0),
+        ContentType="application/json",
+        ContentEncoding="gzip",
+        CacheControl=IMMUTABLE_CACHE_CONTROL,      # never rewritten, only deleted
+    )
+    return key
+
+def lambda_handler(event, context):
+    """
+    Process every image referenced by the batch. Failures are tracked per key; a message
+    with any failed key is returned in batchItemFailures (ReportBatchItemFailures) so SQS
+    redelivers only that message. Processing is idempotent, so keys that already
+    succeeded in a redelivered multi-image message are simply rewritten.
+    """
+    received_at = _now_ms()
+    batch_item_failures = []
+    failed_keys = []
+    entries = []
+    for record in event["Records"]:
+        message_id = record.get("messageId")
+        try:
+            images = list(parse_message(json.loads(record["body"])))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Error: unreadable message {message_id}: {e}")
+            batch_item_failures.append({"itemIdentifier": message_id})
+            continue
+
+        trace_id, uploaded_at, sent_at = trace_context(record)
+        record_failed = False
+        for n, (src_bucket, image_key, event_time) in enumerate(images):
+            trace = {"TraceId": trace_id, "SentAt": sent_at, "ReceivedAt": received_at,
+                     "UploadedAt": (uploaded_at[n] if n < len(uploaded_at) else None) or event_time}
+            try:
+                entries.append(process_image(src_bucket, image_key, trace))
+            except Exception as e:
+                print(f"[{trace_id}] Error processing s3://{src_bucket}/{image_key} (message {message_id}): {e}")
+                failed_keys.append({"bucket_name": src_bucket, "image_key": image_key, "error": str(e)})
+                record_failed = True
+        if record_failed:
+            batch_item_failures.append({"itemIdentifier": message_id})
 
+    if entries:
+        try:
+            write_manifest_delta(entries)
+        except Exception as e:
+            # The images are processed; the next full manifest build picks them up anyway
+            print(f"Error writing manifest delta ({len(entries)} entries): {e}")
 
+    summary = {"processed": len(entries), "failed": failed_keys}
+    return {
+        "statusCode": 500 if batch_item_failures else 200,
+        "body": json.dumps(summary),
+        "batchItemFailures": batch_item_failures,
+    }
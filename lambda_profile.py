@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Perfil de rendimiento de la Lambda y de su trigger SQS, en un solo sitio.
+
+El perfil sale de `lambda_profile.json` (o del fichero que se pase con --profile) y se
+puede sobrescribir por línea de comandos. Lo aplican igual setup.py y los scripts de
+setup_scripts/ (configure_lambda.py, add_sqs_trigger.py), y sólo tocan AWS si algo
+difiere de lo desplegado.
+
+Campos:
+  memory_mb              MemorySize (128-10240)
+  timeout_s              Timeout de la función (1-900)
+  runtime                p. ej. python3.12
+  architecture           x86_64 | arm64
+  batch_size             BatchSize del trigger SQS (1-10000; >10 exige ventana >= 1 s)
+  batch_window_s         MaximumBatchingWindowInSeconds (0-300)
+  max_concurrency        ScalingConfig.MaximumConcurrency del trigger (2-1000, null = sin límite)
+  reserved_concurrency   concurrencia reservada de la función (null = sin reservar)
+  max_receive_count      entregas de un mensaje antes de moverlo a la DLQ (1-1000)
+  dzi_min_megapixels     originales a partir de los que la Lambda genera la pirámide Deep Zoom
+                         (1-10000 Mpx, null = nunca); ver function_environment()
+  layers                 ARNs de capas de la función, p. ej. una con Pillow para la arquitectura
+                         del perfil ([] = ninguna; setup.py mete entonces Pillow en el ZIP)
+
+La cola deriva su VisibilityTimeout del perfil: 6 x timeout_s + batch_window_s, como
+recomienda AWS para colas con trigger de Lambda (ver visibility_timeout()).
+
+Uso:
+  python lambda_profile.py                            # muestra el perfil efectivo
+  python lambda_profile.py --memory 512 --write       # guarda cambios en lambda_profile.json
+"""
+import os
+import json
+import argparse
+
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lambda_profile.json")
+
+DEFAULTS = {
+    "memory_mb": 256,
+    "timeout_s": 30,
+    "runtime": "python3.12",
+    "architecture": "x86_64",
+    "batch_size": 3,
+    "batch_window_s": 0,
+    "max_concurrency": None,
+    "reserved_concurrency": None,
+    "max_receive_count": 5,
+    "dzi_min_megapixels": None,
+    "layers": [],
+}
+
+MAX_VISIBILITY_TIMEOUT = 43200   # 12 h, máximo de SQS
+DLQ_RETENTION_S = 1209600        # 14 días, máximo de SQS
+
+# opción de CLI -> campo del perfil
+_CLI_FIELDS = {
+    "memory": "memory_mb",
+    "timeout": "timeout_s",
+    "runtime": "runtime",
+    "architecture": "architecture",
+    "batch_size": "batch_size",
+    "batch_window": "batch_window_s",
+    "max_concurrency": "max_concurrency",
+    "reserved_concurrency": "reserved_concurrency",
+    "max_receive_count": "max_receive_count",
+    "dzi_min_megapixels": "dzi_min_megapixels",
+    "layers": "layers",
+}
+
+
+def validate(profile):
+    unknown = set(profile) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Campos desconocidos en el perfil: {sorted(unknown)}")
+    p = profile
+    if not 128 <= p["memory_mb"] <= 10240:
+        raise ValueError(f"memory_mb fuera de rango (128-10240): {p['memory_mb']}")
+    if not 1 <= p["timeout_s"] <= 900:
+        raise ValueError(f"timeout_s fuera de rango (1-900): {p['timeout_s']}")
+    if p["architecture"] not in ("x86_64", "arm64"):
+        raise ValueError(f"architecture debe ser x86_64 o arm64: {p['architecture']}")
+    if not 1 <= p["batch_size"] <= 10000:
+        raise ValueError(f"batch_size fuera de rango (1-10000): {p['batch_size']}")
+    if not 0 <= p["batch_window_s"] <= 300:
+        raise ValueError(f"batch_window_s fuera de rango (0-300): {p['batch_window_s']}")
+    if p["batch_size"] > 10 and p["batch_window_s"] < 1:
+        raise ValueError("Con batch_size > 10, SQS exige batch_window_s >= 1")
+    if p["max_concurrency"] is not None and not 2 <= p["max_concurrency"] <= 1000:
+        raise ValueError(f"max_concurrency fuera de rango (2-1000): {p['max_concurrency']}")
+    if p["reserved_concurrency"] is not None and p["reserved_concurrency"] < 0:
+        raise ValueError(f"reserved_concurrency no puede ser negativa: {p['reserved_concurrency']}")
+    if not 1 <= p["max_receive_count"] <= 1000:
+        raise ValueError(f"max_receive_count fuera de rango (1-1000): {p['max_receive_count']}")
+    if p["dzi_min_megapixels"] is not None and not 1 <= p["dzi_min_megapixels"] <= 10000:
+        raise ValueError(f"dzi_min_megapixels fuera de rango (1-10000): {p['dzi_min_megapixels']}")
+    if not isinstance(p["layers"], list) or len(p["layers"]) > 5 or not all(
+            isinstance(arn, str) and arn.startswith("arn:") for arn in p["layers"]):
+        raise ValueError(f"layers debe ser una lista de hasta 5 ARNs de capa: {p['layers']}")
+    return profile
+
+
+def load_profile(path=None, overrides=None):
+    """DEFAULTS <- fichero (si existe) <- overrides (los None de overrides se ignoran)."""
+    profile = dict(DEFAULTS)
+    path = path or PROFILE_PATH
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            profile.update(json.load(f))
+    profile.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return validate(profile)
+
+
+def save_profile(profile, path=None):
+    with open(path or PROFILE_PATH, "w", encoding="utf-8") as f:
+        json.dump(validate(dict(profile)), f, indent=2)
+        f.write("\n")
+
+
+_NO_LIMIT = "none"
+
+def _optional_int(value):
+    # 'none' explícito en la CLI quita el límite aunque el fichero tenga uno
+    return _NO_LIMIT if value.lower() in ("none", "null", "off") else int(value)
+
+
+def add_profile_arguments(parser):
+    group = parser.add_argument_group("perfil de rendimiento (ver lambda_profile.py)")
+    group.add_argument("--profile", help=f"Fichero de perfil (por defecto: {os.path.basename(PROFILE_PATH)})")
+    group.add_argument("--memory", type=int, help="MemorySize en MB")
+    group.add_argument("--timeout", type=int, help="Timeout de la función en segundos")
+    group.add_argument("--runtime", help="Runtime, p. ej. python3.12")
+    group.add_argument("--architecture", choices=["x86_64", "arm64"])
+    group.add_argument("--batch-size", type=int, help="BatchSize del trigger SQS")
+    group.add_argument("--batch-window", type=int, help="MaximumBatchingWindowInSeconds")
+    group.add_argument("--max-concurrency", type=_optional_int, help="ScalingConfig.MaximumConcurrency ('none' = sin límite)")
+    group.add_argument("--reserved-concurrency", type=_optional_int, help="Concurrencia reservada ('none' = quitar)")
+    group.add_argument("--max-receive-count", type=int, help="Entregas de un mensaje antes de moverlo a la DLQ")
+    group.add_argument("--dzi-min-megapixels", type=_optional_int,
+                       help="Mpx a partir de los que se genera la pirámide Deep Zoom ('none' = nunca)")
+    group.add_argument("--layers", nargs="*", metavar="ARN",
+                       help="Capas de la función, p. ej. una con Pillow (sin ARNs = quitarlas)")
+    return parser
+
+
+def profile_from_args(args):
+    overrides = {field: getattr(args, opt, None) for opt, field in _CLI_FIELDS.items()}
+    profile = load_profile(getattr(args, "profile", None), {k: v for k, v in overrides.items() if v != _NO_LIMIT})
+    profile.update({k: None for k, v in overrides.items() if v == _NO_LIMIT})
+    return validate(profile)
+
+
+# ---------- Traducción a parámetros de la API ----------
+
+def function_settings(profile):
+    """Parámetros de create_function / update_function_configuration."""
+    return {
+        "Runtime": profile["runtime"],
+        "Timeout": profile["timeout_s"],
+        "MemorySize": profile["memory_mb"],
+        "Layers": list(profile["layers"]),
+    }
+
+
+def function_environment(profile):
+    """Variables de entorno de la Lambda que salen del perfil (se suman a THUMB_BUCKET/TABLE_NAME)."""
+    env = {}
+    if profile["dzi_min_megapixels"] is not None:
+        env["DZI_MIN_PIXELS"] = str(profile["dzi_min_megapixels"] * 1_000_000)
+    return env
+
+
+def check_pillow(profile, zip_names):
+    """
+    Comprueba que la Lambda tendrá Pillow, en el ZIP (`zip_names`, nombres del paquete) o en
+    una capa del perfil. Sin él no hay renditions ni placeholder, y Deep Zoom no se puede
+    generar: con dzi_min_megapixels puesto es un error. Devuelve el aviso a mostrar, o None.
+    """
+    if profile["layers"] or any(name.startswith("PIL/") for name in zip_names):
+        return None
+    if profile["dzi_min_megapixels"] is not None:
+        raise ValueError("dzi_min_megapixels exige Pillow en la Lambda: mételo en el ZIP "
+                         "o indica una capa que lo incluya en 'layers'")
+    return ("AVISO: el paquete de la Lambda no incluye Pillow ni hay capas en el perfil; "
+            "sólo se copiarán thumbnails y se leerán dimensiones (sin renditions ni placeholder)")
+
+
+def mapping_settings(profile):
+    """Parámetros de create/update_event_source_mapping para el trigger SQS."""
+    settings = {
+        "BatchSize": profile["batch_size"],
+        "MaximumBatchingWindowInSeconds": profile["batch_window_s"],
+        "FunctionResponseTypes": ["ReportBatchItemFailures"],
+    }
+    if profile["max_concurrency"] is not None:
+        settings["ScalingConfig"] = {"MaximumConcurrency": profile["max_concurrency"]}
+    return settings
+
+
+def visibility_timeout(profile):
+    """Un mensaje no debe reaparecer mientras un lote (con sus reintentos) sigue en la función."""
+    return min(MAX_VISIBILITY_TIMEOUT, 6 * profile["timeout_s"] + profile["batch_window_s"])
+
+
+def queue_settings(profile, dlq_arn=None):
+    """Atributos de la cola principal; con `dlq_arn`, RedrivePolicy hacia la DLQ."""
+    attrs = {"VisibilityTimeout": str(visibility_timeout(profile))}
+    if dlq_arn:
+        attrs["RedrivePolicy"] = json.dumps({
+            "deadLetterTargetArn": dlq_arn,
+            "maxReceiveCount": str(profile["max_receive_count"]),
+        })
+    return attrs
+
+
+def queue_drift(attributes, profile, dlq_arn=None):
+    """Atributos de get_queue_attributes que difieren del perfil."""
+    drift = {}
+    for key, value in queue_settings(profile, dlq_arn).items():
+        current = attributes.get(key)
+        if key == "RedrivePolicy" and current:
+            # SQS puede devolver maxReceiveCount como número o como texto
+            current_policy = json.loads(current)
+            if (current_policy.get("deadLetterTargetArn") == dlq_arn
+                    and str(current_policy.get("maxReceiveCount")) == str(profile["max_receive_count"])):
+                continue
+        elif current == value:
+            continue
+        drift[key] = value
+    return drift
+
+
+def function_drift(config, profile):
+    """Campos de get_function_configuration que difieren del perfil (vacío = nada que hacer)."""
+    drift = {k: v for k, v in function_settings(profile).items() if k != "Layers" and config.get(k) != v}
+    # get_function_configuration devuelve las capas como [{"Arn": ..., "CodeSize": ...}]
+    if [layer["Arn"] for layer in config.get("Layers", [])] != profile["layers"]:
+        drift["Layers"] = list(profile["layers"])
+    if config.get("Architectures", ["x86_64"]) != [profile["architecture"]]:
+        drift["Architectures"] = [profile["architecture"]]
+    return drift
+
+
+def mapping_drift(mapping, profile):
+    """Parámetros del trigger que difieren de lo desplegado."""
+    wanted = mapping_settings(profile)
+    drift = {}
+    for key in ("BatchSize", "MaximumBatchingWindowInSeconds", "FunctionResponseTypes"):
+        if mapping.get(key, 0 if key == "MaximumBatchingWindowInSeconds" else None) != wanted[key]:
+            drift[key] = wanted[key]
+    current_max = mapping.get("ScalingConfig", {}).get("MaximumConcurrency")
+    if current_max != profile["max_concurrency"]:
+        # ScalingConfig vacío quita el límite
+        drift["ScalingConfig"] = wanted.get("ScalingConfig", {})
+    return drift
+
+
+def apply_reserved_concurrency(lambda_client, function_name, profile):
+    """Pone o quita la concurrencia reservada sólo si difiere de la actual."""
+    wanted = profile["reserved_concurrency"]
+    current = lambda_client.get_function_concurrency(FunctionName=function_name).get("ReservedConcurrentExecutions")
+    if current == wanted:
+        return False
+    if wanted is None:
+        lambda_client.delete_function_concurrency(FunctionName=function_name)
+        print(f"[Lambda] Concurrencia reservada eliminada ({function_name})")
+    else:
+        lambda_client.put_function_concurrency(FunctionName=function_name, ReservedConcurrentExecutions=wanted)
+        print(f"[Lambda] Concurrencia reservada: {wanted} ({function_name})")
+    return True
+
+
+def describe(profile):
+    conc = profile["max_concurrency"] or "sin límite"
+    reserved = profile["reserved_concurrency"] if profile["reserved_concurrency"] is not None else "no"
+    return (f"{profile['memory_mb']} MB, {profile['timeout_s']} s, {profile['runtime']}/{profile['architecture']}, "
+            f"lote {profile['batch_size']} (ventana {profile['batch_window_s']} s), "
+            f"concurrencia máx. {conc}, reservada {reserved}, "
+            f"visibilidad {visibility_timeout(profile)} s, DLQ tras {profile['max_receive_count']} entregas"
+            + (f", Deep Zoom desde {profile['dzi_min_megapixels']} Mpx" if profile["dzi_min_megapixels"] else "")
+            + (f", {len(profile['layers'])} capa(s)" if profile["layers"] else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Muestra o guarda el perfil de rendimiento de la Lambda.")
+    add_profile_arguments(parser)
+    parser.add_argument("--write", action="store_true", help="Guardar el perfil efectivo en el fichero")
+    args = parser.parse_args()
+
+    profile = profile_from_args(args)
+    print(json.dumps(profile, indent=2))
+    print(describe(profile))
+    if args.write:
+        save_profile(profile, args.profile)
+        print(f"Guardado en {args.profile or PROFILE_PATH}")
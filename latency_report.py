@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Latencia de punta a punta por imagen ("¿cuánto tarda en verse el thumbnail desde que se sube?"),
+a partir de las trazas que la Lambda guarda en ImageMetadata: TraceId y Trace, un mapa con los
+instantes (ms Unix) de cada etapa.
+
+  UploadedAt   fin de la subida a S3 (atributo del mensaje del uploader, o eventTime con --s3-events)
+  SentAt       SentTimestamp de SQS
+  ReceivedAt   inicio de la invocación de la Lambda
+  StartedAt / CopiedAt / DerivedAt / TiledAt / FinishedAt   etapas de process_image
+
+Tramos del informe (percentiles con benchmark.summarize):
+  upload_to_send   subida -> mensaje (espera del uploader al llenar mensajes multi-imagen)
+  queue            mensaje -> invocación (espera en SQS, incluidos los reintentos)
+  batch            invocación -> inicio de la imagen (imágenes anteriores del mismo lote)
+  processing       inicio -> fin de la imagen, desglosado en copy, derive y deep_zoom
+  total            subida -> fin
+
+UploadedAt sale del reloj de la máquina que sube; si no está sincronizado con AWS, upload_to_send
+y total arrastran ese desfase. Las imágenes procesadas antes de existir la traza no cuentan.
+
+Uso:
+  python latency_report.py
+  python latency_report.py --since 2025-10-20T10:00 --json latency.json
+  python latency_report.py --trace 3f2c...      # línea de tiempo de un mensaje
+"""
+import json
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from aws_clients import get_resource
+from benchmark import summarize
+from state_store import open_state
+
+# (tramo, inicio, fin); los de PROCESSING_STAGES son parte de "processing"
+SPANS = (
+    ("upload_to_send", "UploadedAt", "SentAt"),
+    ("queue", "SentAt", "ReceivedAt"),
+    ("batch", "ReceivedAt", "StartedAt"),
+    ("processing", "StartedAt", "FinishedAt"),
+    ("copy", "StartedAt", "CopiedAt"),
+    ("derive", "CopiedAt", "DerivedAt"),
+    ("deep_zoom", "DerivedAt", "TiledAt"),
+    ("total", "UploadedAt", "FinishedAt"),
+)
+PROCESSING_STAGES = ("copy", "derive", "deep_zoom")
+STAMPS = ("UploadedAt", "SentAt", "ReceivedAt", "StartedAt", "CopiedAt", "DerivedAt", "TiledAt", "FinishedAt")
+
+PROJECTION = {"#id": "ImageID", "#tid": "TraceId", "#trace": "Trace"}
+
+
+def _scan_segment(table_name, segment, total):
+    table = get_resource("dynamodb").Table(table_name)
+    kwargs = {"ProjectionExpression": ", ".join(PROJECTION), "ExpressionAttributeNames": PROJECTION,
+              "Segment": segment, "TotalSegments": total}
+    items = []
+    while True:
+        page = table.scan(**kwargs)
+        items.extend(item for item in page.get("Items", []) if item.get("Trace"))
+        if "LastEvaluatedKey" not in page:
+            return items
+        kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def scan_traces(table_name, segments=4):
+    """Items con traza: [{"ImageID", "TraceId", "Trace": {etapa: ms}}]."""
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        parts = pool.map(lambda s: _scan_segment(table_name, s, segments), range(segments))
+        return [dict(item, Trace={k: int(v) for k, v in item["Trace"].items()}) for part in parts for item in part]
+
+
+def spans(trace):
+    """{tramo: ms} de una traza, sólo los tramos con ambos extremos."""
+    return {name: trace[end] - trace[start] for name, start, end in SPANS if start in trace and end in trace}
+
+
+def build_report(items, slowest=10):
+    durations = {name: [] for name, _, _ in SPANS}
+    totals = []
+    for item in items:
+        measured = spans(item["Trace"])
+        for name, ms in measured.items():
+            durations[name].append(ms / 1000)      # summarize() espera segundos
+        if "total" in measured:
+            totals.append((measured["total"], item["ImageID"], item.get("TraceId")))
+    totals.sort(reverse=True)
+    return {
+        "images": len(items),
+        "latency_ms": {name: summarize(values) for name, values in durations.items()},
+        "slowest": [{"key": key, "trace": trace_id, "total_ms": ms} for ms, key, trace_id in totals[:slowest]],
+    }
+
+
+def print_report(report):
+    print(f"[Latency] {report['images']} imágenes con traza")
+    print(f"{'tramo':<18}{'n':>7}{'media':>11}{'p50':>11}{'p90':>11}{'p99':>11}{'max':>11}   (ms)")
+    for name, stats in report["latency_ms"].items():
+        label = f"  {name}" if name in PROCESSING_STAGES else name
+        if not stats["n"]:
+            print(f"{label:<18}{0:>7}")
+            continue
+        print(f"{label:<18}{stats['n']:>7}" + "".join(f"{stats[k]:>11.1f}" for k in ("mean", "p50", "p90", "p99", "max")))
+    if report["slowest"]:
+        print("Más lentas (total):")
+        for row in report["slowest"]:
+            print(f"  {row['total_ms']:>9} ms  {row['key']}  [{row['trace']}]")
+
+
+def print_timeline(items, trace_id):
+    """Etapas de cada imagen de un mensaje, relativas a su subida (o al primer instante conocido)."""
+    matches = sorted((item for item in items if item.get("TraceId") == trace_id), key=lambda item: item["ImageID"])
+    if not matches:
+        print(f"[Latency] No hay imágenes con TraceId {trace_id}")
+        return
+    for item in matches:
+        trace = item["Trace"]
+        origin = min(trace.values())
+        print(item["ImageID"])
+        for stamp in STAMPS:
+            if stamp in trace:
+                when = datetime.fromtimestamp(trace[stamp] / 1000, timezone.utc).isoformat(timespec="milliseconds")
+                print(f"  {stamp:<12} +{trace[stamp] - origin:>8} ms  {when}")
+
+
+def _since_ms(value):
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Informe de latencia de punta a punta a partir de las trazas de ImageMetadata.")
+    parser.add_argument("--table", help="Tabla de metadatos (por defecto: dynamodb-table del registro)")
+    parser.add_argument("--segments", type=int, default=4, help="Segmentos del scan paralelo de DynamoDB")
+    parser.add_argument("--since", help="Sólo imágenes terminadas desde este instante ISO-8601 (UTC si no lleva zona)")
+    parser.add_argument("--slowest", type=int, default=10, help="Imágenes más lentas a listar (por defecto: %(default)s)")
+    parser.add_argument("--trace", help="Mostrar la línea de tiempo de un TraceId en lugar del informe")
+    parser.add_argument("--json", metavar="FICHERO", help="Guardar también el informe en JSON")
+    args = parser.parse_args()
+
+    table_name = args.table or open_state().as_dict().get("dynamodb-table", "ImageMetadata")
+    items = scan_traces(table_name, args.segments)
+    if args.since:
+        since = _since_ms(args.since)
+        items = [item for item in items if item["Trace"].get("FinishedAt", 0) >= since]
+
+    if args.trace:
+        print_timeline(items, args.trace)
+    else:
+        report = build_report(items, args.slowest)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Guardado en {args.json}")
@@ -0,0 +1,852 @@
+#!/usr/bin/env python3
+"""
+Sustitutos locales (sin red) de S3, SQS y DynamoDB para ejecutar todo el pipeline en una
+sola máquina. Implementan el subconjunto de la API de boto3 que usan los scripts del proyecto.
+
+- S3: cada bucket es un directorio bajo $LOCAL_AWS_DIR/s3/<bucket>/; los metadatos de los
+  objetos (ContentType, ETag, ...) y la configuración de notificaciones van en s3.db (SQLite).
+- SQS: cola sobre SQLite (sqs.db) con visibility timeout, long polling, receive count y
+  RedrivePolicy (los mensajes pasan a la DLQ tras maxReceiveCount entregas).
+- DynamoDB: almacén clave-valor sobre SQLite (dynamodb.db); los items se guardan como JSON.
+
+Se activa con PIPELINE_BACKEND=local (ver aws_clients.py). Todo es seguro entre hilos y
+procesos: cada hilo abre su propia conexión y las escrituras usan BEGIN IMMEDIATE.
+"""
+import os
+import io
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import itertools
+import threading
+from decimal import Decimal
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+REGION = "local"
+ACCOUNT_ID = "000000000000"
+
+def base_dir():
+    return os.path.abspath(os.getenv("LOCAL_AWS_DIR", ".local_aws"))
+
+
+# ---------- Utilidades comunes ----------
+class _Database:
+    """Una conexión SQLite por hilo (y por proceso) sobre el mismo fichero."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.schema)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _error(code, message, operation, status=400):
+    return ClientError(
+        {"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        operation,
+    )
+
+
+class _Exceptions:
+    """Equivalente a `client.exceptions`: clases nombradas derivadas de ClientError."""
+
+    def __init__(self, *names):
+        for name in names:
+            setattr(self, name, type(name, (ClientError,), {}))
+
+    def raise_(self, name, message, operation, status=400):
+        cls = getattr(self, name)
+        raise cls({"Error": {"Code": name, "Message": message},
+                   "ResponseMetadata": {"HTTPStatusCode": status}}, operation)
+
+
+class _Paginator:
+    def __init__(self, method, input_token, output_token, more_key=None):
+        self.method = method
+        self.input_token = input_token
+        self.output_token = output_token
+        self.more_key = more_key
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self.method(**kwargs)
+            yield page
+            token = page.get(self.output_token)
+            if not token or (self.more_key and not page.get(self.more_key)):
+                return
+            kwargs[self.input_token] = token
+
+
+class _Waiter:
+    """Los recursos locales se crean de forma síncrona: no hay nada que esperar."""
+
+    def wait(self, **kwargs):
+        return None
+
+
+class _Meta:
+    def __init__(self, region_name):
+        self.region_name = region_name
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+# ---------- S3 ----------
+_S3_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY, created REAL, notification TEXT
+);
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT, key TEXT, size INTEGER, etag TEXT, content_type TEXT,
+    last_modified REAL, extra TEXT, PRIMARY KEY (bucket, key)
+);
+"""
+
+# Cabeceras que S3 conserva como metadatos del objeto
+_S3_EXTRA_FIELDS = ("CacheControl", "ContentEncoding", "ContentDisposition", "Metadata")
+
+
+class LocalS3:
+    def __init__(self, root=None):
+        self.root = root or base_dir()
+        self.db = _Database(os.path.join(self.root, "s3.db"), _S3_SCHEMA)
+        self.meta = _Meta(REGION)
+        self.exceptions = _Exceptions("NoSuchBucket", "NoSuchKey", "BucketAlreadyOwnedByYou")
+        self._sqs = None  # para las notificaciones ObjectCreated
+
+    # --- rutas ---
+    def bucket_path(self, bucket):
+        return os.path.join(self.root, "s3", bucket)
+
+    def _object_path(self, bucket, key):
+        path = os.path.normpath(os.path.join(self.bucket_path(bucket), key))
+        if not path.startswith(self.bucket_path(bucket) + os.sep):
+            raise _error("InvalidKey", f"Clave no válida: {key}", "PutObject")
+        return path
+
+    def _require_bucket(self, bucket, operation):
+        row = self.db.execute("SELECT name FROM buckets WHERE name = ?", (bucket,)).fetchone()
+        if row is None:
+            self.exceptions.raise_("NoSuchBucket", f"The specified bucket does not exist: {bucket}",
+                                   operation, 404)
+
+    # --- buckets ---
+    def create_bucket(self, Bucket, CreateBucketConfiguration=None, **kwargs):
+        with self.db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM buckets WHERE name = ?", (Bucket,)).fetchone():
+                self.exceptions.raise_("BucketAlreadyOwnedByYou", Bucket, "CreateBucket", 409)
+            conn.execute("INSERT INTO buckets (name, created) VALUES (?, ?)", (Bucket, time.time()))
+        os.makedirs(self.bucket_path(Bucket), exist_ok=True)
+        return {"Location": f"/{Bucket}"}
+
+    def head_bucket(self, Bucket):
+        row = self.db.execute("SELECT 1 FROM buckets WHERE name = ?", (Bucket,)).fetchone()
+        if row is None:
+            raise _error("404", "Not Found", "HeadBucket", 404)
+        return {}
+
+    def get_bucket_location(self, Bucket):
+        self._require_bucket(Bucket, "GetBucketLocation")
+        return {"LocationConstraint": None}
+
+    def delete_bucket(self, Bucket):
+        self._require_bucket(Bucket, "DeleteBucket")
+        with self.db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM objects WHERE bucket = ? LIMIT 1", (Bucket,)).fetchone():
+                raise _error("BucketNotEmpty", "The bucket you tried to delete is not empty", "DeleteBucket", 409)
+            conn.execute("DELETE FROM buckets WHERE name = ?", (Bucket,))
+        shutil.rmtree(self.bucket_path(Bucket), ignore_errors=True)
+        return {}
+
+    # Configuración sin efecto en local (hosting, políticas, BPA)
+    def put_public_access_block(self, **kwargs):
+        return {}
+
+    def put_bucket_policy(self, **kwargs):
+        return {}
+
+    def put_bucket_website(self, **kwargs):
+        return {}
+
+    def put_bucket_notification_configuration(self, Bucket, NotificationConfiguration):
+        self._require_bucket(Bucket, "PutBucketNotificationConfiguration")
+        self.db.execute(
+            "UPDATE buckets SET notification = ? WHERE name = ?",
+            (json.dumps(NotificationConfiguration), Bucket),
+        )
+        return {}
+
+    def _notify(self, bucket, key, size, etag, event_name="ObjectCreated:Put"):
+        row = self.db.execute("SELECT notification FROM buckets WHERE name = ?", (bucket,)).fetchone()
+        if not row or not row[0]:
+            return
+        for cfg in json.loads(row[0]).get("QueueConfigurations", []):
+            if not any(_event_matches(event_name, e) for e in cfg.get("Events", [])):
+                continue
+            record = {
+                "eventVersion": "2.1",
+                "eventSource": "aws:s3",
+                "awsRegion": REGION,
+                "eventTime": datetime.now(timezone.utc).isoformat(),
+                "eventName": event_name,
+                "s3": {
+                    "configurationId": cfg.get("Id", ""),
+                    "bucket": {"name": bucket, "arn": f"arn:aws:s3:::{bucket}"},
+                    "object": {"key": _quote_plus(key), "size": size, "eTag": etag.strip('"')},
+                },
+            }
+            queue_name = cfg["QueueArn"].rsplit(":", 1)[-1]
+            if self._sqs is None:
+                self._sqs = LocalSQS(self.root)
+            self._sqs.send_message(
+                QueueUrl=_queue_url(queue_name), MessageBody=json.dumps({"Records": [record]})
+            )
+
+    # --- objetos ---
+    def _store(self, bucket, key, data, content_type=None, extra=None, operation="PutObject"):
+        self._require_bucket(bucket, operation)
+        path = self._object_path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self.db.execute(
+            "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (bucket, key, len(data), etag, content_type or "binary/octet-stream", time.time(),
+             json.dumps(extra or {})),
+        )
+        self._notify(bucket, key, len(data), etag, f"ObjectCreated:{operation.replace('Object', '') or 'Put'}")
+        return etag
+
+    def put_object(self, Bucket, Key, Body=b"", ContentType=None, **kwargs):
+        data = Body.read() if hasattr(Body, "read") else Body
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        extra = {k: v for k, v in kwargs.items() if k in _S3_EXTRA_FIELDS}
+        etag = self._store(Bucket, Key, data, ContentType, extra)
+        return {"ETag": etag}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        with open(Filename, "rb") as f:
+            data = f.read()
+        extra = dict(ExtraArgs or {})
+        content_type = extra.pop("ContentType", None)
+        self._store(Bucket, Key, data, content_type,
+                    {k: v for k, v in extra.items() if k in _S3_EXTRA_FIELDS})
+        if Callback:
+            Callback(len(data))
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        extra = dict(ExtraArgs or {})
+        content_type = extra.pop("ContentType", None)
+        data = Fileobj.read()
+        self._store(Bucket, Key, data, content_type,
+                    {k: v for k, v in extra.items() if k in _S3_EXTRA_FIELDS})
+
+    def _row(self, bucket, key, operation):
+        self._require_bucket(bucket, operation)
+        row = self.db.execute(
+            "SELECT size, etag, content_type, last_modified, extra FROM objects WHERE bucket = ? AND key = ?",
+            (bucket, key),
+        ).fetchone()
+        if row is None:
+            if operation == "HeadObject":
+                raise _error("404", "Not Found", operation, 404)
+            self.exceptions.raise_("NoSuchKey", "The specified key does not exist.", operation, 404)
+        size, etag, content_type, last_modified, extra = row
+        head = {
+            "ContentLength": size,
+            "ETag": etag,
+            "ContentType": content_type,
+            "LastModified": datetime.fromtimestamp(last_modified, timezone.utc),
+            "Metadata": {},
+        }
+        head.update(json.loads(extra))
+        return head
+
+    def head_object(self, Bucket, Key, **kwargs):
+        return self._row(Bucket, Key, "HeadObject")
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        head = self._row(Bucket, Key, "GetObject")
+        with open(self._object_path(Bucket, Key), "rb") as f:
+            data = f.read()
+        if Range:
+            # Sólo "bytes=inicio-fin" / "bytes=inicio-"
+            start, _, end = Range.split("=", 1)[1].partition("-")
+            start = int(start)
+            end = int(end) if end else len(data) - 1
+            head["ContentRange"] = f"bytes {start}-{min(end, len(data) - 1)}/{len(data)}"
+            data = data[start:end + 1]
+            head["ContentLength"] = len(data)
+        head["Body"] = _StreamingBody(data)
+        return head
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        self._row(Bucket, Key, "GetObject")
+        shutil.copyfile(self._object_path(Bucket, Key), Filename)
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective="COPY", ContentType=None, **kwargs):
+        src = self._row(CopySource["Bucket"], CopySource["Key"], "CopyObject")
+        with open(self._object_path(CopySource["Bucket"], CopySource["Key"]), "rb") as f:
+            data = f.read()
+        if MetadataDirective == "REPLACE":
+            extra = {k: v for k, v in kwargs.items() if k in _S3_EXTRA_FIELDS}
+        else:
+            extra = {k: src[k] for k in _S3_EXTRA_FIELDS if k in src}
+            ContentType = src["ContentType"]
+        etag = self._store(Bucket, Key, data, ContentType, extra, "CopyObject")
+        return {"CopyObjectResult": {"ETag": etag, "LastModified": datetime.now(timezone.utc)}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._require_bucket(Bucket, "DeleteObject")
+        self.db.execute("DELETE FROM objects WHERE bucket = ? AND key = ?", (Bucket, Key))
+        try:
+            os.remove(self._object_path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        deleted = []
+        for obj in Delete.get("Objects", []):
+            self.delete_object(Bucket=Bucket, Key=obj["Key"])
+            deleted.append({"Key": obj["Key"]})
+        return {} if Delete.get("Quiet") else {"Deleted": deleted}
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, MaxKeys=1000,
+                        ContinuationToken=None, StartAfter=None, **kwargs):
+        self._require_bucket(Bucket, "ListObjectsV2")
+        start = ContinuationToken or StartAfter or ""
+        rows = self.db.execute(
+            "SELECT key, size, etag, last_modified FROM objects "
+            "WHERE bucket = ? AND key > ? AND substr(key, 1, ?) = ? ORDER BY key",
+            (Bucket, start, len(Prefix), Prefix),
+        )
+        contents, prefixes = [], []
+        last = None
+        truncated = False
+        for key, size, etag, last_modified in rows:
+            if len(contents) + len(prefixes) >= MaxKeys:
+                truncated = True
+                break
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common = Prefix + rest.split(Delimiter, 1)[0] + Delimiter
+                if not prefixes or prefixes[-1]["Prefix"] != common:
+                    prefixes.append({"Prefix": common})
+                # Saltar el resto de claves bajo el mismo prefijo común
+                last = common + "\U0010ffff"
+                continue
+            contents.append({
+                "Key": key,
+                "Size": size,
+                "ETag": etag,
+                "LastModified": datetime.fromtimestamp(last_modified, timezone.utc),
+                "StorageClass": "STANDARD",
+            })
+            last = key
+        rows.close()
+        page = {
+            "Name": Bucket,
+            "Prefix": Prefix,
+            "KeyCount": len(contents) + len(prefixes),
+            "MaxKeys": MaxKeys,
+            "IsTruncated": truncated,
+        }
+        if contents:
+            page["Contents"] = contents
+        if prefixes:
+            page["CommonPrefixes"] = prefixes
+        if truncated:
+            page["NextContinuationToken"] = last
+        return page
+
+    def list_object_versions(self, Bucket, **kwargs):
+        # Los buckets locales no tienen versionado
+        self._require_bucket(Bucket, "ListObjectVersions")
+        return {"Versions": [], "DeleteMarkers": [], "IsTruncated": False}
+
+    def list_multipart_uploads(self, Bucket, **kwargs):
+        self._require_bucket(Bucket, "ListMultipartUploads")
+        return {"Uploads": [], "IsTruncated": False}
+
+    def get_paginator(self, name):
+        if name == "list_objects_v2":
+            return _Paginator(self.list_objects_v2, "ContinuationToken", "NextContinuationToken", "IsTruncated")
+        if name == "list_object_versions":
+            return _Paginator(self.list_object_versions, "KeyMarker", "NextKeyMarker", "IsTruncated")
+        if name == "list_multipart_uploads":
+            return _Paginator(self.list_multipart_uploads, "KeyMarker", "NextKeyMarker", "IsTruncated")
+        raise ValueError(f"Paginador no soportado en local: {name}")
+
+    def get_waiter(self, name):
+        return _Waiter()
+
+
+class _StreamingBody(io.BytesIO):
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _event_matches(event_name, pattern):
+    pattern = pattern.split(":", 1)[1] if pattern.startswith("s3:") else pattern
+    if pattern.endswith("*"):
+        return event_name.startswith(pattern[:-1])
+    return event_name == pattern
+
+
+def _quote_plus(key):
+    from urllib.parse import quote_plus
+    return quote_plus(key, safe="/")
+
+
+# ---------- SQS ----------
+_SQS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queues (
+    name TEXT PRIMARY KEY, attributes TEXT, created REAL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY, queue TEXT, body TEXT, message_attributes TEXT,
+    sent_ms INTEGER, visible_at REAL, receive_count INTEGER DEFAULT 0,
+    first_receive_ms INTEGER, receipt_handle TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_visible ON messages (queue, visible_at);
+"""
+
+
+def _queue_url(name):
+    return f"http://localhost/{ACCOUNT_ID}/{name}"
+
+
+def _queue_name(url):
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _redrive_target(attrs):
+    """(nombre de la DLQ, maxReceiveCount) de la RedrivePolicy de la cola, o None."""
+    policy = attrs.get("RedrivePolicy")
+    if not policy:
+        return None
+    policy = json.loads(policy)
+    return policy["deadLetterTargetArn"].rsplit(":", 1)[-1], int(policy["maxReceiveCount"])
+
+
+class LocalSQS:
+    def __init__(self, root=None):
+        self.root = root or base_dir()
+        self.db = _Database(os.path.join(self.root, "sqs.db"), _SQS_SCHEMA)
+        self.meta = _Meta(REGION)
+        self.exceptions = _Exceptions("QueueDoesNotExist", "ReceiptHandleIsInvalid")
+
+    def _attributes(self, url, operation):
+        name = _queue_name(url)
+        row = self.db.execute("SELECT attributes FROM queues WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            self.exceptions.raise_("QueueDoesNotExist", f"The specified queue does not exist: {url}", operation)
+        return name, json.loads(row[0])
+
+    def create_queue(self, QueueName, Attributes=None):
+        attrs = {"VisibilityTimeout": "30", "MessageRetentionPeriod": "345600"}
+        attrs.update(Attributes or {})
+        attrs["QueueArn"] = f"arn:aws:sqs:{REGION}:{ACCOUNT_ID}:{QueueName}"
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT attributes FROM queues WHERE name = ?", (QueueName,)).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO queues VALUES (?, ?, ?)", (QueueName, json.dumps(attrs), time.time()))
+        return {"QueueUrl": _queue_url(QueueName)}
+
+    def get_queue_url(self, QueueName, **kwargs):
+        self._attributes(_queue_url(QueueName), "GetQueueUrl")
+        return {"QueueUrl": _queue_url(QueueName)}
+
+    def list_queues(self, QueueNamePrefix="", **kwargs):
+        rows = self.db.execute("SELECT name FROM queues ORDER BY name").fetchall()
+        return {"QueueUrls": [_queue_url(r[0]) for r in rows if r[0].startswith(QueueNamePrefix)]}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=("All",)):
+        name, attrs = self._attributes(QueueUrl, "GetQueueAttributes")
+        now = time.time()
+        visible, in_flight = self.db.execute(
+            "SELECT SUM(visible_at <= ?), SUM(visible_at > ?) FROM messages WHERE queue = ?",
+            (now, now, name),
+        ).fetchone()
+        attrs["ApproximateNumberOfMessages"] = str(visible or 0)
+        attrs["ApproximateNumberOfMessagesNotVisible"] = str(in_flight or 0)
+        if "All" not in AttributeNames:
+            attrs = {k: v for k, v in attrs.items() if k in AttributeNames}
+        return {"Attributes": attrs}
+
+    def set_queue_attributes(self, QueueUrl, Attributes):
+        name, attrs = self._attributes(QueueUrl, "SetQueueAttributes")
+        attrs.update(Attributes)
+        self.db.execute("UPDATE queues SET attributes = ? WHERE name = ?", (json.dumps(attrs), name))
+        return {}
+
+    def delete_queue(self, QueueUrl):
+        name, _ = self._attributes(QueueUrl, "DeleteQueue")
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM messages WHERE queue = ?", (name,))
+            conn.execute("DELETE FROM queues WHERE name = ?", (name,))
+        return {}
+
+    def purge_queue(self, QueueUrl):
+        name, _ = self._attributes(QueueUrl, "PurgeQueue")
+        self.db.execute("DELETE FROM messages WHERE queue = ?", (name,))
+        return {}
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes=None, DelaySeconds=0, **kwargs):
+        name, _ = self._attributes(QueueUrl, "SendMessage")
+        message_id = str(uuid.uuid4())
+        self.db.execute(
+            "INSERT INTO messages (id, queue, body, message_attributes, sent_ms, visible_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (message_id, name, MessageBody, json.dumps(MessageAttributes or {}), _now_ms(),
+             time.time() + DelaySeconds),
+        )
+        return {"MessageId": message_id, "MD5OfMessageBody": hashlib.md5(MessageBody.encode()).hexdigest()}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        successful = []
+        for entry in Entries:
+            resp = self.send_message(
+                QueueUrl=QueueUrl,
+                MessageBody=entry["MessageBody"],
+                MessageAttributes=entry.get("MessageAttributes"),
+                DelaySeconds=entry.get("DelaySeconds", 0),
+            )
+            successful.append({"Id": entry["Id"], "MessageId": resp["MessageId"]})
+        return {"Successful": successful, "Failed": []}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=None,
+                        AttributeNames=None, MessageAttributeNames=None, MessageSystemAttributeNames=None,
+                        **kwargs):
+        name, attrs = self._attributes(QueueUrl, "ReceiveMessage")
+        visibility = float(VisibilityTimeout if VisibilityTimeout is not None else attrs["VisibilityTimeout"])
+        deadline = time.time() + (WaitTimeSeconds or 0)
+        while True:
+            messages = self._claim(name, MaxNumberOfMessages, visibility, _redrive_target(attrs))
+            if messages or time.time() >= deadline:
+                break
+            time.sleep(min(0.2, max(0.0, deadline - time.time())))
+        wanted_attrs = set(AttributeNames or []) | set(MessageSystemAttributeNames or [])
+        out = []
+        for m in messages:
+            msg = {
+                "MessageId": m["id"],
+                "ReceiptHandle": m["receipt_handle"],
+                "Body": m["body"],
+                "MD5OfBody": hashlib.md5(m["body"].encode()).hexdigest(),
+            }
+            system = {
+                "SentTimestamp": str(m["sent_ms"]),
+                "ApproximateReceiveCount": str(m["receive_count"]),
+                "ApproximateFirstReceiveTimestamp": str(m["first_receive_ms"]),
+                "SenderId": ACCOUNT_ID,
+            }
+            if wanted_attrs:
+                msg["Attributes"] = system if "All" in wanted_attrs else {
+                    k: v for k, v in system.items() if k in wanted_attrs
+                }
+            message_attrs = json.loads(m["message_attributes"])
+            if MessageAttributeNames and message_attrs:
+                if "All" not in MessageAttributeNames and ".*" not in MessageAttributeNames:
+                    message_attrs = {k: v for k, v in message_attrs.items() if k in MessageAttributeNames}
+                if message_attrs:
+                    msg["MessageAttributes"] = message_attrs
+            out.append(msg)
+        return {"Messages": out} if out else {}
+
+    def _claim(self, queue, limit, visibility, redrive=None):
+        now = time.time()
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, body, message_attributes, sent_ms, receive_count, first_receive_ms FROM messages "
+                "WHERE queue = ? AND visible_at <= ? ORDER BY sent_ms LIMIT ?",
+                (queue, now, min(int(limit), 10)),
+            ).fetchall()
+            if redrive and conn.execute("SELECT 1 FROM queues WHERE name = ?", (redrive[0],)).fetchone() is None:
+                redrive = None  # DLQ borrada: como en SQS, los mensajes se siguen entregando
+            claimed = []
+            for id_, body, message_attributes, sent_ms, receive_count, first_receive_ms in rows:
+                if redrive and receive_count >= redrive[1]:
+                    # Ya se entregó maxReceiveCount veces: pasa a la DLQ conservando id y SentTimestamp
+                    conn.execute(
+                        "UPDATE messages SET queue = ?, visible_at = ?, receive_count = 0, "
+                        "first_receive_ms = NULL, receipt_handle = NULL WHERE id = ?",
+                        (redrive[0], now, id_),
+                    )
+                    continue
+                handle = f"{id_}#{uuid.uuid4().hex}"
+                first = first_receive_ms or _now_ms()
+                conn.execute(
+                    "UPDATE messages SET visible_at = ?, receive_count = ?, first_receive_ms = ?, "
+                    "receipt_handle = ? WHERE id = ?",
+                    (now + visibility, receive_count + 1, first, handle, id_),
+                )
+                claimed.append({
+                    "id": id_, "body": body, "message_attributes": message_attributes, "sent_ms": sent_ms,
+                    "receive_count": receive_count + 1, "first_receive_ms": first, "receipt_handle": handle,
+                })
+        return claimed
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        name, _ = self._attributes(QueueUrl, "DeleteMessage")
+        self.db.execute("DELETE FROM messages WHERE queue = ? AND receipt_handle = ?", (name, ReceiptHandle))
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        for entry in Entries:
+            self.delete_message(QueueUrl=QueueUrl, ReceiptHandle=entry["ReceiptHandle"])
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        name, _ = self._attributes(QueueUrl, "ChangeMessageVisibility")
+        cur = self.db.execute(
+            "UPDATE messages SET visible_at = ? WHERE queue = ? AND receipt_handle = ?",
+            (time.time() + VisibilityTimeout, name, ReceiptHandle),
+        )
+        if cur.rowcount == 0:
+            self.exceptions.raise_("ReceiptHandleIsInvalid", "The receipt handle is not valid",
+                                   "ChangeMessageVisibility")
+        return {}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        successful, failed = [], []
+        for entry in Entries:
+            try:
+                self.change_message_visibility(QueueUrl, entry["ReceiptHandle"], entry["VisibilityTimeout"])
+                successful.append({"Id": entry["Id"]})
+            except ClientError as e:
+                failed.append({"Id": entry["Id"], "Code": e.response["Error"]["Code"], "SenderFault": True})
+        return {"Successful": successful, "Failed": failed}
+
+
+# ---------- DynamoDB ----------
+_DDB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    name TEXT PRIMARY KEY, definition TEXT, created REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    table_name TEXT, pk TEXT, item TEXT, PRIMARY KEY (table_name, pk)
+);
+"""
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Tipo no serializable: {type(value)}")
+
+
+class LocalDynamoDB:
+    """Cliente de bajo nivel: sólo gestión de tablas (los items van por LocalTable)."""
+
+    def __init__(self, root=None):
+        self.root = root or base_dir()
+        self.db = _Database(os.path.join(self.root, "dynamodb.db"), _DDB_SCHEMA)
+        self.meta = _Meta(REGION)
+        self.exceptions = _Exceptions("ResourceInUseException", "ResourceNotFoundException")
+
+    def _definition(self, name, operation):
+        row = self.db.execute("SELECT definition FROM tables WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            self.exceptions.raise_("ResourceNotFoundException", f"Requested resource not found: Table: {name}",
+                                   operation)
+        return json.loads(row[0])
+
+    def create_table(self, TableName, KeySchema, AttributeDefinitions, **kwargs):
+        definition = dict(kwargs, TableName=TableName, KeySchema=KeySchema,
+                          AttributeDefinitions=AttributeDefinitions)
+        with self.db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM tables WHERE name = ?", (TableName,)).fetchone():
+                self.exceptions.raise_("ResourceInUseException", f"Table already exists: {TableName}",
+                                       "CreateTable")
+            conn.execute("INSERT INTO tables VALUES (?, ?, ?)", (TableName, json.dumps(definition), time.time()))
+        return {"TableDescription": self._describe(definition)}
+
+    def _describe(self, definition):
+        desc = dict(definition)
+        desc["TableStatus"] = "ACTIVE"
+        desc["TableArn"] = f"arn:aws:dynamodb:{REGION}:{ACCOUNT_ID}:table/{definition['TableName']}"
+        desc["BillingModeSummary"] = {"BillingMode": definition.get("BillingMode", "PROVISIONED")}
+        desc["ItemCount"] = self.db.execute(
+            "SELECT COUNT(*) FROM items WHERE table_name = ?", (definition["TableName"],)
+        ).fetchone()[0]
+        return desc
+
+    def describe_table(self, TableName):
+        return {"Table": self._describe(self._definition(TableName, "DescribeTable"))}
+
+    def update_table(self, TableName, GlobalSecondaryIndexUpdates=(), AttributeDefinitions=None, **kwargs):
+        definition = self._definition(TableName, "UpdateTable")
+        definition.update(kwargs)
+        if AttributeDefinitions:
+            known = {a["AttributeName"] for a in definition["AttributeDefinitions"]}
+            definition["AttributeDefinitions"] += [a for a in AttributeDefinitions if a["AttributeName"] not in known]
+        # Los índices sólo se registran (y aparecen en describe_table): no hay Query sobre ellos
+        indexes = definition.setdefault("GlobalSecondaryIndexes", [])
+        for update in GlobalSecondaryIndexUpdates:
+            if "Create" in update:
+                indexes.append(update["Create"])
+            elif "Delete" in update:
+                indexes[:] = [i for i in indexes if i["IndexName"] != update["Delete"]["IndexName"]]
+        self.db.execute("UPDATE tables SET definition = ? WHERE name = ?", (json.dumps(definition), TableName))
+        return {"TableDescription": self._describe(definition)}
+
+    def delete_table(self, TableName):
+        definition = self._definition(TableName, "DeleteTable")
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM items WHERE table_name = ?", (TableName,))
+            conn.execute("DELETE FROM tables WHERE name = ?", (TableName,))
+        return {"TableDescription": dict(definition, TableStatus="DELETING")}
+
+    def list_tables(self, **kwargs):
+        return {"TableNames": [r[0] for r in self.db.execute("SELECT name FROM tables ORDER BY name")]}
+
+    def get_waiter(self, name):
+        return _Waiter()
+
+
+def _segment(pk, total):
+    return int(hashlib.md5(pk.encode()).hexdigest(), 16) % total if total > 1 else 0
+
+
+class LocalTable:
+    """Equivalente a `boto3.resource("dynamodb").Table(name)` para las operaciones usadas."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.table_name = name
+
+    def _key_names(self):
+        definition = self.client._definition(self.name, "GetItem")
+        return [k["AttributeName"] for k in definition["KeySchema"]]
+
+    def _pk(self, item):
+        return json.dumps([item[k] for k in self._key_names()], default=_json_default)
+
+    def put_item(self, Item, **kwargs):
+        self.client.db.execute(
+            "INSERT OR REPLACE INTO items VALUES (?, ?, ?)",
+            (self.name, self._pk(Item), json.dumps(Item, default=_json_default)),
+        )
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        row = self.client.db.execute(
+            "SELECT item FROM items WHERE table_name = ? AND pk = ?", (self.name, self._pk(Key))
+        ).fetchone()
+        return {"Item": json.loads(row[0], parse_float=Decimal)} if row else {}
+
+    def delete_item(self, Key, **kwargs):
+        self.client.db.execute("DELETE FROM items WHERE table_name = ? AND pk = ?", (self.name, self._pk(Key)))
+        return {}
+
+    def scan(self, Limit=1000, ExclusiveStartKey=None, Segment=0, TotalSegments=1, **kwargs):
+        start = self._pk(ExclusiveStartKey) if ExclusiveStartKey else ""
+        # Scan paralelo: cada segmento ve las claves cuyo hash cae en él
+        rows = self.client.db.execute(
+            "SELECT pk, item FROM items WHERE table_name = ? AND pk > ? ORDER BY pk",
+            (self.name, start),
+        )
+        rows = list(itertools.islice((r for r in rows if _segment(r[0], TotalSegments) == Segment), Limit + 1))
+        items = [json.loads(r[1], parse_float=Decimal) for r in rows[:Limit]]
+        page = {"Items": items, "Count": len(items), "ScannedCount": len(items)}
+        if len(rows) > Limit:
+            page["LastEvaluatedKey"] = {k: items[-1][k] for k in self._key_names()}
+        return page
+
+    def batch_writer(self, **kwargs):
+        return _BatchWriter(self)
+
+
+class _BatchWriter:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self.table.delete_item(Key=Key)
+
+
+class LocalDynamoDBResource:
+    def __init__(self, root=None):
+        self.meta = type("meta", (), {})()
+        self.meta.client = LocalDynamoDB(root)
+
+    def Table(self, name):
+        return LocalTable(self.meta.client, name)
+
+
+# ---------- Fábricas ----------
+_CLIENTS = {"s3": LocalS3, "sqs": LocalSQS, "dynamodb": LocalDynamoDB}
+
+
+def client(service, region=None):
+    if service not in _CLIENTS:
+        raise ValueError(f"Servicio '{service}' no disponible en modo local (PIPELINE_BACKEND=local)")
+    return _CLIENTS[service]()
+
+
+def resource(service, region=None):
+    if service != "dynamodb":
+        raise ValueError(f"Recurso '{service}' no disponible en modo local")
+    return LocalDynamoDBResource()
+
+
+def bucket_path(bucket):
+    return LocalS3().bucket_path(bucket)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Consumidor local de la cola: hace el papel del trigger SQS -> Lambda cuando el pipeline
+corre en modo offline (PIPELINE_BACKEND=local). Lee lotes de la cola local, llama a
+lambda_handler y borra los mensajes que no vuelven en batchItemFailures. Es la versión
+de un solo proceso de worker.py, cómoda para depurar.
+
+Uso:
+  PIPELINE_BACKEND=local python setup.py
+  PIPELINE_BACKEND=local python upload_folder_images.py
+  PIPELINE_BACKEND=local python local_worker.py --drain
+"""
+import os
+import time
+import argparse
+from dotenv import load_dotenv
+
+# Antes de importar nada del pipeline: este worker sólo tiene sentido en modo local
+os.environ["PIPELINE_BACKEND"] = "local"
+
+from aws_clients import get_client
+from state_store import open_state
+from worker import load_handler, process_messages, queue_visibility_timeout
+
+def run(sqs, queue_url, queue_arn, handler, batch_size=10, wait_seconds=1, drain=False, idle_exit=None):
+    """Bucle principal. Con drain=True termina en cuanto la cola queda vacía."""
+    processed = 0
+    visibility_timeout = queue_visibility_timeout(sqs, queue_url)
+    idle_since = time.time()
+    while True:
+        resp = sqs.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=min(batch_size, 10),
+            WaitTimeSeconds=wait_seconds,
+            AttributeNames=["All"],
+            MessageAttributeNames=["All"],
+        )
+        messages = resp.get("Messages", [])
+        if not messages:
+            if drain:
+                break
+            if idle_exit is not None and time.time() - idle_since >= idle_exit:
+                break
+            continue
+        idle_since = time.time()
+
+        ok, failed = process_messages(sqs, queue_url, queue_arn, "local", handler, messages, visibility_timeout)
+        processed += ok
+        if failed:
+            print(f"[Worker] {failed} mensajes fallidos volverán a la cola tras el visibility timeout")
+    print(f"[Worker] Mensajes procesados: {processed}")
+    return processed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procesa la cola local llamando a lambda_handler.")
+    parser.add_argument("--batch-size", type=int, default=10, help="Mensajes por invocación (máx. 10)")
+    parser.add_argument("--drain", action="store_true", help="Terminar cuando la cola esté vacía")
+    parser.add_argument("--idle-exit", type=float, help="Terminar tras N segundos sin mensajes")
+    args = parser.parse_args()
+
+    load_dotenv()
+    with open_state() as db:
+        queue_url = db.get("messages-queue")
+        queue_arn = db.get("messages-queue-arn")
+        thumbs_bucket = db.get("thumbnails-bucket")
+        table_name = db.get("dynamodb-table")
+
+    if not queue_url or not thumbs_bucket or not table_name:
+        raise RuntimeError(f"Faltan recursos en el entorno '{db.env}' de {db.path}: ejecuta antes 'PIPELINE_BACKEND=local python setup.py'.")
+
+    handler = load_handler(thumbs_bucket, table_name)
+    run(get_client("sqs"), queue_url, queue_arn, handler,
+        batch_size=args.batch_size, drain=args.drain, idle_exit=args.idle_exit)
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Power tuning local: elige MemorySize, BatchSize y concurrencia midiendo en vez de adivinar.
+
+Genera un conjunto de imágenes sintéticas, las sube una sola vez a los sustitutos en disco
+de local_backend.py y, para cada combinación de la rejilla (memoria x tamaño de lote x
+concurrencia), copia ese estado y drena la cola con el lambda_handler real:
+
+- cada unidad de concurrencia es un proceso aparte ("sandbox"), como en Lambda, con la
+  memoria limitada por setrlimit (RLIMIT_DATA por defecto, o RLIMIT_AS con --limit as);
+- un sandbox que se queda sin memoria cuenta como fallo y descarta la configuración;
+- Lambda asigna CPU en proporción a la memoria (1 vCPU a 1769 MB). En local la CPU no se
+  reparte así, de modo que la duración facturable se estima escalando el tiempo de CPU de
+  cada invocación: cpu / min(1, memoria / 1769) + (tiempo de pared - cpu).
+
+Para cada configuración informa del throughput, p50/p99 por invocación (estimados), RSS
+pico, arranque en frío y GB-s / USD por cada 1.000 imágenes, y recomienda un perfil con el
+formato de lambda_profile.json (--write lo guarda). La concurrencia recomendada sólo se
+muestra: depende de los procesos de esta máquina, no de la cuenta, así que max_concurrency
+se queda como estaba en el perfil.
+
+Uso:
+  python power_tuning.py --images 300 --memory 128,256,512,1024 --batch-size 1,5,10 --concurrency 2,4
+  python power_tuning.py --objective speed --max-p99-ms 2000 --write
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import contextlib
+import subprocess
+
+import lambda_profile
+from benchmark import (
+    Image, FORMAT_EXT, generate_images, git_commit, parse_distribution, parse_size,
+    peak_rss_mb, run_upload, start_local, summarize,
+)
+
+FULL_VCPU_MB = 1769                 # memoria con la que Lambda asigna 1 vCPU completa
+PRICE_PER_GB_S = {"x86_64": 0.0000166667, "arm64": 0.0000133334}
+PRICE_PER_REQUEST = 0.20 / 1_000_000
+SANDBOX_RESULT = "sandbox-{}.json"
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+# ---------- Sandbox (proceso hijo) ----------
+def limit_memory(limit_mb, kind):
+    """preexec_fn del hijo: tope de memoria como el del contenedor de Lambda."""
+    which = resource.RLIMIT_AS if kind == "as" else resource.RLIMIT_DATA
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(which, (limit, limit))
+
+
+def receive_batch(sqs, queue_url, batch_size):
+    """Junta hasta `batch_size` mensajes como el event source mapping (varios receive de 10)."""
+    messages = []
+    while len(messages) < batch_size:
+        resp = sqs.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=min(batch_size - len(messages), 10),
+            AttributeNames=["All"],
+            MessageAttributeNames=["All"],
+        )
+        received = resp.get("Messages", [])
+        if not received:
+            break
+        messages.extend(received)
+    return messages
+
+
+def run_sandbox(spec):
+    """Un sandbox: arranque en frío + invocaciones hasta vaciar la cola. Escribe su resultado en JSON."""
+    from sqs_event import to_lambda_event, successful_messages
+
+    start_local(spec["root"])
+    result = {"invocations": [], "images": 0, "failed_messages": 0, "oom": False, "init_ms": None}
+    try:
+        from aws_clients import get_client
+        from worker import load_handler
+        handler = load_handler(spec["thumbs_bucket"], spec["table"])
+        sqs = get_client("sqs")
+        # Arranque en frío: desde que el padre lanzó el proceso hasta tener el handler listo
+        result["init_ms"] = round((time.time() - spec["spawned_at"]) * 1000, 1)
+
+        while True:
+            messages = receive_batch(sqs, spec["queue_url"], spec["batch_size"])
+            if not messages:
+                break
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            response = handler(to_lambda_event(messages, spec["queue_arn"], "us-east-1"), None)
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            done = successful_messages(messages, response)
+            if done:
+                sqs.delete_message_batch(
+                    QueueUrl=spec["queue_url"],
+                    Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(done)],
+                )
+            processed = json.loads(response["body"]).get("processed", len(done))
+            result["invocations"].append({"wall_s": wall, "cpu_s": cpu, "images": processed})
+            result["images"] += processed
+            result["failed_messages"] += len(messages) - len(done)
+    except MemoryError:
+        # En Lambda el sandbox moriría y el lote volvería a la cola
+        result["oom"] = True
+    result["peak_rss_mb"] = peak_rss_mb()
+    with open(spec["output"], "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ---------- Orquestación ----------
+def prepare_seed(root, folder, args):
+    """Provisiona y sube las imágenes una vez; cada configuración parte de una copia de `root`."""
+    start_local(root)
+    from aws_clients import get_client
+    from benchmark import provision
+
+    resources = provision("tuning")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        _, ok, failed, _ = run_upload(
+            get_client("sqs"), get_client("s3"), resources["queue_url"], resources["images_bucket"],
+            folder, args.workers, args.keys_per_message,
+        )
+    if failed:
+        raise SystemExit(f"[Tuning] Fallaron {failed} subidas; revisa el conjunto de imágenes")
+    return resources, ok
+
+
+def estimated_ms(invocation, memory_mb):
+    """Duración facturable estimada en Lambda (ms, redondeo al alza a 1 ms)."""
+    share = min(1.0, memory_mb / FULL_VCPU_MB)
+    cpu = min(invocation["cpu_s"], invocation["wall_s"])
+    return math.ceil((cpu / share + (invocation["wall_s"] - cpu)) * 1000)
+
+
+def run_config(seed_root, resources, memory_mb, batch_size, concurrency, args):
+    work = tempfile.mkdtemp(prefix=f"tuning-{memory_mb}mb-b{batch_size}-c{concurrency}-")
+    root = os.path.join(work, "aws")
+    shutil.copytree(seed_root, root)
+    spec = dict(resources, root=root, batch_size=batch_size)
+    env = dict(os.environ, PIPELINE_BACKEND="local", LOCAL_AWS_DIR=root, MALLOC_ARENA_MAX="2",
+               AWS_LAMBDA_FUNCTION_MEMORY_SIZE=str(memory_mb))
+    procs = []
+    start = time.perf_counter()
+    try:
+        for i in range(concurrency):
+            sandbox = dict(spec, output=os.path.join(work, SANDBOX_RESULT.format(i)), spawned_at=time.time())
+            procs.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--sandbox", json.dumps(sandbox)],
+                env=env,
+                stdout=None if args.verbose else subprocess.DEVNULL,
+                stderr=None if args.verbose else subprocess.DEVNULL,
+                preexec_fn=lambda: limit_memory(memory_mb, args.limit),
+            ))
+        codes = [p.wait() for p in procs]
+        elapsed = time.perf_counter() - start
+        sandboxes = []
+        for i, code in enumerate(codes):
+            path = os.path.join(work, SANDBOX_RESULT.format(i))
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    sandboxes.append(json.load(f))
+            else:
+                # Sin fichero de resultado: el proceso murió (normalmente al no poder reservar memoria)
+                sandboxes.append({"invocations": [], "images": 0, "failed_messages": 0, "oom": True,
+                                  "init_ms": None, "peak_rss_mb": None, "exit_code": code})
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return summarize_config(memory_mb, batch_size, concurrency, elapsed, sandboxes, args)
+
+
+def summarize_config(memory_mb, batch_size, concurrency, elapsed, sandboxes, args):
+    invocations = [inv for s in sandboxes for inv in s["invocations"]]
+    images = sum(s["images"] for s in sandboxes)
+    durations_ms = [estimated_ms(inv, memory_mb) for inv in invocations]
+    gb_s = sum(durations_ms) / 1000 * memory_mb / 1024
+    usd = gb_s * args.price_gb_s + len(invocations) * PRICE_PER_REQUEST
+    per_1000 = 1000 / images if images else None
+    rss = [s["peak_rss_mb"] for s in sandboxes if s.get("peak_rss_mb") is not None]
+    init = [s["init_ms"] for s in sandboxes if s.get("init_ms") is not None]
+    return {
+        "memory_mb": memory_mb,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "images": images,
+        "invocations": len(invocations),
+        "failed_messages": sum(s["failed_messages"] for s in sandboxes),
+        "oom": any(s["oom"] for s in sandboxes),
+        "elapsed_s": round(elapsed, 3),
+        "images_per_s": round(images / elapsed, 2) if elapsed and images else 0.0,
+        "invocation_ms": summarize([inv["wall_s"] for inv in invocations]),
+        "estimated_ms": summarize([d / 1000 for d in durations_ms]),
+        "init_ms": max(init) if init else None,
+        "peak_rss_mb": max(rss) if rss else None,
+        "gb_s_per_1000": round(gb_s * per_1000, 4) if per_1000 else None,
+        "usd_per_1000": round(usd * per_1000, 6) if per_1000 else None,
+    }
+
+
+def eligible(row, total_images, max_p99_ms):
+    if row["oom"] or row["failed_messages"] or row["images"] < total_images:
+        return False
+    p99 = row["estimated_ms"].get("p99")
+    return p99 is not None and p99 <= max_p99_ms
+
+
+def pick(rows, objective):
+    if not rows:
+        return None
+    if objective == "cost":
+        return min(rows, key=lambda r: (r["usd_per_1000"], -r["images_per_s"]))
+    if objective == "speed":
+        return max(rows, key=lambda r: (r["images_per_s"], -r["usd_per_1000"]))
+    # balanced: coste y velocidad normalizados respecto al mejor de cada uno
+    cheapest = min(r["usd_per_1000"] for r in rows)
+    fastest = max(r["images_per_s"] for r in rows)
+    return min(rows, key=lambda r: r["usd_per_1000"] / cheapest + fastest / r["images_per_s"])
+
+
+def recommended_profile(base, row):
+    profile = dict(base, memory_mb=row["memory_mb"], batch_size=row["batch_size"])
+    if row["batch_size"] > 10:
+        profile["batch_window_s"] = max(1, profile["batch_window_s"])
+    # max_concurrency se queda como en el perfil: la concurrencia medida es la de los sandboxes
+    # locales, no dice nada de la cuota de la cuenta ni de lo que aguanta DynamoDB
+    # Margen sobre el p99 estimado para el timeout, sin bajar del perfil actual
+    p99_s = row["estimated_ms"]["p99"] / 1000
+    profile["timeout_s"] = min(900, max(base["timeout_s"], math.ceil(p99_s * 3)))
+    return lambda_profile.validate(profile)
+
+
+def print_table(rows, best):
+    print(f"\n{'MB':>6} {'lote':>5} {'conc':>5} {'img/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'RSS MB':>7} {'frío ms':>8} {'GB-s/1k':>9} {'USD/1k':>10}  estado")
+    for r in rows:
+        est = r["estimated_ms"]
+        if r["oom"]:
+            status = "sin memoria"
+        elif r["failed_messages"]:
+            status = f"{r['failed_messages']} mensajes fallidos"
+        else:
+            status = "ok"
+        mark = " <- recomendado" if r is best else ""
+        print(f"{r['memory_mb']:>6} {r['batch_size']:>5} {r['concurrency']:>5} {r['images_per_s']:>8.1f} "
+              f"{est.get('p50', 0) or 0:>8.1f} {est.get('p99', 0) or 0:>8.1f} {r['peak_rss_mb'] or 0:>7.1f} "
+              f"{r['init_ms'] or 0:>8.1f} {r['gb_s_per_1000'] or 0:>9.4f} {r['usd_per_1000'] or 0:>10.6f}  "
+              f"{status}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Power tuning local de la Lambda (memoria, lote y concurrencia).")
+    parser.add_argument("--images", type=int, default=200, help="Número de imágenes sintéticas")
+    parser.add_argument("--sizes", default="320x240:0.6,1280x720:0.3,3000x2000:0.1",
+                        help="Distribución de tamaños WxH:peso (por defecto: %(default)s)")
+    parser.add_argument("--formats", default="jpeg:0.7,png:0.2,webp:0.1",
+                        help="Distribución de formatos (jpeg/png/webp):peso (por defecto: %(default)s)")
+    parser.add_argument("--memory", type=parse_int_list, default=[128, 256, 512, 1024],
+                        help="Memorias a probar en MB (por defecto: 128,256,512,1024)")
+    parser.add_argument("--batch-size", type=parse_int_list, default=[1, 5, 10],
+                        help="Tamaños de lote a probar (por defecto: 1,5,10)")
+    parser.add_argument("--concurrency", type=parse_int_list, default=[2, 4],
+                        help="Sandboxes concurrentes a probar (por defecto: 2,4)")
+    parser.add_argument("--limit", choices=("data", "as"), default="data",
+                        help="Límite de memoria: RLIMIT_DATA (heap, por defecto) o RLIMIT_AS (espacio de direcciones)")
+    parser.add_argument("--objective", choices=("cost", "speed", "balanced"), default="cost",
+                        help="Criterio de la recomendación (por defecto: %(default)s)")
+    parser.add_argument("--max-p99-ms", type=float, default=None,
+                        help="p99 estimado máximo por invocación (por defecto: el timeout del perfil)")
+    parser.add_argument("--profile", help="Perfil base (por defecto: lambda_profile.json)")
+    parser.add_argument("--price-gb-s", type=float, default=None,
+                        help="USD por GB-s (por defecto: precio de la arquitectura del perfil)")
+    parser.add_argument("--workers", type=int, default=8, help="Hilos del uploader al preparar los datos")
+    parser.add_argument("--keys-per-message", type=int, default=1, help="Claves por mensaje SQS")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de los sandboxes")
+    parser.add_argument("--output", help="JSON de resultados (por defecto: bench_results/tuning-<fecha>-<commit>.json)")
+    parser.add_argument("--write", action="store_true", help="Guardar el perfil recomendado en el fichero de perfil")
+    parser.add_argument("--sandbox", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.sandbox:
+        run_sandbox(json.loads(args.sandbox))
+        return
+
+    sizes = parse_distribution(args.sizes, parse_size)
+    formats = parse_distribution(args.formats)
+    unknown = [fmt for fmt, _ in formats if fmt not in FORMAT_EXT]
+    if unknown:
+        parser.error(f"Formatos no soportados: {unknown}")
+    invalid = [m for m in args.memory if not 128 <= m <= 10240]
+    if invalid:
+        parser.error(f"Memorias fuera del rango de Lambda (128-10240 MB): {invalid}")
+    if [c for c in args.concurrency if c < 1] or [b for b in args.batch_size if not 1 <= b <= 10000]:
+        parser.error("--concurrency debe ser >= 1 y --batch-size estar entre 1 y 10000")
+    base = lambda_profile.load_profile(args.profile)
+    if args.price_gb_s is None:
+        args.price_gb_s = PRICE_PER_GB_S[base["architecture"]]
+    max_p99_ms = args.max_p99_ms or base["timeout_s"] * 1000
+
+    folder = tempfile.mkdtemp(prefix="tuning-images-")
+    seed_root = tempfile.mkdtemp(prefix="tuning-seed-")
+    rows = []
+    try:
+        print(f"[Tuning] Generando {args.images} imágenes (Pillow: {'sí' if Image else 'no'})")
+        generate_images(folder, args.images, sizes, formats, args.seed)
+        resources, uploaded = prepare_seed(seed_root, folder, args)
+        grid = [(m, b, c) for m in args.memory for b in args.batch_size for c in args.concurrency]
+        print(f"[Tuning] {uploaded} imágenes en cola; {len(grid)} configuraciones (límite RLIMIT_{args.limit.upper()})")
+        for i, (memory_mb, batch_size, concurrency) in enumerate(grid, 1):
+            row = run_config(seed_root, resources, memory_mb, batch_size, concurrency, args)
+            rows.append(row)
+            print(f"[Tuning] {i}/{len(grid)} {memory_mb} MB, lote {batch_size}, concurrencia {concurrency}: "
+                  f"{row['images_per_s']} img/s, {row['usd_per_1000']} USD/1k"
+                  f"{' (sin memoria)' if row['oom'] else ''}")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+        shutil.rmtree(seed_root, ignore_errors=True)
+
+    best = pick([r for r in rows if eligible(r, uploaded, max_p99_ms)], args.objective)
+    print_table(rows, best)
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "pillow": Image is not None,
+            "limit": args.limit,
+            "objective": args.objective,
+            "max_p99_ms": max_p99_ms,
+            "price_gb_s": args.price_gb_s,
+            "images": uploaded,
+        },
+        "configs": rows,
+        "recommendation": None,
+    }
+    if best is None:
+        print(f"\n[Tuning] Ninguna configuración procesó todo sin errores con p99 <= {max_p99_ms:.0f} ms")
+    else:
+        profile = recommended_profile(base, best)
+        result["recommendation"] = profile
+        print(f"\n=== PERFIL RECOMENDADO ({args.objective}) ===")
+        print(json.dumps(profile, indent=2))
+        print(lambda_profile.describe(profile))
+        print(f"Concurrencia medida: {best['concurrency']} sandboxes locales (orientativo; max_concurrency "
+              f"no cambia: {profile['max_concurrency'] or 'sin límite'})")
+        if args.write:
+            lambda_profile.save_profile(profile, args.profile)
+            print(f"Guardado en {args.profile or lambda_profile.PROFILE_PATH}; aplícalo con python setup.py")
+
+    output = args.output or os.path.join(
+        "bench_results", f"tuning-{time.strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Resultados en {output}")
+
+
+if __name__ == "__main__":
+    main()
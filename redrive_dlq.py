@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Devuelve a la cola principal los mensajes apartados en la DLQ (p. ej. tras corregir el bug
+que los hacía fallar).
+
+Lee la DLQ en lotes de 10, reenvía cada lote a la cola de origen con send_message_batch
+(cuerpo y atributos intactos) y sólo borra de la DLQ los mensajes que se reenviaron bien,
+así que interrumpirlo a medias no pierde nada: lo pendiente reaparece en la DLQ tras el
+visibility timeout. Funciona igual con AWS real y con el backend local.
+
+Uso:
+  python redrive_dlq.py --dry-run              # cuántos mensajes hay y una muestra
+  python redrive_dlq.py                        # redirige todo
+  python redrive_dlq.py --max-messages 500 --rate 50
+"""
+import json
+import argparse
+from dotenv import load_dotenv
+
+from aws_clients import get_client
+from retry_policy import AdaptiveRateLimiter
+from state_store import open_state
+
+BATCH = 10
+IN_FLIGHT_VISIBILITY = 120   # segundos que un lote queda oculto en la DLQ mientras se reenvía
+
+def queue_depth(sqs, queue_url):
+    attrs = sqs.get_queue_attributes(
+        QueueUrl=queue_url,
+        AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"],
+    )["Attributes"]
+    return int(attrs.get("ApproximateNumberOfMessages", 0)), int(attrs.get("ApproximateNumberOfMessagesNotVisible", 0))
+
+def preview(sqs, dlq_url, sample=5):
+    """Muestra algunos mensajes sin consumirlos (vuelven a ser visibles enseguida)."""
+    resp = sqs.receive_message(
+        QueueUrl=dlq_url, MaxNumberOfMessages=min(sample, BATCH), VisibilityTimeout=0,
+        AttributeNames=["All"], MessageAttributeNames=["All"],
+    )
+    for m in resp.get("Messages", []):
+        received = m.get("Attributes", {}).get("ApproximateReceiveCount", "?")
+        print(f"- {m['MessageId']} (recibido {received} veces en la DLQ): {m['Body'][:200]}")
+
+def redrive(sqs, dlq_url, target_url, max_messages=None, rate=None):
+    """Mueve mensajes de `dlq_url` a `target_url`. Devuelve (movidos, fallidos)."""
+    limiter = AdaptiveRateLimiter(rate=rate, max_rate=rate) if rate else None
+    moved = failed = 0
+    while max_messages is None or moved + failed < max_messages:
+        wanted = BATCH if max_messages is None else min(BATCH, max_messages - moved - failed)
+        messages = sqs.receive_message(
+            QueueUrl=dlq_url,
+            MaxNumberOfMessages=wanted,
+            WaitTimeSeconds=1,
+            VisibilityTimeout=IN_FLIGHT_VISIBILITY,
+            MessageAttributeNames=["All"],
+        ).get("Messages", [])
+        if not messages:
+            break
+        if limiter:
+            for _ in messages:
+                limiter.acquire()
+
+        entries = []
+        for i, m in enumerate(messages):
+            entry = {"Id": str(i), "MessageBody": m["Body"]}
+            if m.get("MessageAttributes"):
+                entry["MessageAttributes"] = m["MessageAttributes"]
+            entries.append(entry)
+        resp = sqs.send_message_batch(QueueUrl=target_url, Entries=entries)
+        for failure in resp.get("Failed", []):
+            print(f"[Redrive] No se pudo reenviar {messages[int(failure['Id'])]['MessageId']}: "
+                  f"{failure.get('Code')} {failure.get('Message', '')}")
+
+        sent = [messages[int(ok["Id"])] for ok in resp.get("Successful", [])]
+        if sent:
+            sqs.delete_message_batch(
+                QueueUrl=dlq_url,
+                Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(sent)],
+            )
+        moved += len(sent)
+        failed += len(messages) - len(sent)
+        print(f"[Redrive] {moved} mensajes devueltos a la cola")
+    return moved, failed
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Devuelve a la cola los mensajes de la DLQ.")
+    parser.add_argument("--dlq", help="URL de la DLQ (por defecto: dead-letter-queue del registro)")
+    parser.add_argument("--target", help="URL de la cola destino (por defecto: messages-queue del registro)")
+    parser.add_argument("--max-messages", type=int, default=None, help="Mover como mucho N mensajes")
+    parser.add_argument("--rate", type=float, default=None, help="Mensajes por segundo como máximo")
+    parser.add_argument("--dry-run", action="store_true", help="Sólo mostrar cuántos hay y una muestra")
+    args = parser.parse_args()
+
+    resources = open_state().as_dict()
+    dlq_url = args.dlq or resources.get("dead-letter-queue")
+    target_url = args.target or resources.get("messages-queue")
+    if not dlq_url or not target_url:
+        raise SystemExit("No hay DLQ o cola en el registro: ejecuta setup.py o pasa --dlq y --target")
+
+    sqs = get_client("sqs")
+    visible, in_flight = queue_depth(sqs, dlq_url)
+    print(f"[Redrive] DLQ {dlq_url}: {visible} mensajes visibles, {in_flight} en vuelo")
+    if args.dry_run:
+        preview(sqs, dlq_url)
+    else:
+        moved, failed = redrive(sqs, dlq_url, target_url, args.max_messages, args.rate)
+        print(json.dumps({"moved": moved, "failed": failed, "target": target_url}))
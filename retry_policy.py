@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Política de reintentos compartida por los clientes que suben imágenes.
+
+- Limitador de tasa adaptativo (token bucket con AIMD): sube la tasa poco a poco
+  mientras todo va bien y la reduce a la mitad cuando S3/SQS responden con throttling.
+- Backoff exponencial con "full jitter" entre reintentos.
+- Circuit breaker compartido: si el throttling es sostenido, pausa a TODOS los workers
+  durante un tiempo en lugar de que cada hilo siga martilleando el mismo prefijo.
+- Fichero de elementos fallidos (JSON Lines) que se puede reprocesar más tarde.
+"""
+import os
+import re
+import json
+import time
+import random
+import threading
+import contextlib
+from botocore.exceptions import (
+    ClientError,
+    ConnectionError as BotoConnectionError,
+    ReadTimeoutError,
+    ConnectTimeoutError,
+)
+
+# Códigos que indican que el servicio nos está limitando
+THROTTLE_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "503",
+}
+# Errores del lado del servidor que merece la pena reintentar
+TRANSIENT_CODES = {
+    "InternalError",
+    "InternalFailure",
+    "ServiceUnavailable",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "500",
+    "502",
+    "504",
+}
+
+# Reintentos de botocore para los clientes cuyas llamadas pasan por RetryPolicy: ninguno. Si no,
+# cada intento de la política haría a su vez 1 + AWS_MAX_ATTEMPTS peticiones (8 x 6 = 48) sin
+# que el limitador ni el circuit breaker se enteren del throttling. total_max_attempts incluye
+# la primera petición (max_attempts no). Uso: get_client("s3", retries=SINGLE_ATTEMPT)
+SINGLE_ATTEMPT = {"mode": "standard", "total_max_attempts": 1}
+
+_CODE_IN_MESSAGE = re.compile(r"An error occurred \((\w+)\)")
+
+
+def error_code(exc):
+    """Devuelve el código de error AWS de una excepción (o None)."""
+    if isinstance(exc, ClientError):
+        return exc.response.get("Error", {}).get("Code")
+    # S3Transfer (upload_file) envuelve el ClientError en S3UploadFailedError y sólo
+    # conserva el mensaje: "An error occurred (SlowDown) when calling ..."
+    cause = exc.__cause__ or exc.__context__
+    if isinstance(cause, ClientError):
+        return error_code(cause)
+    match = _CODE_IN_MESSAGE.search(str(exc))
+    return match.group(1) if match else None
+
+
+def classify(exc):
+    """Clasifica un error como 'throttle', 'transient' o 'fatal'."""
+    if isinstance(exc, (BotoConnectionError, ReadTimeoutError, ConnectTimeoutError)):
+        return "transient"
+    code = error_code(exc)
+    if code in THROTTLE_CODES:
+        return "throttle"
+    if code in TRANSIENT_CODES:
+        return "transient"
+    return "fatal"
+
+
+def backoff_delay(attempt, base=0.2, cap=20.0):
+    """Backoff exponencial con full jitter: uniforme en [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveRateLimiter:
+    """Token bucket cuya tasa (peticiones/s) se ajusta con AIMD según el feedback."""
+
+    def __init__(self, rate=50.0, min_rate=1.0, max_rate=3500.0, increase=1.0, decrease=0.5):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self._tokens = 1.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+
+class CircuitBreaker:
+    """
+    Se abre tras `threshold` throttles dentro de `window` segundos y mantiene a todos
+    los workers en pausa durante `cooldown` segundos (que se duplica, hasta
+    `max_cooldown`, si el throttling continúa justo después de reabrir).
+    """
+
+    def __init__(self, threshold=10, window=5.0, cooldown=5.0, max_cooldown=60.0):
+        self.threshold = threshold
+        self.window = window
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._throttles = []
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait_if_open(self):
+        """Bloquea al llamante mientras el circuito esté abierto."""
+        while True:
+            with self._lock:
+                remaining = self._open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def record_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            self._throttles = [t for t in self._throttles if now - t < self.window]
+            self._throttles.append(now)
+            if len(self._throttles) >= self.threshold and now >= self._open_until:
+                # Si acabamos de cerrar el circuito y vuelve a saltar, esperamos más
+                if now - self._open_until < self.window:
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._open_until = now + self.cooldown
+                self._throttles.clear()
+                print(f"[Retry] Throttling sostenido: pausando todos los workers {self.cooldown:.1f}s")
+
+    def record_success(self):
+        with self._lock:
+            if self._throttles and time.monotonic() >= self._open_until:
+                self._throttles.pop(0)
+            if not self._throttles:
+                self.cooldown = self.base_cooldown
+
+
+class FailedItemsLog:
+    """Fichero JSON Lines con los elementos que agotaron los reintentos."""
+
+    def __init__(self, path="failed_uploads.jsonl"):
+        self.path = path
+        self._target = path          # durante un replay, record() escribe en un temporal
+        self._lock = threading.Lock()
+
+    def record(self, item, error):
+        entry = dict(item, error=str(error), failed_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        with self._lock:
+            with open(self._target, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    @contextlib.contextmanager
+    def replaying(self):
+        """
+        Da los elementos pendientes para reintentarlos. El fichero no cambia hasta que el bloque
+        termina bien: los que vuelven a fallar se registran en un temporal que después lo
+        reemplaza (os.replace). Si el replay se interrumpe (Ctrl+C, caída de red, ...), el
+        fichero original sigue intacto y el replay se puede repetir (la subida es idempotente).
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                items = []
+            else:
+                with open(self.path, encoding="utf-8") as f:
+                    items = [json.loads(line) for line in f if line.strip()]
+            replay_path = f"{self.path}.replay"
+            if os.path.exists(replay_path):
+                os.remove(replay_path)   # restos de un replay interrumpido
+            self._target = replay_path
+        for item in items:
+            item.pop("error", None)
+            item.pop("failed_at", None)
+        try:
+            yield items
+        except BaseException:
+            with self._lock:
+                self._target = self.path
+                if os.path.exists(replay_path):
+                    os.remove(replay_path)
+            raise
+        with self._lock:
+            self._target = self.path
+            if os.path.exists(replay_path):
+                os.replace(replay_path, self.path)
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class RetryError(Exception):
+    """Se agotaron los reintentos; `last_error` conserva el último error original."""
+
+    def __init__(self, message, last_error):
+        super().__init__(message)
+        self.last_error = last_error
+
+
+class RetryPolicy:
+    """Ejecuta llamadas con limitador adaptativo, backoff con jitter y circuit breaker."""
+
+    def __init__(self, max_attempts=8, limiter=None, breaker=None, base_delay=0.2, max_delay=20.0):
+        self.max_attempts = max_attempts
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.max_attempts):
+            self.breaker.wait_if_open()
+            self.limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                kind = classify(e)
+                if kind == "fatal":
+                    raise
+                if kind == "throttle":
+                    self.limiter.on_throttle()
+                    self.breaker.record_throttle()
+                if attempt == self.max_attempts - 1:
+                    raise RetryError(f"{self.max_attempts} intentos agotados: {e}", e) from e
+                time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+            else:
+                self.limiter.on_success()
+                self.breaker.record_success()
+                return result
@@ -0,0 +1,107 @@
+// Service worker of the thumbnails gallery (published next to index.html by deploy_static_site).
+// - App shell (index.html): precached, served from cache and refreshed in the background.
+// - Small indexes (manifest/index.json, sprites/index.json): network-first, cache only offline.
+//   They must never be stale: builds delete the shards and sheets of older generations.
+// - Immutable URLs (thumbnails/renditions/deep-zoom tiles with ?v=<ETag>, content-hashed shards and sprite
+//   sheets, manifest deltas): cache-first, in one cache capped at MAX_IMMUTABLE_ENTRIES (LRU). The first
+//   three are rewritten in place on reprocessing, so S3 gives them a short TTL: only ?v= makes them safe.
+// - Everything else, including bucket listings (?list-type=2), goes to the network.
+const CACHE_VERSION = "v1";
+const SHELL_CACHE = `gallery-shell-${CACHE_VERSION}`;
+const INDEX_CACHE = `gallery-indexes-${CACHE_VERSION}`;
+const IMMUTABLE_CACHE = `gallery-immutable-${CACHE_VERSION}`;
+const SHELL = ["./", "index.html"];
+const INDEXES = ["manifest/index.json", "sprites/index.json"];
+const IMMUTABLE_PREFIXES = ["manifest/shards/", "manifest/deltas/", "sprites/sheets/"];
+const VERSIONED_PREFIXES = ["thumbnails/", "renditions/", "tiles/"];   // immutable only with ?v=
+const MAX_IMMUTABLE_ENTRIES = 2000;
+
+self.addEventListener("install", event => {
+  event.waitUntil(caches.open(SHELL_CACHE).then(cache => cache.addAll(SHELL)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", event => {
+  const current = [SHELL_CACHE, INDEX_CACHE, IMMUTABLE_CACHE];
+  event.waitUntil(
+    caches.keys()
+      .then(names => Promise.all(names.filter(n => n.startsWith("gallery-") && !current.includes(n)).map(n => caches.delete(n))))
+      .then(() => self.clients.claim())
+  );
+});
+
+function route(request) {
+  if (request.method !== "GET") return null;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin || url.searchParams.has("list-type")) return null;
+  // The page encodes keys as one path segment (thumbnails%2Fa.jpg)
+  const path = decodeURIComponent(url.pathname.replace(/^\//, ""));
+  // Only the page itself: opening a thumbnail in a new tab is a navigation too
+  if (path === "" || SHELL.includes(path)) return "shell";
+  if (INDEXES.includes(path)) return "index";
+  if (IMMUTABLE_PREFIXES.some(p => path.startsWith(p))) return "immutable";
+  if (VERSIONED_PREFIXES.some(p => path.startsWith(p)) && url.searchParams.has("v")) return "immutable";
+  return null;
+}
+
+async function staleWhileRevalidate(event, cacheName, url) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(url, { ignoreSearch: true });
+  // By URL, not event.request: a navigation request cannot be re-issued with other options
+  const refresh = fetch(url, { cache: "no-cache" }).then(response => {
+    if (response.ok) return cache.put(url, response.clone()).then(() => response);
+    return response;
+  });
+  if (cached) {
+    event.waitUntil(refresh.catch(() => {}));
+    return cached;
+  }
+  return refresh;
+}
+
+async function networkFirst(cacheName, url) {
+  const cache = await caches.open(cacheName);
+  try {
+    const response = await fetch(url, { cache: "no-cache" });
+    if (response.ok) await cache.put(url, response.clone());
+    return response;
+  } catch (e) {
+    // Offline: the last copy is still consistent with the shards/sheets cached with it
+    const cached = await cache.match(url);
+    if (cached) return cached;
+    throw e;
+  }
+}
+
+// LRU over the Cache API: insertion order is kept, so a hit is re-inserted at the end and
+// trimming deletes from the front. Trimming is batched after writes.
+let trimTimer = null;
+function scheduleTrim() {
+  if (trimTimer) return;
+  trimTimer = setTimeout(async () => {
+    trimTimer = null;
+    const cache = await caches.open(IMMUTABLE_CACHE);
+    const keys = await cache.keys();
+    await Promise.all(keys.slice(0, Math.max(0, keys.length - MAX_IMMUTABLE_ENTRIES)).map(k => cache.delete(k)));
+  }, 2000);
+}
+
+async function cacheFirst(event) {
+  const cache = await caches.open(IMMUTABLE_CACHE);
+  const cached = await cache.match(event.request);
+  if (cached) {
+    event.waitUntil(cache.delete(event.request).then(() => cache.put(event.request, cached.clone())));
+    return cached;
+  }
+  const response = await fetch(event.request);
+  if (response.ok) {
+    event.waitUntil(cache.put(event.request, response.clone()).then(scheduleTrim).catch(() => {}));
+  }
+  return response;
+}
+
+self.addEventListener("fetch", event => {
+  const kind = route(event.request);
+  if (kind === "shell") event.respondWith(staleWhileRevalidate(event, SHELL_CACHE, "index.html"));
+  else if (kind === "index") event.respondWith(networkFirst(INDEX_CACHE, event.request.url.split("?")[0]));
+  else if (kind === "immutable") event.respondWith(cacheFirst(event));
+});
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Índice de búsqueda de la galería: la página filtra por nombre, fecha, tamaño y formato en
+memoria, sin listar el bucket ni consultar DynamoDB.
+
+Formato (en el bucket de thumbnails):
+  search/index.json                    se reescribe en cada build (TTL corto)
+    {"v": 1, "prefix": "thumbnails/", "count": N, "generated": "...", "path": "search/data/<hash>.bin",
+     "formats": ["image/jpeg", ...],
+     "columns": {"date": {"type": "u32", "offset": o}, "bytes": {...}, "width": {"type": "u16", ...},
+                 "height": {...}, "format": {"type": "u8", ...},
+                 "names": {"type": "utf8", "offset": o, "length": n}}}
+  search/data/<hash>.bin               columnas empaquetadas, little-endian, fila i = imagen i
+    date    u32  ProcessedAt en segundos Unix
+    bytes   u32  tamaño del original
+    width   u16  ancho (0 = desconocido; se satura en 65535)
+    height  u16  alto
+    format  u8   posición en "formats"
+    names   claves sin prefijo, ordenadas, separadas por "\\n"
+
+Las filas van ordenadas por nombre y cada columna empieza alineada a su tamaño, así la página
+las lee con un TypedArray sobre el mismo ArrayBuffer (sin parsear 100k objetos JSON).
+
+Uso:
+  python search_index.py
+  python search_index.py --segments 8
+"""
+import sys
+import json
+import hashlib
+import argparse
+from array import array
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from aws_clients import get_client, get_resource
+from cache_policy import decode_body, put_asset
+from gallery_manifest import THUMB_PREFIX
+from state_store import open_state
+
+SEARCH_PREFIX = "search/"
+INDEX_KEY = f"{SEARCH_PREFIX}index.json"
+DATA_PREFIX = f"{SEARCH_PREFIX}data/"
+
+U16_MAX = 0xFFFF
+U32_MAX = 0xFFFFFFFF
+
+# Atributos de ImageMetadata que se indexan ("Bytes" va con alias por si acaso)
+PROJECTION = {"#id": "ImageID", "#bytes": "Bytes", "#type": "ContentType", "#at": "ProcessedAt",
+              "#w": "Width", "#h": "Height"}
+
+
+def _scan_segment(table_name, segment, total):
+    table = get_resource("dynamodb").Table(table_name)
+    kwargs = {"ProjectionExpression": ", ".join(PROJECTION), "ExpressionAttributeNames": PROJECTION,
+              "Segment": segment, "TotalSegments": total}
+    items = []
+    while True:
+        page = table.scan(**kwargs)
+        items.extend(page.get("Items", []))
+        if "LastEvaluatedKey" not in page:
+            return items
+        kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def scan_items(table_name, segments=4):
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        return [item for part in pool.map(lambda s: _scan_segment(table_name, s, segments), range(segments))
+                for item in part]
+
+
+def _epoch(processed_at):
+    try:
+        return int(datetime.fromisoformat(processed_at.replace("Z", "+00:00")).timestamp())
+    except (AttributeError, ValueError):
+        return 0
+
+
+def _column(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+def pack(items):
+    """(bytes del .bin, descripción de columnas, formatos) a partir de los items de la tabla."""
+    items = sorted(items, key=lambda item: item["ImageID"])
+    formats = sorted({item.get("ContentType", "application/octet-stream") for item in items})
+    format_ids = {fmt: n for n, fmt in enumerate(formats)}
+    # u8: con más de 256 formatos distintos los últimos comparten casilla
+    format_ids = {fmt: min(n, 255) for fmt, n in format_ids.items()}
+
+    columns = [
+        ("date", "u32", "I", [min(_epoch(item.get("ProcessedAt")), U32_MAX) for item in items]),
+        ("bytes", "u32", "I", [min(int(item.get("Bytes", 0)), U32_MAX) for item in items]),
+        ("width", "u16", "H", [min(int(item.get("Width", 0)), U16_MAX) for item in items]),
+        ("height", "u16", "H", [min(int(item.get("Height", 0)), U16_MAX) for item in items]),
+        ("format", "u8", "B", [format_ids[item.get("ContentType", "application/octet-stream")] for item in items]),
+    ]
+    data = bytearray()
+    layout = {}
+    for name, kind, typecode, values in columns:
+        # De mayor a menor tamaño de elemento: cada columna queda alineada sin relleno
+        layout[name] = {"type": kind, "offset": len(data)}
+        data += _column(typecode, values)
+    names = "\n".join(item["ImageID"] for item in items).encode("utf-8")
+    layout["names"] = {"type": "utf8", "offset": len(data), "length": len(names)}
+    data += names
+    return bytes(data), layout, formats, len(items)
+
+
+def read_index(s3, bucket):
+    try:
+        return json.loads(decode_body(s3.get_object(Bucket=bucket, Key=INDEX_KEY)))
+    except s3.exceptions.NoSuchKey:
+        return None
+
+
+def build(bucket, table_name, segments=4):
+    s3 = get_client("s3")
+    data, layout, formats, count = pack(scan_items(table_name, segments))
+    path = f"{DATA_PREFIX}{hashlib.sha256(data).hexdigest()[:16]}.bin"
+    previous = read_index(s3, bucket)
+    if not previous or previous["path"] != path:
+        # Binario, pero los nombres comprimen muy bien: se sube con gzip como el JSON
+        put_asset(s3, bucket, path, data, mime="application/octet-stream", compressible=True)
+
+    index = {
+        "v": 1,
+        "prefix": THUMB_PREFIX,
+        "count": count,
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "path": path,
+        "formats": formats,
+        "columns": layout,
+    }
+    put_asset(s3, bucket, INDEX_KEY, json.dumps(index, separators=(",", ":"), ensure_ascii=False))
+
+    # Se conservan el binario actual y el del índice anterior
+    keep = {path, (previous or {}).get("path")}
+    stale = [obj["Key"] for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=DATA_PREFIX)
+             for obj in page.get("Contents", []) if obj["Key"] not in keep]
+    if stale:
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in stale], "Quiet": True})
+    print(f"[Search] {count} imágenes indexadas en {path} ({len(data)} bytes sin comprimir, "
+          f"{len(formats)} formatos)")
+    return index
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Genera el índice de búsqueda de la galería.")
+    parser.add_argument("--bucket", help="Bucket de thumbnails (por defecto: thumbnails-bucket del registro)")
+    parser.add_argument("--table", help="Tabla de metadatos (por defecto: dynamodb-table del registro)")
+    parser.add_argument("--segments", type=int, default=4, help="Segmentos del scan paralelo de DynamoDB")
+    args = parser.parse_args()
+
+    resources = open_state().as_dict()
+    bucket = args.bucket or resources.get("thumbnails-bucket")
+    table_name = args.table or resources.get("dynamodb-table", "ImageMetadata")
+    if not bucket:
+        raise SystemExit("No hay bucket de thumbnails en el registro: ejecuta setup.py o pasa --bucket")
+    build(bucket, table_name, args.segments)
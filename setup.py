@@ -1,32 +1,52 @@
 #!/usr/bin/env python3
 import os
 import io
+import sys
 import json
 import time
 import uuid
-import shelve
 import zipfile
-import boto3
+import argparse
+import subprocess
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
+from aws_clients import get_client, is_local
+from cache_policy import ENCODINGS, GZIP, IDENTITY, SITE_FILES, publish_site
+from state_store import open_state
+from table_schema import (
+    DEFAULT_CAPACITY, TABLE_NAME, add_capacity_arguments, capacity_from_args, describe_capacity, table_capacity,
+)
+from table_schema import ensure_table as ensure_table_schema
+from task_graph import run_graph
+from lambda_profile import (
+    DLQ_RETENTION_S, add_profile_arguments, apply_reserved_concurrency, check_pillow, function_drift,
+    function_environment, function_settings, load_profile, mapping_drift, mapping_settings, profile_from_args, queue_drift,
+)
+from lambda_profile import describe as describe_profile
+from waiters import (
+    retry_on_conflict, wait_bucket_exists, wait_lambda_ready, wait_mapping_ready, wait_queue_exists,
+)
 
 # ---------- Config ----------
 load_dotenv()
 REGION = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
-DB_PATH = "aws_resources.db"
 IMAGES_BASE = "image-uploads-bucket"
 THUMBS_BASE = "image-thumbnails-bucket"
 QUEUE_BASE  = "image-processing-queue"
-TABLE_NAME  = "ImageMetadata"
 FUNCTION_NAME = "ImageProcessingFunction"
 ROLE_NAME = "LabRole"
-
-session = boto3.Session(region_name=REGION)
-s3 = session.client("s3")
-sqs = session.client("sqs")
-dynamodb = session.client("dynamodb")
-lambda_client = session.client("lambda")
-sts = session.client("sts")
+# Dependencias nativas de la Lambda (wheels manylinux de la arquitectura del perfil)
+LAMBDA_DEPS_DIR = os.path.join("lambda_function", "build")
+LAMBDA_NATIVE_DEPS = ["pillow"]
+PIP_PLATFORMS = {"x86_64": "manylinux2014_x86_64", "arm64": "manylinux2014_aarch64"}
+
+s3 = get_client("s3", REGION)
+sqs = get_client("sqs", REGION)
+dynamodb = get_client("dynamodb", REGION)
+# En modo local (PIPELINE_BACKEND=local) no hay Lambda ni IAM: procesa local_worker.py
+lambda_client = None if is_local() else get_client("lambda", REGION)
+sts = None if is_local() else get_client("sts", REGION)
+autoscaling = None if is_local() else get_client("application-autoscaling", REGION)
 
 # ---------- Helpers ----------
 def unique_suffix():
@@ -53,6 +73,7 @@ def ensure_bucket(name):
         print(f"[S3] Bucket ya existe: {name}")
     else:
         create_bucket(name)
+        wait_bucket_exists(s3, name)
         print(f"[S3] Bucket creado: {name}")
 
 def disable_bucket_bpa(bucket):
@@ -84,7 +105,7 @@ def apply_thumbs_public_policy(bucket):
                 "Action": ["s3:ListBucket"],
                 "Resource": f"arn:aws:s3:::{bucket}",
                 "Condition": {
-                    "StringLike": {"s3:prefix": ["thumbnails/*", "thumbnails/"]}
+                    "StringLike": {"s3:prefix": ["thumbnails/*", "thumbnails/", "manifest/deltas/*", "manifest/deltas/"]}
                 },
             },
         ],
@@ -97,37 +118,107 @@ def labrole_arn():
     partition = ident["Arn"].split(":")[1]  # aws / aws-us-gov / aws-cn
     return f"arn:{partition}:iam::{account}:role/{ROLE_NAME}"
 
-def ensure_queue(name):
-    resp = sqs.create_queue(QueueName=name)
-    url = resp["QueueUrl"]
-    attrs = sqs.get_queue_attributes(QueueUrl=url, AttributeNames=["QueueArn"])["Attributes"]
-    arn = attrs["QueueArn"]
-    print(f"[SQS] Cola lista: {url}")
+def ensure_dlq(name):
+    """Cola de mensajes fallidos: retención máxima para dar tiempo a investigar y redirigir."""
+    sqs.create_queue(QueueName=name, Attributes={"MessageRetentionPeriod": str(DLQ_RETENTION_S)})
+    url = wait_queue_exists(sqs, name)
+    arn = sqs.get_queue_attributes(QueueUrl=url, AttributeNames=["QueueArn"])["Attributes"]["QueueArn"]
+    print(f"[SQS] DLQ lista: {url}")
     return url, arn
 
-def ensure_table(name):
-    try:
-        dynamodb.create_table(
-            TableName=name,
-            KeySchema=[{"AttributeName": "ImageID", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "ImageID", "AttributeType": "S"}],
-            BillingMode="PAY_PER_REQUEST",
-        )
-        print(f"[DDB] Creando tabla: {name} (esperando ACTIVE)")
-        waiter = session.resource("dynamodb").meta.client.get_waiter("table_exists")
-        waiter.wait(TableName=name)
-    except dynamodb.exceptions.ResourceInUseException:
-        print(f"[DDB] Tabla ya existe: {name}")
+def ensure_queue(name, profile=None, dlq_arn=None):
+    """
+    Cola principal con el VisibilityTimeout derivado del perfil y, si se da `dlq_arn`, una
+    RedrivePolicy que aparta los mensajes venenosos tras max_receive_count entregas.
+    """
+    profile = profile or load_profile()
+    sqs.create_queue(QueueName=name)
+    url = wait_queue_exists(sqs, name)
+    attrs = sqs.get_queue_attributes(QueueUrl=url, AttributeNames=["All"])["Attributes"]
+    drift = queue_drift(attrs, profile, dlq_arn)
+    if drift:
+        sqs.set_queue_attributes(QueueUrl=url, Attributes=drift)
+        print(f"[SQS] Atributos de la cola actualizados: {sorted(drift)}")
+    print(f"[SQS] Cola lista: {url}")
+    return url, attrs["QueueArn"]
+
+def allow_s3_to_send(queue_url, queue_arn, bucket):
+    """Policy de la cola que permite a S3 (sólo desde `bucket`) enviar notificaciones."""
+    policy = {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Sid": "AllowS3ObjectCreated",
+                "Effect": "Allow",
+                "Principal": {"Service": "s3.amazonaws.com"},
+                "Action": "sqs:SendMessage",
+                "Resource": queue_arn,
+                "Condition": {"ArnLike": {"aws:SourceArn": f"arn:aws:s3:::{bucket}"}},
+            }
+        ],
+    }
+    sqs.set_queue_attributes(QueueUrl=queue_url, Attributes={"Policy": json.dumps(policy)})
 
-    desc = dynamodb.describe_table(TableName=name)["Table"]
-    arn = desc["TableArn"]
-    return arn
+def ensure_s3_notifications(bucket, queue_url, queue_arn):
+    """
+    Configura el bucket de imágenes para que cada ObjectCreated llegue directamente a la cola.
+    Así el cliente ya no necesita un send_message por imagen, y también se procesan
+    los objetos subidos con otras herramientas (aws s3 cp, consola, ...).
+    """
+    allow_s3_to_send(queue_url, queue_arn, bucket)
+    s3.put_bucket_notification_configuration(
+        Bucket=bucket,
+        NotificationConfiguration={
+            "QueueConfigurations": [
+                {
+                    "Id": "image-uploads-to-sqs",
+                    "QueueArn": queue_arn,
+                    "Events": ["s3:ObjectCreated:*"],
+                }
+            ]
+        },
+    )
+    print(f"[S3] Notificaciones ObjectCreated de {bucket} -> {queue_arn}")
 
-def build_lambda_zip_bytes(source_path: str = None) -> bytes:
+def ensure_table(name, capacity=None):
+    """
+    Tabla con la definición de table_schema.py (on-demand salvo que se pida provisioned).
+    Devuelve (ARN, capacidad con el modo real de la tabla).
+    """
+    capacity = capacity or dict(DEFAULT_CAPACITY)
+    desc = ensure_table_schema(dynamodb, name, capacity, autoscaling)
+    return desc["TableArn"], table_capacity(desc, capacity)
+
+def vendor_lambda_deps(profile):
+    """
+    Descarga Pillow para el runtime y la arquitectura del perfil en
+    lambda_function/build/<runtime>-<arquitectura>/ (wheels manylinux, sin compilar nada),
+    que build_lambda_zip_bytes mete en la raíz del ZIP. Reutiliza lo ya descargado.
+    Devuelve el directorio, o None si pip falla (sin red, versión sin wheel, ...).
+    """
+    deps_dir = os.path.join(LAMBDA_DEPS_DIR, f"{profile['runtime']}-{profile['architecture']}")
+    if os.path.isdir(os.path.join(deps_dir, "PIL")):
+        return deps_dir
+    cmd = [
+        sys.executable, "-m", "pip", "install", "--quiet", "--upgrade", "--target", deps_dir,
+        "--platform", PIP_PLATFORMS[profile["architecture"]], "--implementation", "cp",
+        "--python-version", profile["runtime"].removeprefix("python"), "--only-binary=:all:",
+        *LAMBDA_NATIVE_DEPS,
+    ]
+    print(f"[Lambda] Descargando {', '.join(LAMBDA_NATIVE_DEPS)} para {profile['runtime']}/{profile['architecture']}")
+    try:
+        subprocess.run(cmd, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[Lambda] No se pudo descargar {', '.join(LAMBDA_NATIVE_DEPS)}: {e}")
+        return None
+    return deps_dir
+
+def build_lambda_zip_bytes(source_path: str = None, deps_dir: str = None) -> bytes:
     """
     Crea el paquete ZIP de la Lambda leyendo el código desde disco.
     Por defecto toma ./lambda_function/lambda_function.py y lo deja en la raíz del ZIP
     con el nombre 'lambda_function.py' (Handler: lambda_function.lambda_handler).
+    Con `deps_dir` (ver vendor_lambda_deps) añade además sus paquetes en la raíz.
     """
     import os
     import io
@@ -150,107 +241,121 @@ def build_lambda_zip_bytes(source_path: str = None) -> bytes:
         # Guardar el código en la RAÍZ del zip con el nombre esperado por el handler
         z.writestr("lambda_function.py", code_bytes)
 
-        # (Opcional) Si tienes dependencias puras ya vendorizadas en una carpeta (p.ej. lambda_function/build),
-        # puedes incluirlas en el ZIP en la raíz:
-        # deps_dir = os.path.join("lambda_function", "build")
-        # if os.path.isdir(deps_dir):
-        #     for root, _, files in os.walk(deps_dir):
-        #         for name in files:
-        #             abs_path = os.path.join(root, name)
-        #             rel_path = os.path.relpath(abs_path, deps_dir)  # deja los paquetes en la raíz del zip
-        #             z.write(abs_path, arcname=rel_path)
+        # Dependencias vendorizadas (p. ej. lambda_function/build/python3.12-x86_64), en la raíz del zip
+        if deps_dir and os.path.isdir(deps_dir):
+            for root, dirs, files in os.walk(deps_dir):
+                dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+                for name in sorted(files):
+                    abs_path = os.path.join(root, name)
+                    rel_path = os.path.relpath(abs_path, deps_dir)  # deja los paquetes en la raíz del zip
+                    z.write(abs_path, arcname=rel_path)
 
     buf.seek(0)
     return buf.read()
 
 
-def ensure_lambda(function_name, role_arn, thumb_bucket):
-    code_bytes = build_lambda_zip_bytes()
-    env_vars = {"THUMB_BUCKET": thumb_bucket, "TABLE_NAME": TABLE_NAME}
+def ensure_lambda(function_name, role_arn, thumb_bucket, profile, vendor_deps=True):
+    # Pillow va en el ZIP salvo que el perfil lo aporte con una capa; sin él, aviso (o error con Deep Zoom)
+    deps_dir = vendor_lambda_deps(profile) if vendor_deps and not profile["layers"] else None
+    code_bytes = build_lambda_zip_bytes(deps_dir=deps_dir)
+    warning = check_pillow(profile, zipfile.ZipFile(io.BytesIO(code_bytes)).namelist())
+    if warning:
+        print(f"[Lambda] {warning}")
+    env_vars = {"THUMB_BUCKET": thumb_bucket, "TABLE_NAME": TABLE_NAME, **function_environment(profile)}
     try:
         resp = lambda_client.create_function(
             FunctionName=function_name,
-            Runtime="python3.11",
             Role=role_arn,
             Handler="lambda_function.lambda_handler",
             Code={"ZipFile": code_bytes},
-            Timeout=30,
-            MemorySize=256,
+            Architectures=[profile["architecture"]],
             Environment={"Variables": env_vars},
             Publish=True,
+            **function_settings(profile),
         )
-        print(f"[Lambda] Función creada: {function_name}")
+        print(f"[Lambda] Función creada: {function_name} ({describe_profile(profile)})")
+        wait_lambda_ready(lambda_client, function_name)
+        apply_reserved_concurrency(lambda_client, function_name, profile)
         return resp["FunctionArn"]
     except lambda_client.exceptions.ResourceConflictException:
         print(f"[Lambda] Función ya existe: {function_name}. Actualizando código/config...")
-        lambda_client.update_function_code(
-            FunctionName=function_name, ZipFile=code_bytes, Publish=True
+        current = lambda_client.get_function_configuration(FunctionName=function_name)
+        drift = function_drift(current, profile)
+        # La arquitectura sólo se puede cambiar junto con el código
+        arch = {"Architectures": drift.pop("Architectures")} if "Architectures" in drift else {}
+        retry_on_conflict(
+            lambda_client.update_function_code,
+            FunctionName=function_name, ZipFile=code_bytes, Publish=True, **arch,
         )
-        waiter = lambda_client.get_waiter("function_updated")
-        waiter.wait(FunctionName=function_name)
-        lambda_client.update_function_configuration(
-            FunctionName=function_name,
-            Role=role_arn,
-            Runtime="python3.11",
-            Handler="lambda_function.lambda_handler",
-            Timeout=30,
-            MemorySize=256,
-            Environment={"Variables": env_vars},
-        )
-        desc = lambda_client.get_function(FunctionName=function_name)["Configuration"]
-        return desc["FunctionArn"]
-
-def ensure_sqs_trigger(queue_arn, function_name, batch_size=3, enabled=True):
+        wait_lambda_ready(lambda_client, function_name)
+        if current.get("Role") != role_arn or current.get("Environment", {}).get("Variables") != env_vars:
+            drift.update(Role=role_arn, Environment={"Variables": env_vars})
+        if drift:
+            retry_on_conflict(
+                lambda_client.update_function_configuration,
+                FunctionName=function_name,
+                Handler="lambda_function.lambda_handler",
+                **drift,
+            )
+            wait_lambda_ready(lambda_client, function_name)
+            print(f"[Lambda] Configuración actualizada: {sorted(drift)}")
+        apply_reserved_concurrency(lambda_client, function_name, profile)
+        return current["FunctionArn"]
+
+def ensure_sqs_trigger(queue_arn, function_name, profile, enabled=True):
     existing = lambda_client.list_event_source_mappings(
         EventSourceArn=queue_arn, FunctionName=function_name
     ).get("EventSourceMappings", [])
     if existing:
-        uuid = existing[0]["UUID"]
-        lambda_client.update_event_source_mapping(
-            UUID=uuid, Enabled=enabled, BatchSize=batch_size
-        )
-        print(f"[Lambda] Trigger SQS actualizado (UUID={uuid})")
+        mapping = existing[0]
+        uuid = mapping["UUID"]
+        drift = mapping_drift(mapping, profile)
+        if (mapping.get("State") == "Disabled") == enabled:
+            drift["Enabled"] = enabled
+        if not drift:
+            print(f"[Lambda] Trigger SQS sin cambios (UUID={uuid})")
+            return uuid
+        retry_on_conflict(lambda_client.update_event_source_mapping, UUID=uuid, **drift)
+        wait_mapping_ready(lambda_client, uuid)
+        print(f"[Lambda] Trigger SQS actualizado (UUID={uuid}): {sorted(drift)}")
         return uuid
     resp = lambda_client.create_event_source_mapping(
         EventSourceArn=queue_arn,
         FunctionName=function_name,
         Enabled=enabled,
-        BatchSize=batch_size,
+        **mapping_settings(profile),
     )
     uuid = resp["UUID"]
+    wait_mapping_ready(lambda_client, uuid)
     print(f"[Lambda] Trigger SQS creado (UUID={uuid})")
     return uuid
 
 
-def deploy_static_site(thumbs_bucket, index_path=None):
+def deploy_static_site(thumbs_bucket, site_dir=None, encoding=GZIP):
     """
-    Sube s3_static_website/index.html al bucket de thumbnails y habilita el hosting estático.
+    Sube s3_static_website/ (index.html y el service worker sw.js) al bucket de thumbnails,
+    comprimido y con TTL corto (ver cache_policy.py), y habilita el hosting estático.
     """
     import os
 
-    # Ruta por defecto: s3_static_website/index.html (portable en Win/Linux)
-    if index_path is None:
-        index_path = os.path.join("s3_static_website", "index.html")
+    # Ruta por defecto: s3_static_website/ (portable en Win/Linux)
+    if site_dir is None:
+        site_dir = "s3_static_website"
 
     # 1) Asegurar BPA OFF y policy pública (LIST thumbnails/ + GET)
     disable_bucket_bpa(thumbs_bucket)
     apply_thumbs_public_policy(thumbs_bucket)
 
-    # 2) Subir index.html (obligatorio que exista)
-    if not os.path.exists(index_path):
+    # 2) Subir la página y el service worker (obligatorio que existan)
+    missing = [name for name in SITE_FILES if not os.path.exists(os.path.join(site_dir, name))]
+    if missing:
         raise FileNotFoundError(
-            f"No se encontró el fichero HTML en: {index_path}. "
-            "Crea s3_static_website/index.html o pasa index_path explícito."
+            f"No se encontraron {', '.join(missing)} en: {site_dir}. "
+            "Crea s3_static_website/ o pasa site_dir explícito."
         )
 
-    # Usa upload_file con ContentType correcto
-    s3.upload_file(
-        Filename=index_path,
-        Bucket=thumbs_bucket,
-        Key="index.html",
-        ExtraArgs={"ContentType": "text/html; charset=utf-8"},
-    )
-    print(f"[S3] index.html subido desde {index_path}")
+    # En local la página se abre como file://, que no entiende Content-Encoding
+    publish_site(s3, thumbs_bucket, site_dir, IDENTITY if is_local() else encoding)
 
     # 3) Activar hosting estático
     s3.put_bucket_website(
@@ -259,6 +364,10 @@ def deploy_static_site(thumbs_bucket, index_path=None):
     )
 
     # 4) Mostrar URL
+    if is_local():
+        url = "file://" + os.path.join(s3.bucket_path(thumbs_bucket), "index.html")
+        print(f"[S3] Website local: {url}")
+        return url
     region = s3.meta.region_name or "us-east-1"
     website_host = (
         "s3-website-us-east-1.amazonaws.com"
@@ -270,43 +379,108 @@ def deploy_static_site(thumbs_bucket, index_path=None):
     return url
 
 
+# ---------- Grafo de provisionado ----------
+def provisioning_steps(images_bucket, thumbs_bucket, queue_name, profile, s3_events=False, capacity=None,
+                       site_encoding=GZIP, vendor_deps=True):
+    """
+    Pasos de creación con sus dependencias (ver task_graph.run_graph). Buckets, cola,
+    tabla y rol no dependen entre sí y se crean a la vez; los waiters de DynamoDB y
+    Lambda corren en paralelo dentro de sus pasos.
+    """
+    steps = {
+        "images-bucket": ([], lambda r: ensure_bucket(images_bucket)),
+        "thumbnails-bucket": ([], lambda r: ensure_bucket(thumbs_bucket)),
+        "website": (["thumbnails-bucket"], lambda r: deploy_static_site(thumbs_bucket, encoding=site_encoding)),
+        "dlq": ([], lambda r: ensure_dlq(f"{queue_name}-dlq")),
+        "queue": (["dlq"], lambda r: ensure_queue(queue_name, profile, r["dlq"][1])),
+        "table": ([], lambda r: ensure_table(TABLE_NAME, capacity)),
+    }
+    if s3_events:
+        steps["s3-events"] = (
+            ["images-bucket", "queue"],
+            lambda r: ensure_s3_notifications(images_bucket, *r["queue"]),
+        )
+    if not is_local():
+        steps["role"] = ([], lambda r: labrole_arn())
+        steps["lambda"] = (["role"], lambda r: ensure_lambda(FUNCTION_NAME, r["role"], thumbs_bucket, profile,
+                                                                   vendor_deps))
+        steps["trigger"] = (["queue", "lambda"], lambda r: ensure_sqs_trigger(r["queue"][1], FUNCTION_NAME, profile))
+    return steps
+
+
 # ---------- Main ----------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crea todos los recursos AWS del proyecto.")
+    parser.add_argument(
+        "--s3-events", action="store_true",
+        help="Disparar el procesamiento con notificaciones S3 ObjectCreated en vez de mensajes del cliente",
+    )
+    parser.add_argument("--max-workers", type=int, default=8, help="Pasos de provisionado concurrentes")
+    parser.add_argument("--site-encoding", choices=ENCODINGS, default=GZIP,
+                        help="Compresión de index.html (br sólo detrás de HTTPS/CloudFront; por defecto: %(default)s)")
+    parser.add_argument("--no-vendor", action="store_true",
+                        help="ZIP sólo con lambda_function.py, sin Pillow (sin renditions ni Deep Zoom)")
+    add_profile_arguments(parser)
+    add_capacity_arguments(parser)
+    args = parser.parse_args()
+    profile = profile_from_args(args)
+    # Sin opciones de capacidad se conserva la de la tabla ya creada (p. ej. provisioned)
+    with open_state() as db:
+        stored_capacity = db.get("dynamodb-capacity")
+    try:
+        capacity = capacity_from_args(args, stored_capacity)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.no_vendor:
+        try:
+            check_pillow(profile, [])       # Deep Zoom sin Pillow: error antes de crear nada
+        except ValueError as e:
+            parser.error(str(e))
+
     suffix = unique_suffix()
     images_bucket = f"{IMAGES_BASE}-{suffix}"
     thumbs_bucket = f"{THUMBS_BASE}-{suffix}"
     queue_name    = f"{QUEUE_BASE}-{suffix}"
 
-    # S3 buckets
-    ensure_bucket(images_bucket)
-    ensure_bucket(thumbs_bucket)
-
-    # Desplegar website en thumbnails
-    website_url = deploy_static_site(thumbs_bucket)
-
-    # SQS
-    queue_url, queue_arn = ensure_queue(queue_name)
-
-    # DynamoDB
-    table_arn = ensure_table(TABLE_NAME)
-
-    # Lambda + trigger
-    role = labrole_arn()
-    func_arn = ensure_lambda(FUNCTION_NAME, role, thumbs_bucket)
-    mapping_uuid = ensure_sqs_trigger(queue_arn, FUNCTION_NAME)
-
-    # Guardar recursos en shelve
-    with shelve.open(DB_PATH) as db:
+    results = run_graph(
+        provisioning_steps(images_bucket, thumbs_bucket, queue_name, profile, args.s3_events, capacity,
+                           args.site_encoding, not args.no_vendor),
+        max_workers=args.max_workers,
+        title="Provisionado",
+    )
+    website_url = results["website"]
+    queue_url, queue_arn = results["queue"]
+    dlq_url, dlq_arn = results["dlq"]
+    table_arn, capacity = results["table"]
+    role = results.get("role")
+    func_arn = results.get("lambda")
+    mapping_uuid = results.get("trigger")
+    if is_local():
+        print("[Local] Sin Lambda: procesa la cola con 'python local_worker.py'")
+
+    # Guardar recursos en el registro (una sola transacción)
+    state = open_state()
+    with state as db:
+        db["region"] = REGION
         db["images-bucket"] = images_bucket
         db["thumbnails-bucket"] = thumbs_bucket
         db["messages-queue"] = queue_url
         db["messages-queue-arn"] = queue_arn
+        db["dead-letter-queue"] = dlq_url
+        db["dead-letter-queue-arn"] = dlq_arn
         db["dynamodb-table"] = TABLE_NAME
         db["dynamodb-table-arn"] = table_arn
+        db["dynamodb-capacity"] = capacity
         db["lambda-function"] = FUNCTION_NAME
         db["labrole-arn"] = role
         db["event-source-uuid"] = mapping_uuid
         db["website-url"] = website_url
+        db["s3-event-notifications"] = args.s3_events
+        db["lambda-profile"] = profile
+    # Atributos derivados que otros scripts ya no tendrán que consultar a AWS
+    state.cached("queue-arn", queue_url, lambda: queue_arn)
+    for bucket in (images_bucket, thumbs_bucket):
+        state.cached(f"bucket-region:{bucket}", bucket, lambda: REGION)
 
     print("\n=== RECURSOS CREADOS ===")
     print(f"S3 imágenes     : s3://{images_bucket}")
@@ -314,6 +488,9 @@ if __name__ == "__main__":
     print(f"Website         : {website_url}")
     print(f"SQS URL         : {queue_url}")
     print(f"SQS ARN         : {queue_arn}")
-    print(f"DynamoDB table  : {TABLE_NAME} ({table_arn})")
+    print(f"SQS DLQ         : {dlq_url}")
+    print(f"DynamoDB table  : {TABLE_NAME} ({table_arn}, {describe_capacity(capacity)})")
     print(f"Lambda          : {FUNCTION_NAME} ({func_arn})")
     print(f"Trigger UUID    : {mapping_uuid}")
+    print(f"Perfil          : {describe_profile(profile)}")
+    print(f"Eventos S3      : {'sí' if args.s3_events else 'no'}")
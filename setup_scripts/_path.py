@@ -0,0 +1,11 @@
+"""
+Pone la raíz del proyecto en sys.path para que los scripts de esta carpeta, que se ejecutan
+como `python setup_scripts/<script>.py`, importen sus módulos compartidos (aws_clients.py,
+state_store.py, waiters.py, ...). Cada script lo importa antes que ellos.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -1,18 +1,24 @@
 import os
-import time
-import shelve
-import boto3
+import argparse
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 
+import _path  # puts the project root on sys.path (aws_clients.py, waiters.py, ...)
+from aws_clients import get_client
+from lambda_profile import add_profile_arguments, mapping_drift, mapping_settings, profile_from_args
+from state_store import open_state
+from waiters import WaitTimeout, retry_on_conflict, wait_mapping_ready
+
 class SqsTriggerConfigurator:
     def __init__(self, queue_arn):
         self.queue_arn = queue_arn
 
-    def add_or_update_sqs_trigger(self, client, function_name, batch_size=3, enabled=True):
+    def add_or_update_sqs_trigger(self, client, function_name, profile, enabled=True):
         """
-        Create the event source mapping if missing; otherwise FORCE an update of all
-        existing mappings for (queue_arn, function_name). Retries on in-progress updates.
+        Create the event source mapping if missing; otherwise bring every existing mapping
+        for (queue_arn, function_name) in line with the performance profile (batch size,
+        batching window, maximum concurrency). Mappings already in line are left alone.
+        Retries on in-progress updates.
         """
         # 1) Find existing mappings for this queue + function
         existing = client.list_event_source_mappings(
@@ -27,8 +33,9 @@ class SqsTriggerConfigurator:
                     EventSourceArn=self.queue_arn,
                     FunctionName=function_name,
                     Enabled=enabled,
-                    BatchSize=batch_size
+                    **mapping_settings(profile)
                 )
+                wait_mapping_ready(client, resp["UUID"])
                 print(f"Cola SQS configurada como trigger para '{function_name}'.")
                 print(f"Event Source Mapping ID: {resp['UUID']}")
                 return
@@ -42,33 +49,35 @@ class SqsTriggerConfigurator:
                 print(f"Error al crear el trigger para '{function_name}': {e}")
                 return
 
-        # 3) FORCE update on all existing mappings
+        # 3) Update existing mappings that drifted from the profile
         for mapping in existing:
             uuid = mapping["UUID"]
-            print(f"Forzando actualización del trigger UUID: {uuid} para '{function_name}'…")
-            while True:
-                try:
-                    resp = client.update_event_source_mapping(
-                        UUID=uuid,
-                        Enabled=enabled,
-                        BatchSize=batch_size
-                    )
-                    print(f"Trigger actualizado (UUID: {uuid}) para '{function_name}'.")
-                    break
-                except client.exceptions.ResourceConflictException:
-                    # Otro update en curso; espera y reintenta
-                    time.sleep(2)
-                except Exception as e:
-                    print(f"Error al actualizar el trigger (UUID: {uuid}) para '{function_name}': {e}")
-                    break
-
-
-def resolve_queue_arn_from_shelve():
+            drift = mapping_drift(mapping, profile)
+            if (mapping.get("State") == "Disabled") == enabled:
+                drift["Enabled"] = enabled
+            if not drift:
+                print(f"Trigger UUID: {uuid} para '{function_name}' ya coincide con el perfil.")
+                continue
+            print(f"Actualizando trigger UUID: {uuid} para '{function_name}': {sorted(drift)}…")
+            try:
+                # Otro update en curso → reintento con backoff hasta el plazo máximo
+                retry_on_conflict(client.update_event_source_mapping, UUID=uuid, **drift)
+                wait_mapping_ready(client, uuid)
+                print(f"Trigger actualizado (UUID: {uuid}) para '{function_name}'.")
+            except WaitTimeout as e:
+                print(f"El trigger (UUID: {uuid}) para '{function_name}' sigue ocupado: {e}")
+            except Exception as e:
+                print(f"Error al actualizar el trigger (UUID: {uuid}) para '{function_name}': {e}")
+
+
+def resolve_queue_arn():
     """
-    Lee 'messages-queue' (URL) o 'messages-queue-arn' de aws_resources.db.
-    Si sólo hay URL, consulta SQS para obtener su ARN.
+    Lee 'messages-queue' (URL) o 'messages-queue-arn' del registro de recursos.
+    Si sólo hay URL, el ARN sale de la caché de atributos derivados; sólo la primera vez
+    (o si cambia la URL) se consulta a SQS.
     """
-    with shelve.open("aws_resources.db", flag="r") as db:
+    state = open_state()
+    with state as db:
         queue_arn = db.get("messages-queue-arn")
         queue_url = db.get("messages-queue")
 
@@ -77,35 +86,28 @@ def resolve_queue_arn_from_shelve():
 
     if not queue_url:
         raise RuntimeError(
-            "No se encontró 'messages-queue' (URL) ni 'messages-queue-arn' en aws_resources.db."
+            f"No se encontró 'messages-queue' (URL) ni 'messages-queue-arn' en el entorno '{state.env}' de {state.path}."
         )
 
-    sqs = boto3.client(
-        "sqs",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        aws_session_token=os.getenv("AWS_SESSION_TOKEN"),
-        region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
-    )
-    attrs = sqs.get_queue_attributes(
-        QueueUrl=queue_url,
-        AttributeNames=["QueueArn"]
-    )["Attributes"]
-    return attrs["QueueArn"]
+    def lookup():
+        attrs = get_client("sqs").get_queue_attributes(
+            QueueUrl=queue_url,
+            AttributeNames=["QueueArn"]
+        )["Attributes"]
+        return attrs["QueueArn"]
+    return state.cached("queue-arn", queue_url, lookup)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crea o ajusta el trigger SQS -> Lambda según el perfil.")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile = profile_from_args(args)
     load_dotenv()
 
-    queue_arn = resolve_queue_arn_from_shelve()
+    queue_arn = resolve_queue_arn()
 
-    lambda_client = boto3.client(
-        "lambda",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        aws_session_token=os.getenv("AWS_SESSION_TOKEN"),
-        region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
-    )
+    lambda_client = get_client("lambda")
 
     function_name = "ImageProcessingFunction"
 
@@ -113,7 +115,7 @@ if __name__ == "__main__":
     configurator.add_or_update_sqs_trigger(
         lambda_client,
         function_name,
-        batch_size=3,
+        profile,
         enabled=True
     )
 
@@ -1,110 +1,103 @@
+import io
 import os
-import time
-import shelve
-import boto3
+import zipfile
+import argparse
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 
+import _path  # puts the project root on sys.path (aws_clients.py, waiters.py, ...)
+from aws_clients import get_client
+from lambda_profile import (
+    add_profile_arguments, apply_reserved_concurrency, check_pillow, describe, function_drift,
+    function_environment, function_settings, profile_from_args,
+)
+from state_store import open_state
+from waiters import retry_on_conflict, wait_lambda_ready
+
+parser = argparse.ArgumentParser(description="Create or update the Lambda function from the performance profile.")
+add_profile_arguments(parser)
+PROFILE = profile_from_args(parser.parse_args())   # memory / timeout / runtime / architecture
+
 load_dotenv()
 
 FUNCTION_NAME = "ImageProcessingFunction"
-RUNTIME = "python3.12"                     # use a supported runtime
 HANDLER = "lambda_function.lambda_handler"
-TIMEOUT = 15
-MEMORY = 128
 
-# --- Read values from shelve ---
-with shelve.open("aws_resources.db", flag="r") as db:
+# --- Read values from the state store ---
+with open_state() as db:
     ROLE_ARN = db.get("labrole-arn")
     THUMB_BUCKET = db.get("thumbnails-bucket")
 
 if not ROLE_ARN:
-    raise RuntimeError("Missing 'labrole-arn' in aws_resources.db")
+    raise RuntimeError(f"Missing 'labrole-arn' in environment '{db.env}' of {db.path}")
 if not THUMB_BUCKET:
-    raise RuntimeError("Missing 'thumbnails-bucket' in aws_resources.db")
+    raise RuntimeError(f"Missing 'thumbnails-bucket' in environment '{db.env}' of {db.path}")
 
-lambda_client = boto3.client(
-    "lambda",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    aws_session_token=os.getenv("AWS_SESSION_TOKEN"),
-    region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
-)
+lambda_client = get_client("lambda")
 
 with open("lambda_function/lambda_function.zip", "rb") as f:
     LAMBDA_CODE = f.read()
 
-def wait_until_ready(name, timeout=300, poll=3):
-    """Wait until the function is Active and last update is Successful."""
-    deadline = time.time() + timeout
-    while True:
-        cfg = lambda_client.get_function_configuration(FunctionName=name)
-        state = cfg.get("State")
-        update = cfg.get("LastUpdateStatus")
-        if state == "Active" and update == "Successful":
-            return
-        if update == "Failed":
-            reason = cfg.get("LastUpdateStatusReason", "Unknown")
-            raise RuntimeError(f"Lambda update failed: {reason}")
-        if time.time() > deadline:
-            raise TimeoutError(f"Timed out waiting for {name} to become Active/Successful (state={state}, lastUpdate={update}).")
-        time.sleep(poll)
+# Pillow must come with the ZIP or a profile layer (required when Deep Zoom is enabled)
+PILLOW_WARNING = check_pillow(PROFILE, zipfile.ZipFile(io.BytesIO(LAMBDA_CODE)).namelist())
+if PILLOW_WARNING:
+    print(PILLOW_WARNING)
 
 def create():
-    print(f"Creating Lambda {FUNCTION_NAME} …")
+    print(f"Creating Lambda {FUNCTION_NAME} ({describe(PROFILE)}) …")
     resp = lambda_client.create_function(
         FunctionName=FUNCTION_NAME,
-        Runtime=RUNTIME,
         Role=ROLE_ARN,
         Handler=HANDLER,
         Code={"ZipFile": LAMBDA_CODE},
-        Timeout=TIMEOUT,
-        MemorySize=MEMORY,
-        Environment={"Variables": {"THUMB_BUCKET": THUMB_BUCKET}},
+        Architectures=[PROFILE["architecture"]],
+        Environment={"Variables": {"THUMB_BUCKET": THUMB_BUCKET, **function_environment(PROFILE)}},
         Publish=True,
+        **function_settings(PROFILE),
     )
     # Wait until it's ready before returning
-    wait_until_ready(FUNCTION_NAME)
+    wait_lambda_ready(lambda_client, FUNCTION_NAME)
+    apply_reserved_concurrency(lambda_client, FUNCTION_NAME, PROFILE)
     return resp
 
 def overwrite():
     # 1) Update code
     print(f"Function exists. Updating code for {FUNCTION_NAME} …")
-    while True:
-        try:
-            lambda_client.update_function_code(
-                FunctionName=FUNCTION_NAME,
-                ZipFile=LAMBDA_CODE,
-                Publish=True,
-            )
-            break
-        except lambda_client.exceptions.ResourceConflictException:
-            # Another update in progress: wait and retry
-            time.sleep(3)
-    wait_until_ready(FUNCTION_NAME)
-
-    # 2) Update configuration (including env var THUMB_BUCKET)
-    print(f"Updating configuration for {FUNCTION_NAME} …")
-    # Merge any existing env vars:
     cfg = lambda_client.get_function_configuration(FunctionName=FUNCTION_NAME)
+    drift = function_drift(cfg, PROFILE)
+    # The architecture can only change together with the code
+    arch = {"Architectures": drift.pop("Architectures")} if "Architectures" in drift else {}
+    # Another update in progress → retry with backoff (bounded by the waiter deadline)
+    retry_on_conflict(
+        lambda_client.update_function_code,
+        FunctionName=FUNCTION_NAME,
+        ZipFile=LAMBDA_CODE,
+        Publish=True,
+        **arch,
+    )
+    wait_lambda_ready(lambda_client, FUNCTION_NAME)
+
+    # 2) Update configuration (profile + env vars), only if something differs
+    # Merge any existing env vars; the profile's own ones (DZI_MIN_PIXELS) follow the profile
     env_vars = dict(cfg.get("Environment", {}).get("Variables", {}))
-    env_vars["THUMB_BUCKET"] = THUMB_BUCKET
-
-    while True:
-        try:
-            resp = lambda_client.update_function_configuration(
-                FunctionName=FUNCTION_NAME,
-                Role=ROLE_ARN,
-                Runtime=RUNTIME,
-                Handler=HANDLER,
-                Timeout=TIMEOUT,
-                MemorySize=MEMORY,
-                Environment={"Variables": env_vars},
-            )
-            break
-        except lambda_client.exceptions.ResourceConflictException:
-            time.sleep(3)
-    wait_until_ready(FUNCTION_NAME)
+    env_vars.pop("DZI_MIN_PIXELS", None)
+    env_vars.update(THUMB_BUCKET=THUMB_BUCKET, **function_environment(PROFILE))
+    if cfg.get("Role") != ROLE_ARN or cfg.get("Environment", {}).get("Variables") != env_vars:
+        drift.update(Role=ROLE_ARN, Environment={"Variables": env_vars})
+
+    resp = cfg
+    if drift:
+        print(f"Updating configuration for {FUNCTION_NAME}: {sorted(drift)} …")
+        resp = retry_on_conflict(
+            lambda_client.update_function_configuration,
+            FunctionName=FUNCTION_NAME,
+            Handler=HANDLER,
+            **drift,
+        )
+        wait_lambda_ready(lambda_client, FUNCTION_NAME)
+    else:
+        print(f"Configuration of {FUNCTION_NAME} already matches the profile.")
+    apply_reserved_concurrency(lambda_client, FUNCTION_NAME, PROFILE)
     return resp
 
 try:
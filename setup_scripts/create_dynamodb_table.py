@@ -1,71 +1,38 @@
-import os
-import boto3
-import shelve
-from botocore.exceptions import ClientError
+import argparse
 from dotenv import load_dotenv
 
-load_dotenv()
-
-dynamodb = boto3.client(
-    "dynamodb",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    aws_session_token=os.getenv("AWS_SESSION_TOKEN"),  # may be None
-    region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
-)
-
-TABLE_NAME = "ImageMetadata"
-# --- Read values from shelve ---
-with shelve.open("aws_resources.db", flag="r") as db:
-    TABLE_NAME = db.get("dynamodb-table")
+import _path  # puts the project root on sys.path (aws_clients.py, waiters.py, ...)
+from aws_clients import get_client, is_local
+from state_store import open_state
+from table_schema import TABLE_NAME, add_capacity_arguments, capacity_from_args, ensure_table, table_capacity
 
-def ensure_table():
-    """
-    Create the table if it doesn't exist.
-    If it already exists, just proceed.
-    Always return the table description once it's ACTIVE.
-    """
-    try:
-        # Try to create (first run)
-        resp = dynamodb.create_table(
-            TableName=TABLE_NAME,
-            KeySchema=[{"AttributeName": "ImageID", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "ImageID", "AttributeType": "S"}],
-            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
-        )
-        print(f"Creating table {TABLE_NAME}…")
-    except ClientError as e:
-        code = e.response.get("Error", {}).get("Code")
-        if code == "ResourceInUseException":
-            # Table already exists, continue
-            print(f"Table {TABLE_NAME} already exists. Continuing…")
-        else:
-            raise  # Unexpected error
-
-    # Wait until the table exists/active (covers both create and already-exists)
-    dynamodb.get_waiter("table_exists").wait(TableName=TABLE_NAME)
-
-    # Fetch final description
-    desc = dynamodb.describe_table(TableName=TABLE_NAME)["Table"]
-    status = desc.get("TableStatus")
-    print(f"Table {TABLE_NAME} status: {status}")
+load_dotenv()
 
-    # (Optional) If you want to guarantee ACTIVE:
-    if status != "ACTIVE":
-        # Rare, but you can loop/wait a bit more if needed
-        dynamodb.get_waiter("table_exists").wait(TableName=TABLE_NAME)
-        desc = dynamodb.describe_table(TableName=TABLE_NAME)["Table"]
+dynamodb = get_client("dynamodb")
+# Application Auto Scaling only matters for provisioned tables (and doesn't exist offline)
+autoscaling = None if is_local() else get_client("application-autoscaling")
 
-    return desc
+# --- Read values from the state store ---
+with open_state() as db:
+    TABLE_NAME = db.get("dynamodb-table", TABLE_NAME)
+    STORED_CAPACITY = db.get("dynamodb-capacity")
 
-def store_in_shelve(desc):
+def store_in_state(desc, capacity):
     arn = desc["TableArn"]
-    with shelve.open("aws_resources.db") as db:
+    with open_state() as db:
         db["dynamodb-table"] = TABLE_NAME
         db["dynamodb-table-arn"] = arn
-    print(f"Saved to shelve: dynamodb-table={TABLE_NAME}, dynamodb-table-arn={arn}")
+        db["dynamodb-capacity"] = capacity
+    print(f"Saved to state store: dynamodb-table={TABLE_NAME}, dynamodb-table-arn={arn}")
 
 if __name__ == "__main__":
-    table_desc = ensure_table()
-    print("Tabla DynamoDB disponible:", table_desc)
-    store_in_shelve(table_desc)
+    parser = argparse.ArgumentParser(description="Create the metadata table (same definition as setup.py).")
+    add_capacity_arguments(parser)
+    capacity = capacity_from_args(parser.parse_args(), STORED_CAPACITY)
+
+    # Same definition as setup.py: creates the table, or adds missing GSIs / switches the
+    # capacity mode if it already exists, and waits until table and GSIs are ACTIVE
+    table_desc = ensure_table(dynamodb, TABLE_NAME, capacity, autoscaling)
+    print(f"Table {TABLE_NAME} status: {table_desc.get('TableStatus')}")
+    print("DynamoDB table available:", table_desc)
+    store_in_state(table_desc, table_capacity(table_desc, capacity))
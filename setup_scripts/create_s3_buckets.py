@@ -1,19 +1,15 @@
-import os
-import boto3
 import uuid, time
-import shelve
 from dotenv import load_dotenv
 
+import _path  # puts the project root on sys.path (aws_clients.py, waiters.py, ...)
+from aws_clients import get_client
+from state_store import open_state
+from waiters import wait_bucket_exists
+
 load_dotenv()  # loads .env into environment
 
 # simplest: rely on boto3's default provider chain (reads the env vars above)
-s3 = boto3.client(
-     "s3",
-     aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-     aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-     aws_session_token=os.getenv("AWS_SESSION_TOKEN"),  # may be None if not set
-     region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
-)
+s3 = get_client("s3")
 
 base_names = [
     "image-uploads-bucket",
@@ -28,14 +24,15 @@ print(buckets)
 for bucket in buckets:
     # NOTE: If you're NOT in us-east-1, you should pass CreateBucketConfiguration with the region.
     s3.create_bucket(Bucket=bucket)
-    print(f"Bucket {bucket} creado.")
+    wait_bucket_exists(s3, bucket)
+    print(f"Bucket {bucket} created.")
 
-# Map them to your desired shelve keys
+# Map them to your desired state keys
 images_bucket, thumbnails_bucket = buckets[0], buckets[1]
 
-# Persist to a local shelve file
-with shelve.open("aws_resources.db") as db:
+# Persist to the state store (pipeline_state.db)
+with open_state() as db:
     db["images-bucket"] = images_bucket
     db["thumbnails-bucket"] = thumbnails_bucket  # intentional spelling per request
 
-print("Saved to shelve: images-bucket =", images_bucket, "; thumbnails-bucket =", thumbnails_bucket)
+print("Saved to state store: images-bucket =", images_bucket, "; thumbnails-bucket =", thumbnails_bucket)
@@ -1,26 +1,50 @@
-import os
-import boto3
-import shelve
+import argparse
 from dotenv import load_dotenv
 
+import _path  # puts the project root on sys.path (aws_clients.py, waiters.py, ...)
+from aws_clients import get_client
+from lambda_profile import DLQ_RETENTION_S, add_profile_arguments, profile_from_args, queue_drift
+from state_store import open_state
+from waiters import wait_queue_exists
+
 load_dotenv()  # loads .env into environment
 
+QUEUE_NAME = "image-processing-queue"
+DLQ_NAME = f"{QUEUE_NAME}-dlq"
+
+parser = argparse.ArgumentParser(description="Create the SQS queue and its DLQ from the performance profile.")
+add_profile_arguments(parser)
+profile = profile_from_args(parser.parse_args())   # timeout / batch window / max receive count
+
 # Use env vars if present; otherwise boto3's default chain
-sqs = boto3.client(
-    "sqs",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    aws_session_token=os.getenv("AWS_SESSION_TOKEN"),  # may be None if not set
-    region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
-)
-
-response = sqs.create_queue(QueueName="image-processing-queue")
-queue_url = response["QueueUrl"]
+sqs = get_client("sqs")
+
+# Dead-letter queue first: the main queue's RedrivePolicy needs its ARN
+sqs.create_queue(QueueName=DLQ_NAME, Attributes={"MessageRetentionPeriod": str(DLQ_RETENTION_S)})
+dlq_url = wait_queue_exists(sqs, DLQ_NAME)
+dlq_arn = sqs.get_queue_attributes(QueueUrl=dlq_url, AttributeNames=["QueueArn"])["Attributes"]["QueueArn"]
+print(f"DLQ URL: {dlq_url}")
+
+sqs.create_queue(QueueName=QUEUE_NAME)
+# create_queue is eventually consistent: wait until the queue resolves before storing it
+queue_url = wait_queue_exists(sqs, QUEUE_NAME)
 print(f"Queue URL: {queue_url}")
 
-# Persist the queue URL into a local shelve
-with shelve.open("aws_resources.db") as db:
-    db["messages-queue"] = queue_url
+# Visibility timeout derived from the function timeout + redrive to the DLQ
+attributes = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=["All"])["Attributes"]
+drift = queue_drift(attributes, profile, dlq_arn)
+if drift:
+    sqs.set_queue_attributes(QueueUrl=queue_url, Attributes=drift)
+    print(f"Queue attributes updated: {sorted(drift)}")
+else:
+    print("Queue attributes already match the profile")
 
-print("Saved to shelve: messages-queue =", queue_url)
+# Persist the queue URLs into the state store
+with open_state() as db:
+    db["messages-queue"] = queue_url
+    db["messages-queue-arn"] = attributes["QueueArn"]
+    db["dead-letter-queue"] = dlq_url
+    db["dead-letter-queue-arn"] = dlq_arn
 
+print("Saved to state store: messages-queue =", queue_url)
+print("Saved to state store: dead-letter-queue =", dlq_url)
@@ -1,27 +1,29 @@
-import os
 import json
-import shelve
-import boto3
+import argparse
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 
+import _path  # pone la raíz del proyecto en sys.path (aws_clients.py, waiters.py, ...)
+from aws_clients import get_client
+from cache_policy import ENCODINGS, GZIP, publish_site
+from state_store import open_state
+
 load_dotenv()  # carga .env en el entorno
 
-# 1) Recuperar el nombre del bucket de thumbnails desde la shelve
-with shelve.open("aws_resources.db", flag="r") as db:
+parser = argparse.ArgumentParser(description="Publica la página de la galería y su service worker en el bucket de thumbnails.")
+parser.add_argument("--encoding", choices=ENCODINGS, default=GZIP,
+                    help="Compresión de index.html (br sólo detrás de HTTPS/CloudFront; por defecto: %(default)s)")
+args = parser.parse_args()
+
+# 1) Recuperar el nombre del bucket de thumbnails del registro de recursos
+with open_state() as db:
     bucket_name = db.get("thumbnails-bucket")
 
 if not bucket_name:
-    raise RuntimeError("No se encontró 'thumbnails-bucket' en aws_resources.db.")
+    raise RuntimeError(f"No se encontró 'thumbnails-bucket' en el entorno '{db.env}' de {db.path}.")
 
 # 2) Cliente S3
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    aws_session_token=os.getenv("AWS_SESSION_TOKEN"),  # puede ser None
-    region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
-)
+s3 = get_client("s3")
 
 # 3) DESACTIVAR Block Public Access a nivel de bucket
 s3.put_public_access_block(
@@ -36,7 +38,8 @@ s3.put_public_access_block(
 
 # 4) Establecer bucket policy:
 #    - PublicReadObjects: s3:GetObject para todo el bucket
-#    - PublicListThumbsPrefix: s3:ListBucket SOLO cuando se lista el prefijo thumbnails/
+#    - PublicListThumbsPrefix: s3:ListBucket SOLO cuando se listan los prefijos thumbnails/ y
+#      manifest/deltas/ (deltas del manifiesto aún sin compactar, ver gallery_manifest.py)
 desired_policy = {
     "Version": "2012-10-17",
     "Statement": [
@@ -55,7 +58,7 @@ desired_policy = {
             "Resource": f"arn:aws:s3:::{bucket_name}",
             "Condition": {
                 "StringLike": {
-                    "s3:prefix": ["thumbnails/*", "thumbnails/"]
+                    "s3:prefix": ["thumbnails/*", "thumbnails/", "manifest/deltas/*", "manifest/deltas/"]
                 }
             }
         }
@@ -68,13 +71,9 @@ try:
 except ClientError as e:
     print(f"Aviso: no se pudo establecer bucket policy pública ({e}).")
 
-# 5) Subir el index.html con el content-type correcto
-s3.upload_file(
-    Filename="s3_static_website/index.html",
-    Bucket=bucket_name,
-    Key="index.html",
-    ExtraArgs={"ContentType": "text/html"}
-)
+# 5) Subir index.html y su service worker (sw.js) con content-type, Cache-Control de TTL corto
+#    y comprimidos (cache_policy.py)
+publish_site(s3, bucket_name, "s3_static_website", args.encoding)
 
 # 6) Configurar el hosting estático del bucket
 s3.put_bucket_website(
@@ -91,5 +90,5 @@ website_host = (
     if region == "us-east-1"
     else f"s3-website-{region}.amazonaws.com"
 )
-print(f"Página web subida a s3://{bucket_name}/index.html")
+print(f"Página web subida a s3://{bucket_name}/index.html (con sw.js)")
 print(f"URL (pública si la policy se aplicó): http://{bucket_name}.{website_host}")
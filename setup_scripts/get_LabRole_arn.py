@@ -1,17 +1,22 @@
-import boto3
-import shelve
+from dotenv import load_dotenv
+
+import _path  # puts the project root on sys.path (aws_clients.py, waiters.py, ...)
+from aws_clients import get_client
+from state_store import open_state
+
+load_dotenv()
 
 role_name = "LabRole"
-sts = boto3.client("sts")
+sts = get_client("sts")
 ident = sts.get_caller_identity()
 
 account_id = ident["Account"]
 partition  = ident["Arn"].split(":")[1]   # e.g., "aws", "aws-us-gov", "aws-cn"
 labrole_arn = f"arn:{partition}:iam::{account_id}:role/{role_name}"
 
-# Store in shelve
-with shelve.open("aws_resources.db") as db:
+# Store in the state store
+with open_state() as db:
     db["labrole-arn"] = labrole_arn
 
 print("LabRole ARN:", labrole_arn)
-print("Saved to shelve key 'labrole-arn'.")
+print("Saved to state store key 'labrole-arn'.")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Show the resources registered in the state store (pipeline_state.db).
+Usage:
+  python show_state.py                      # current environment (PIPELINE_ENV or backend)
+  python show_state.py --env ci-1234        # a specific environment
+  python show_state.py --all                # every environment
+  python show_state.py --json               # machine-readable output
+  python show_state.py --migrate aws_resources.db [--overwrite]   # import an old shelve
+"""
+
+import json
+import argparse
+from pprint import pformat
+
+from state_store import StateStore, open_state, state_path
+
+def show(store, with_derived=True):
+    data = store.as_dict()
+    if not data:
+        print(f"(empty) — environment '{store.env}' of {store.path}")
+        return
+    print(f"Environment '{store.env}' of {store.path}:\n")
+    for k in sorted(data):
+        v = data[k]
+        # pretty-print complex values; keep simple types on one line
+        if isinstance(v, (dict, list)):
+            print(f"- {k}:")
+            print(pformat(v, indent=2, width=100))
+        else:
+            print(f"- {k}: {v!r}")
+    derived = store.derived() if with_derived else {}
+    if derived:
+        print("\nDerived (cached):")
+        for name, (source, value) in derived.items():
+            print(f"- {name}: {value!r}  <- {source!r}")
+    print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the pipeline's resource registry.")
+    parser.add_argument("--db", default=None, help=f"SQLite file (default: {state_path()})")
+    parser.add_argument("--env", default=None, help="Environment (default: PIPELINE_ENV or the backend)")
+    parser.add_argument("--all", action="store_true", help="Show every environment")
+    parser.add_argument("--json", action="store_true", help="JSON output")
+    parser.add_argument("--no-derived", action="store_true", help="Don't show derived (cached) attributes")
+    parser.add_argument("--migrate", metavar="SHELVE", help="Import an old shelve into the environment")
+    parser.add_argument("--overwrite", action="store_true", help="With --migrate: overwrite existing keys")
+    args = parser.parse_args()
+
+    store = open_state(env=args.env, path=args.db)
+    if args.migrate:
+        copied = store.migrate_shelve(args.migrate, overwrite=args.overwrite)
+        print(f"Imported {copied} keys from {args.migrate} into environment '{store.env}'.\n")
+
+    envs = store.environments() if args.all else [store.env]
+    stores = [StateStore(path=store.path, env=env) for env in envs]
+    if args.json:
+        print(json.dumps({s.env: s.as_dict() for s in stores}, indent=2, ensure_ascii=False))
+    else:
+        if args.all and not envs:
+            print(f"(empty) — {store.path}")
+        for s in stores:
+            show(s, with_derived=not args.no_derived)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Hojas de sprites (contact sheets) para el modo "overview" de la galería: en vez de cientos de
+peticiones, una por miniatura, la página descarga unas pocas imágenes con 64 miniaturas cada una.
+
+Formato (en el bucket de thumbnails):
+  sprites/index.json                   se reescribe en cada ejecución (TTL corto)
+    {"v": 1, "prefix": "thumbnails/", "tile": [64, 64], "cols": 8, "count": N, "generated": "...",
+     "sheets": [{"path": "sprites/sheets/<hash>.jpg", "k": [clave o null, ...], "e": [ETag o null, ...]}]}
+  sprites/sheets/<hash>.jpg            cols x cols casillas de tile[0] x tile[1] px (JPEG)
+
+La casilla i de una hoja está en x = (i % cols) * tile[0], y = (i // cols) * tile[1]; un null es
+una casilla vacía (imagen borrada). El nombre de cada hoja es el hash de sus claves y ETags.
+
+Incremental: las imágenes ya colocadas conservan hoja y casilla; las nuevas rellenan huecos y
+después la última hoja o hojas nuevas. Sólo se vuelven a componer las hojas cuyo contenido
+cambia, así que ejecutarlo tras cada lote de imágenes cuesta una o dos hojas. --rebuild
+reempaqueta todo en orden de clave. La lista de imágenes sale del manifiesto (base + deltas,
+ver gallery_manifest.py); cada casilla se recorta de la rendition 1x si existe o del thumbnail.
+
+Requiere Pillow.
+
+Uso:
+  python sprite_sheets.py
+  python sprite_sheets.py --every 300          # repetir cada 5 minutos
+  python sprite_sheets.py --rebuild --cols 10 --tile 48
+"""
+import io
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+from aws_clients import get_client
+from cache_policy import decode_body, put_asset
+from gallery_manifest import THUMB_PREFIX, current_entries
+from state_store import open_state
+
+SPRITES_PREFIX = "sprites/"
+INDEX_KEY = f"{SPRITES_PREFIX}index.json"
+SHEETS_PREFIX = f"{SPRITES_PREFIX}sheets/"
+TILE = (64, 64)
+COLS = 8                      # 8 x 8 = 64 miniaturas por hoja
+QUALITY = 70
+BACKGROUND = (11, 13, 17)     # --bg de la página
+RENDITION_1X = "renditions/180x160/"   # ver GRID_CELL en la Lambda
+
+
+def read_index(s3, bucket):
+    try:
+        return json.loads(decode_body(s3.get_object(Bucket=bucket, Key=INDEX_KEY)))
+    except s3.exceptions.NoSuchKey:
+        return None
+
+
+def plan_sheets(previous, entries, per_sheet, rebuild=False):
+    """
+    Casillas de cada hoja: [[(clave, etag) o None, ...], ...]. Respeta la posición de lo que
+    ya estaba en `previous` salvo con rebuild.
+    """
+    current = {entry[0]: entry[4] for entry in entries}
+    sheets = []
+    placed = set()
+    if previous and not rebuild:
+        for sheet in previous["sheets"]:
+            slots = []
+            for key in sheet["k"]:
+                if key in current:
+                    slots.append((key, current[key]))
+                    placed.add(key)
+                else:
+                    slots.append(None)
+            sheets.append(slots)
+
+    new = [key for key in sorted(current) if key not in placed]
+    holes = [(n, i) for n, slots in enumerate(sheets) for i, slot in enumerate(slots) if slot is None]
+    for (n, i), key in zip(holes, new):
+        sheets[n][i] = (key, current[key])
+    new = new[len(holes):]
+    if sheets and len(sheets[-1]) < per_sheet:
+        room = per_sheet - len(sheets[-1])
+        sheets[-1].extend((key, current[key]) for key in new[:room])
+        new = new[room:]
+    for start in range(0, len(new), per_sheet):
+        sheets.append([(key, current[key]) for key in new[start:start + per_sheet]])
+    # Hojas que se quedaron vacías (todas sus imágenes borradas)
+    return [slots for slots in sheets if any(slots)]
+
+
+def sheet_path(slots, tile, cols):
+    fingerprint = json.dumps([tile, cols, slots], separators=(",", ":")).encode("utf-8")
+    return f"{SHEETS_PREFIX}{hashlib.sha256(fingerprint).hexdigest()[:16]}.jpg"
+
+
+def _tile(s3, bucket, key, renditions, tile):
+    source = f"{RENDITION_1X}{key}.jpg" if renditions else f"{THUMB_PREFIX}{key}"
+    try:
+        data = s3.get_object(Bucket=bucket, Key=source)["Body"].read()
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft("RGB", tile)               # JPEG: decodificar a escala reducida
+            return ImageOps.fit(img.convert("RGB"), tile, Image.LANCZOS)
+    except Exception as e:
+        print(f"[Sprites] Casilla vacía para {key}: {e}")
+        return None
+
+
+def render_sheet(s3, bucket, slots, renditions, tile, cols, pool):
+    """JPEG de una hoja con sus casillas (las miniaturas se descargan en paralelo)."""
+    rows = -(-len(slots) // cols)
+    sheet = Image.new("RGB", (cols * tile[0], rows * tile[1]), BACKGROUND)
+    images = pool.map(lambda slot: slot and _tile(s3, bucket, slot[0], renditions.get(slot[0]), tile), slots)
+    for i, img in enumerate(images):
+        if img is not None:
+            sheet.paste(img, ((i % cols) * tile[0], (i // cols) * tile[1]))
+    out = io.BytesIO()
+    sheet.save(out, "JPEG", quality=QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def build(s3, bucket, tile=TILE, cols=COLS, rebuild=False, workers=16):
+    """Pone al día las hojas y el índice. Devuelve el índice."""
+    entries = current_entries(s3, bucket)
+    previous = read_index(s3, bucket)
+    if previous and (previous["tile"] != list(tile) or previous["cols"] != cols):
+        rebuild = True   # otra geometría: las casillas anteriores no sirven
+    plan = plan_sheets(previous, entries, cols * cols, rebuild)
+    renditions = {entry[0]: entry[5] for entry in entries}
+
+    existing = {sheet["path"] for sheet in (previous or {"sheets": []})["sheets"]}
+    sheets, rendered = [], 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for slots in plan:
+            path = sheet_path(slots, tile, cols)
+            if path not in existing:
+                put_asset(s3, bucket, path, render_sheet(s3, bucket, slots, renditions, tile, cols, pool))
+                rendered += 1
+            sheets.append({"path": path,
+                           "k": [slot and slot[0] for slot in slots],
+                           "e": [slot and slot[1] for slot in slots]})
+
+    index = {
+        "v": 1,
+        "prefix": THUMB_PREFIX,
+        "tile": list(tile),
+        "cols": cols,
+        "count": sum(1 for sheet in sheets for key in sheet["k"] if key),
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+        "sheets": sheets,
+    }
+    # Como en el manifiesto: el índice se sube el último y se conservan las hojas del anterior
+    put_asset(s3, bucket, INDEX_KEY, json.dumps(index, separators=(",", ":"), ensure_ascii=False))
+    keep = {sheet["path"] for sheet in sheets} | existing
+    stale = [obj["Key"] for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=SHEETS_PREFIX)
+             for obj in page.get("Contents", []) if obj["Key"] not in keep]
+    for start in range(0, len(stale), 1000):
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in stale[start:start + 1000]],
+                                                 "Quiet": True})
+    print(f"[Sprites] {index['count']} miniaturas en {len(sheets)} hojas "
+          f"({rendered} compuestas, {len(stale)} obsoletas borradas)")
+    return index
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Genera las hojas de sprites del modo overview de la galería.")
+    parser.add_argument("--bucket", help="Bucket de thumbnails (por defecto: thumbnails-bucket del registro)")
+    parser.add_argument("--tile", type=int, default=TILE[0], help="Lado de cada casilla en px (por defecto: %(default)s)")
+    parser.add_argument("--cols", type=int, default=COLS, help="Casillas por lado de la hoja (por defecto: %(default)s)")
+    parser.add_argument("--workers", type=int, default=16, help="Descargas de miniaturas en paralelo")
+    parser.add_argument("--rebuild", action="store_true", help="Reempaquetar todo en orden de clave")
+    parser.add_argument("--every", type=float, default=None, metavar="SEGUNDOS",
+                        help="Repetir cada N segundos (Ctrl+C para salir)")
+    args = parser.parse_args()
+    if Image is None:
+        raise SystemExit("sprite_sheets.py necesita Pillow: pip install pillow")
+    if args.tile < 8 or args.cols < 1:
+        parser.error("--tile debe ser >= 8 y --cols >= 1")
+
+    bucket = args.bucket or open_state().as_dict().get("thumbnails-bucket")
+    if not bucket:
+        raise SystemExit("No hay bucket de thumbnails en el registro: ejecuta setup.py o pasa --bucket")
+    s3 = get_client("s3")
+    rebuild = args.rebuild
+    while True:
+        build(s3, bucket, (args.tile, args.tile), args.cols, rebuild, args.workers)
+        rebuild = False
+        if args.every is None:
+            break
+        try:
+            time.sleep(args.every)
+        except KeyboardInterrupt:
+            break
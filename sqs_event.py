@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Convierte mensajes de `sqs.receive_message` al formato de evento que Lambda entrega
+a `lambda_handler` (claves en camelCase, atributos con stringValue/dataType).
+Lo usan los consumidores que ejecutan el handler fuera de Lambda.
+"""
+
+def to_lambda_record(message, queue_arn="", region=""):
+    attrs = {}
+    for name, value in message.get("MessageAttributes", {}).items():
+        attrs[name] = {
+            "stringValue": value.get("StringValue"),
+            "binaryValue": value.get("BinaryValue"),
+            "dataType": value.get("DataType", "String"),
+        }
+    return {
+        "messageId": message["MessageId"],
+        "receiptHandle": message["ReceiptHandle"],
+        "body": message["Body"],
+        "attributes": message.get("Attributes", {}),
+        "messageAttributes": attrs,
+        "md5OfBody": message.get("MD5OfBody", ""),
+        "eventSource": "aws:sqs",
+        "eventSourceARN": queue_arn,
+        "awsRegion": region,
+    }
+
+def to_lambda_event(messages, queue_arn="", region=""):
+    return {"Records": [to_lambda_record(m, queue_arn, region) for m in messages]}
+
+def successful_messages(messages, response):
+    """Mensajes que el handler NO devolvió en batchItemFailures (se pueden borrar)."""
+    failed = {f["itemIdentifier"] for f in (response or {}).get("batchItemFailures", [])}
+    return [m for m in messages if m["MessageId"] not in failed]
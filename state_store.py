@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Registro de recursos del pipeline (sustituye al shelve aws_resources.db).
+
+Un único fichero SQLite (`pipeline_state.db`, o PIPELINE_STATE_DB) con:
+- entornos con nombre (PIPELINE_ENV; por defecto el backend: "aws" o "local"), así
+  varias cuentas, pruebas de CI o el modo offline no se pisan entre sí;
+- escrituras en transacciones BEGIN IMMEDIATE con busy timeout: varios procesos
+  (workers, jobs de CI, setup en paralelo) pueden leer y escribir a la vez;
+- una caché de atributos derivados (ARN de la cola, región de un bucket, ...) que se
+  recalcula sólo si cambia el valor del que se derivó.
+
+Uso (mismo estilo que el shelve):
+    with open_state() as db:          # el bloque entero es una transacción (lecturas incluidas)
+        db["images-bucket"] = name
+        queue_url = db.get("messages-queue")
+
+    arn = open_state().cached("queue-arn", queue_url, lambda: ...)
+
+La primera vez que se abre un entorno vacío se importa el shelve antiguo si existe
+(aws_resources.db / local_resources.db). Ver show_state.py.
+"""
+import os
+import json
+import time
+import dbm
+import shelve
+import sqlite3
+
+from aws_clients import backend, resources_db
+
+DEFAULT_PATH = "pipeline_state.db"
+BUSY_TIMEOUT = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    env TEXT NOT NULL, key TEXT NOT NULL, value TEXT, updated_at REAL,
+    PRIMARY KEY (env, key)
+);
+CREATE TABLE IF NOT EXISTS derived (
+    env TEXT NOT NULL, name TEXT NOT NULL, source TEXT, value TEXT, updated_at REAL,
+    PRIMARY KEY (env, name)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    env TEXT NOT NULL, name TEXT NOT NULL, value TEXT,
+    PRIMARY KEY (env, name)
+);
+"""
+
+def state_path():
+    return os.getenv("PIPELINE_STATE_DB", DEFAULT_PATH)
+
+def default_env():
+    return os.getenv("PIPELINE_ENV") or backend()
+
+
+class StateStore:
+    """Diccionario persistente por entorno. Fuera de un bloque `with`, cada escritura se confirma sola."""
+
+    def __init__(self, path=None, env=None, timeout=BUSY_TIMEOUT):
+        self.path = path or state_path()
+        self.env = env or default_env()
+        self.timeout = timeout
+        self._conn = None  # conexión con la transacción abierta dentro de `with`
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        if self._conn is not None:
+            return _Borrowed(self._conn)
+        # Conexión corta por operación: sin estado compartido entre hilos ni procesos
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return _Closing(conn)
+
+    def _write(self, statements):
+        if self._conn is not None:
+            for sql, params in statements:
+                self._conn.execute(sql, params)
+            return
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    # ----- lectura -----
+    def as_dict(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, value FROM resources WHERE env = ?", (self.env,)).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def get(self, key, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM resources WHERE env = ? AND key = ?", (self.env, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __getitem__(self, key):
+        value = self.get(key, _DELETED)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _DELETED) is not _DELETED
+
+    def keys(self):
+        return sorted(self.as_dict())
+
+    def is_empty(self):
+        return not self.as_dict()
+
+    # ----- escritura -----
+    def update(self, mapping):
+        """Escribe varias claves en una sola transacción."""
+        now = time.time()
+        statements = []
+        for key, value in mapping.items():
+            if value is _DELETED:
+                statements.append(("DELETE FROM resources WHERE env = ? AND key = ?", (self.env, key)))
+            else:
+                statements.append((
+                    "INSERT INTO resources (env, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (env, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                    (self.env, key, json.dumps(value), now),
+                ))
+        self._write(statements)
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __delitem__(self, key):
+        self.update({key: _DELETED})
+
+    def clear(self):
+        """Borra todos los recursos y atributos derivados del entorno."""
+        self._write([
+            ("DELETE FROM resources WHERE env = ?", (self.env,)),
+            ("DELETE FROM derived WHERE env = ?", (self.env,)),
+        ])
+
+    def __enter__(self):
+        # BEGIN IMMEDIATE toma el bloqueo de escritura: un leer-modificar-escribir dentro
+        # del bloque es atómico frente a otros procesos (los lectores no se bloquean: WAL)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        conn.execute("BEGIN IMMEDIATE")
+        self._conn = conn
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        conn, self._conn = self._conn, None
+        try:
+            conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            conn.close()
+        return False
+
+    # ----- atributos derivados -----
+    def cached(self, name, source, compute):
+        """
+        Devuelve el valor derivado `name` si se calculó a partir del mismo `source`;
+        si no (o si nunca se calculó), llama a compute(), lo guarda y lo devuelve.
+        """
+        source_json = json.dumps(source)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT source, value FROM derived WHERE env = ? AND name = ?", (self.env, name)
+            ).fetchone()
+        if row and row[0] == source_json:
+            return json.loads(row[1])
+        value = compute()
+        self._write([(
+            "INSERT INTO derived (env, name, source, value, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (env, name) DO UPDATE SET source = excluded.source, value = excluded.value, "
+            "updated_at = excluded.updated_at",
+            (self.env, name, source_json, json.dumps(value), time.time()),
+        )])
+        return value
+
+    def derived(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name, source, value FROM derived WHERE env = ? ORDER BY name", (self.env,)
+            ).fetchall()
+        return {name: (json.loads(source), json.loads(value)) for name, source, value in rows}
+
+    def environments(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT DISTINCT env FROM resources ORDER BY env").fetchall()
+        return [r[0] for r in rows]
+
+    # ----- migración -----
+    def migrate_shelve(self, shelve_path, overwrite=False):
+        """Importa las claves de un shelve antiguo. Devuelve cuántas se copiaron."""
+        if dbm.whichdb(shelve_path) is None:
+            return 0
+        with shelve.open(shelve_path, flag="r") as db:
+            legacy = {k: db[k] for k in db.keys()}
+        current = self.as_dict()
+        to_copy = {k: v for k, v in legacy.items() if overwrite or k not in current}
+        if to_copy:
+            self.update(to_copy)
+        self._write([(
+            "INSERT OR REPLACE INTO meta (env, name, value) VALUES (?, 'migrated-from', ?)",
+            (self.env, json.dumps(shelve_path)),
+        )])
+        return len(to_copy)
+
+    def _migrated(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM meta WHERE env = ? AND name = 'migrated-from'", (self.env,)
+            ).fetchone()
+        return row is not None
+
+
+class _Closing:
+    """sqlite3.Connection como context manager que además la cierra."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc):
+        self.conn.close()
+        return False
+
+
+class _Borrowed(_Closing):
+    """La conexión de la transacción en curso: no se cierra al salir."""
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Deleted:
+    def __repr__(self):
+        return "<deleted>"
+
+_DELETED = _Deleted()
+
+
+def open_state(env=None, path=None):
+    """
+    Abre el entorno (por defecto PIPELINE_ENV o el backend). Si está vacío y hay un shelve
+    antiguo de ese backend en el directorio actual, lo importa una única vez.
+    """
+    store = StateStore(path=path, env=env)
+    if env is None and store.is_empty() and not store._migrated():
+        copied = store.migrate_shelve(resources_db())
+        if copied:
+            print(f"[State] {copied} claves importadas de {resources_db()} al entorno '{store.env}' de {store.path}")
+    return store
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Definición única de la tabla de metadatos (ImageMetadata) para setup.py y
+setup_scripts/create_dynamodb_table.py.
+
+- Modo de capacidad seleccionable: on-demand (PAY_PER_REQUEST, por defecto) o provisioned
+  con objetivos de Application Auto Scaling (target tracking) para la tabla y cada GSI.
+- GSIs para las consultas reales, así los consumidores no necesitan Scan:
+    ProcessedDate-index  ProcessedDate (YYYY-MM-DD) + ProcessedAt   -> "lo procesado el día X"
+    ContentType-index    ContentType + ProcessedAt                  -> "los PNG más recientes"
+  La Lambda escribe ProcessedDate, ProcessedAt (ISO 8601 UTC) y ContentType en cada item.
+
+ensure_table() es idempotente: crea la tabla o, si ya existe, añade los GSIs que falten y
+cambia el modo de capacidad si difiere. Si el cambio de modo falla (DynamoDB sólo lo permite
+una vez cada 24 h) se sigue con el modo real de la tabla: los GSIs nuevos se crean con él y el
+auto scaling no se toca. Sin --capacity-mode (ni el resto de opciones) se usa la capacidad
+guardada en el registro ("dynamodb-capacity"), así repetir setup.py no cambia el modo.
+
+Uso:
+  python setup.py --capacity-mode provisioned --read-capacity 5 --write-capacity 25 --max-write-capacity 1000
+"""
+from botocore.exceptions import ClientError
+
+from waiters import wait_table_active
+
+TABLE_NAME = "ImageMetadata"
+
+ON_DEMAND = "on-demand"
+PROVISIONED = "provisioned"
+
+DEFAULT_CAPACITY = {
+    "mode": ON_DEMAND,
+    "read": 5,            # capacidad inicial / mínima del auto scaling (provisioned)
+    "write": 5,
+    "max_read": 100,      # techo del auto scaling
+    "max_write": 500,
+    "target": 70.0,       # % de utilización que persigue el target tracking
+}
+
+# (nombre, clave de partición, clave de ordenación)
+INDEXES = [
+    ("ProcessedDate-index", "ProcessedDate", "ProcessedAt"),
+    ("ContentType-index", "ContentType", "ProcessedAt"),
+]
+
+
+def _attribute_definitions():
+    names = ["ImageID"] + sorted({attr for _, hash_key, range_key in INDEXES for attr in (hash_key, range_key)})
+    return [{"AttributeName": name, "AttributeType": "S"} for name in names]
+
+
+def _throughput(capacity):
+    return {"ReadCapacityUnits": capacity["read"], "WriteCapacityUnits": capacity["write"]}
+
+
+def index_definition(name, hash_key, range_key, capacity):
+    index = {
+        "IndexName": name,
+        "KeySchema": [
+            {"AttributeName": hash_key, "KeyType": "HASH"},
+            {"AttributeName": range_key, "KeyType": "RANGE"},
+        ],
+        # Los items son pequeños: proyectar todo evita un GetItem por resultado
+        "Projection": {"ProjectionType": "ALL"},
+    }
+    if capacity["mode"] == PROVISIONED:
+        index["ProvisionedThroughput"] = _throughput(capacity)
+    return index
+
+
+def table_definition(name, capacity):
+    """Parámetros de create_table."""
+    definition = {
+        "TableName": name,
+        "KeySchema": [{"AttributeName": "ImageID", "KeyType": "HASH"}],
+        "AttributeDefinitions": _attribute_definitions(),
+        "GlobalSecondaryIndexes": [index_definition(*index, capacity) for index in INDEXES],
+    }
+    if capacity["mode"] == PROVISIONED:
+        definition["BillingMode"] = "PROVISIONED"
+        definition["ProvisionedThroughput"] = _throughput(capacity)
+    else:
+        definition["BillingMode"] = "PAY_PER_REQUEST"
+    return definition
+
+
+def billing_mode(desc):
+    # Las tablas creadas antes de existir on-demand no traen BillingModeSummary
+    return desc.get("BillingModeSummary", {}).get("BillingMode", "PROVISIONED")
+
+
+def table_capacity(desc, capacity):
+    """capacity con el modo que tiene realmente la tabla (el cambio de modo puede haber fallado)."""
+    mode = PROVISIONED if billing_mode(desc) == "PROVISIONED" else ON_DEMAND
+    return capacity if mode == capacity["mode"] else dict(capacity, mode=mode)
+
+
+def ensure_table(dynamodb, name, capacity, autoscaling=None, log=print):
+    """
+    Crea la tabla o la pone al día (GSIs y modo de capacidad). Devuelve la descripción ACTIVE;
+    table_capacity(desc, capacity) da el modo con el que quedó.
+    """
+    previous_mode = None
+    mode_applied = True
+    try:
+        dynamodb.create_table(**table_definition(name, capacity))
+        log(f"[DDB] Creando tabla: {name} ({describe_capacity(capacity)}, esperando ACTIVE)")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ResourceInUseException":
+            raise
+        log(f"[DDB] Tabla ya existe: {name}")
+        wait_table_active(dynamodb, name)
+        previous_mode, desc = _reconcile(dynamodb, name, capacity, log)
+        mode_applied = table_capacity(desc, capacity)["mode"] == capacity["mode"]
+
+    wait_table_active(dynamodb, name)
+    # Si el modo no cambió, el auto scaling que haya sigue siendo el de la tabla real
+    if autoscaling is not None and mode_applied:
+        if capacity["mode"] == PROVISIONED:
+            configure_autoscaling(autoscaling, name, capacity, log)
+        elif previous_mode == "PROVISIONED":
+            # Pasó a on-demand: los objetivos de auto scaling ya no aplican
+            remove_autoscaling(autoscaling, name, log)
+    return dynamodb.describe_table(TableName=name)["Table"]
+
+
+def _reconcile(dynamodb, name, capacity, log):
+    """
+    Cambia el modo de capacidad y añade los GSIs que falten con el modo que quede.
+    Devuelve (modo que tenía, descripción tras el cambio).
+    """
+    desc = dynamodb.describe_table(TableName=name)["Table"]
+    previous_mode = billing_mode(desc)
+    wanted_mode = "PROVISIONED" if capacity["mode"] == PROVISIONED else "PAY_PER_REQUEST"
+    existing = {i["IndexName"] for i in desc.get("GlobalSecondaryIndexes", [])}
+
+    if previous_mode != wanted_mode:
+        update = {"TableName": name, "BillingMode": wanted_mode}
+        if wanted_mode == "PROVISIONED":
+            # Al pasar a provisioned hay que dar capacidad a la tabla y a cada GSI existente
+            update["ProvisionedThroughput"] = _throughput(capacity)
+            if existing:
+                update["GlobalSecondaryIndexUpdates"] = [
+                    {"Update": {"IndexName": index, "ProvisionedThroughput": _throughput(capacity)}}
+                    for index in sorted(existing)
+                ]
+        try:
+            dynamodb.update_table(**update)
+            log(f"[DDB] Modo de capacidad: {previous_mode} -> {wanted_mode}")
+            wait_table_active(dynamodb, name)
+        except ClientError as e:
+            # DynamoDB sólo permite cambiar de modo una vez cada 24 h
+            log(f"[DDB] No se pudo cambiar el modo de capacidad, sigue en {previous_mode}: {e}")
+        desc = dynamodb.describe_table(TableName=name)["Table"]
+
+    # Un GSI por update_table, esperando a que cada uno termine de rellenarse.
+    # Su definición sigue el modo real: ProvisionedThroughput en una tabla on-demand (o al revés) falla
+    current = table_capacity(desc, capacity)
+    for index in INDEXES:
+        if index[0] in existing:
+            continue
+        dynamodb.update_table(
+            TableName=name,
+            AttributeDefinitions=_attribute_definitions(),
+            GlobalSecondaryIndexUpdates=[{"Create": index_definition(*index, current)}],
+        )
+        log(f"[DDB] Creando índice {index[0]} en {name}")
+        wait_table_active(dynamodb, name)
+    return previous_mode, dynamodb.describe_table(TableName=name)["Table"]
+
+
+# ---------- Application Auto Scaling (modo provisioned) ----------
+def scalable_resources(name):
+    """(ResourceId, prefijo de dimensión) de la tabla y de cada GSI."""
+    return [(f"table/{name}", "dynamodb:table")] + [
+        (f"table/{name}/index/{index}", "dynamodb:index") for index, _, _ in INDEXES
+    ]
+
+
+def configure_autoscaling(autoscaling, name, capacity, log=print):
+    """Registra lectura y escritura de la tabla y sus GSIs con una política de target tracking."""
+    try:
+        for resource_id, dimension in scalable_resources(name):
+            for unit, minimum, maximum, metric in (
+                ("Read", capacity["read"], capacity["max_read"], "DynamoDBReadCapacityUtilization"),
+                ("Write", capacity["write"], capacity["max_write"], "DynamoDBWriteCapacityUtilization"),
+            ):
+                scalable_dimension = f"{dimension}:{unit}CapacityUnits"
+                autoscaling.register_scalable_target(
+                    ServiceNamespace="dynamodb",
+                    ResourceId=resource_id,
+                    ScalableDimension=scalable_dimension,
+                    MinCapacity=minimum,
+                    MaxCapacity=maximum,
+                )
+                autoscaling.put_scaling_policy(
+                    PolicyName=f"{resource_id.replace('/', '-')}-{unit.lower()}-target-tracking",
+                    ServiceNamespace="dynamodb",
+                    ResourceId=resource_id,
+                    ScalableDimension=scalable_dimension,
+                    PolicyType="TargetTrackingScaling",
+                    TargetTrackingScalingPolicyConfiguration={
+                        "TargetValue": float(capacity["target"]),
+                        "PredefinedMetricSpecification": {"PredefinedMetricType": metric},
+                    },
+                )
+    except ClientError as e:
+        # P. ej. cuentas sin permiso para crear el rol vinculado de Application Auto Scaling
+        log(f"[DDB] No se pudo configurar el auto scaling de {name}: {e}")
+        return False
+    log(f"[DDB] Auto scaling de {name}: lectura {capacity['read']}-{capacity['max_read']}, "
+        f"escritura {capacity['write']}-{capacity['max_write']} RCU/WCU al {capacity['target']:g}%")
+    return True
+
+
+def remove_autoscaling(autoscaling, name, log=print):
+    """Quita los objetivos de auto scaling de la tabla y sus GSIs (los que no existen se ignoran)."""
+    removed = 0
+    for resource_id, dimension in scalable_resources(name):
+        for unit in ("Read", "Write"):
+            try:
+                autoscaling.deregister_scalable_target(
+                    ServiceNamespace="dynamodb",
+                    ResourceId=resource_id,
+                    ScalableDimension=f"{dimension}:{unit}CapacityUnits",
+                )
+                removed += 1
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("ObjectNotFoundException", "ValidationException"):
+                    log(f"[DDB] Error quitando el auto scaling de {resource_id}: {e}")
+    if removed:
+        log(f"[DDB] Auto scaling eliminado de {name} ({removed} objetivos)")
+    return removed
+
+
+# ---------- CLI ----------
+def add_capacity_arguments(parser):
+    # Sin valor por defecto: lo que no se pase sale de la capacidad guardada o de DEFAULT_CAPACITY
+    group = parser.add_argument_group("capacidad de DynamoDB (ver table_schema.py; por defecto, la "
+                                      "guardada en el registro)")
+    group.add_argument("--capacity-mode", choices=[ON_DEMAND, PROVISIONED],
+                       help=f"on-demand (PAY_PER_REQUEST) o provisioned con auto scaling "
+                            f"(tabla nueva: {DEFAULT_CAPACITY['mode']})")
+    group.add_argument("--read-capacity", type=int,
+                       help=f"RCU iniciales y mínimas (provisioned; tabla nueva: {DEFAULT_CAPACITY['read']})")
+    group.add_argument("--write-capacity", type=int,
+                       help=f"WCU iniciales y mínimas (provisioned; tabla nueva: {DEFAULT_CAPACITY['write']})")
+    group.add_argument("--max-read-capacity", type=int,
+                       help=f"RCU máximas del auto scaling (tabla nueva: {DEFAULT_CAPACITY['max_read']})")
+    group.add_argument("--max-write-capacity", type=int,
+                       help=f"WCU máximas del auto scaling (tabla nueva: {DEFAULT_CAPACITY['max_write']})")
+    group.add_argument("--target-utilization", type=float,
+                       help=f"Utilización objetivo del auto scaling en %% "
+                            f"(tabla nueva: {DEFAULT_CAPACITY['target']:g})")
+    return parser
+
+
+def capacity_from_args(args, stored=None):
+    """Capacidad pedida: las opciones dadas, y para el resto la guardada (stored) o DEFAULT_CAPACITY."""
+    base = dict(DEFAULT_CAPACITY, **(stored or {}))
+    given = {
+        "mode": args.capacity_mode,
+        "read": args.read_capacity,
+        "write": args.write_capacity,
+        "max_read": args.max_read_capacity,
+        "max_write": args.max_write_capacity,
+        "target": args.target_utilization,
+    }
+    capacity = {key: base[key] if value is None else value for key, value in given.items()}
+    capacity["max_read"] = max(capacity["max_read"], capacity["read"])
+    capacity["max_write"] = max(capacity["max_write"], capacity["write"])
+    if capacity["read"] < 1 or capacity["write"] < 1:
+        raise ValueError("La capacidad provisionada mínima es 1 RCU/WCU")
+    if not 20 <= capacity["target"] <= 90:
+        raise ValueError(f"target-utilization fuera de rango (20-90): {capacity['target']}")
+    return capacity
+
+
+def describe_capacity(capacity):
+    if capacity["mode"] == ON_DEMAND:
+        return "on-demand"
+    return (f"provisioned {capacity['read']}/{capacity['write']} RCU/WCU, auto scaling hasta "
+            f"{capacity['max_read']}/{capacity['max_write']} al {capacity['target']:g}%")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Ejecución concurrente de pasos con dependencias (provisionado y teardown).
+
+Cada paso es nombre -> (dependencias, función). La función recibe el dict de resultados
+de los pasos anteriores y su valor de retorno queda en results[nombre]. Los pasos cuyas
+dependencias ya terminaron se lanzan en paralelo; al acabar se imprime la duración de
+cada uno y el tiempo total.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def run_graph(steps, max_workers=8, title="Pasos"):
+    unknown = {dep for deps, _ in steps.values() for dep in deps if dep not in steps}
+    if unknown:
+        raise ValueError(f"Dependencias desconocidas: {sorted(unknown)}")
+
+    results, timings = {}, {}
+    pending = dict(steps)
+    running = {}
+    t0 = time.perf_counter()
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        try:
+            return fn(results)
+        finally:
+            timings[name] = (start - t0, time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        error = None
+        while pending or running:
+            if error is None:
+                for name in [n for n, (deps, _) in pending.items() if all(d in results for d in deps)]:
+                    _, fn = pending.pop(name)
+                    running[pool.submit(timed, name, fn)] = name
+            if not running:
+                if pending and error is None:
+                    raise ValueError(f"Ciclo de dependencias entre: {sorted(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    # No se lanzan más pasos; se espera a que terminen los que están en curso
+                    print(f"[Graph] Error en '{name}': {e}")
+                    error = error or e
+
+    total = time.perf_counter() - t0
+    print(f"\n=== {title}: tiempos ===")
+    for name, (offset, duration) in sorted(timings.items(), key=lambda kv: kv[1][0]):
+        print(f"{name:20} +{offset:6.2f}s  {duration:6.2f}s")
+    print(f"{'TOTAL':20}  {total:14.2f}s")
+    if error is not None:
+        raise error
+    return results
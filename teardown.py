@@ -1,48 +1,207 @@
 #!/usr/bin/env python3
 import os
-import shelve
-import boto3
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
+from aws_clients import get_client, is_local
+from state_store import open_state
+from retry_policy import SINGLE_ATTEMPT, RetryPolicy, AdaptiveRateLimiter
+from table_schema import remove_autoscaling
+from task_graph import run_graph
 
 load_dotenv()
 REGION = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
-DB_PATH = "aws_resources.db"
 
-session = boto3.Session(region_name=REGION)
-s3 = session.client("s3")
-sqs = session.client("sqs")
-dynamodb = session.client("dynamodb")
-lambda_client = session.client("lambda")
+s3 = get_client("s3", REGION)
+sqs = get_client("sqs", REGION)
+dynamodb = get_client("dynamodb", REGION)
+lambda_client = None if is_local() else get_client("lambda", REGION)
+autoscaling = None if is_local() else get_client("application-autoscaling", REGION)
 
-def empty_bucket(bucket, region=REGION):
-    s3r = boto3.client("s3", region_name=region)
-    # versions/delete markers
+# Límite superior de los rangos de claves (mayor que cualquier carácter real)
+KEY_MAX = "\U0010ffff"
+
+def _ignore_missing(e, codes=("NoSuchBucket",)):
+    if e.response.get("Error", {}).get("Code") not in codes:
+        raise
+
+def _split_chars(shards):
+    """Reparte los caracteres ASCII imprimibles en `shards` puntos de corte."""
+    chars = [chr(c) for c in range(0x20, 0x7f)]
+    step = max(1, -(-len(chars) // shards))
+    return chars[::step][1:]
+
+def key_ranges(prefixes, shards):
+    """
+    Parte TODO el espacio de claves en rangos [lo, hi) consecutivos. La raíz aporta `shards`
+    cortes (un bucket plano, como el de imágenes, se lista en paralelo) y cada prefijo de
+    primer nivel otros tantos (prefijo + carácter), así un bucket con todo bajo
+    'thumbnails/' también. hi=None significa "hasta el final".
+    """
+    bounds = {""} | set(_split_chars(shards))
+    for prefix in prefixes:
+        bounds.add(prefix)
+        bounds.update(prefix + c for c in _split_chars(shards))
+    bounds = sorted(bounds)
+    return list(zip(bounds, bounds[1:] + [None]))
+
+def _just_before(key):
+    # La mayor cadena "razonable" menor que key (para StartAfter/KeyMarker)
+    return key[:-1] + chr(ord(key[-1]) - 1) + KEY_MAX if key else ""
+
+def list_shard(s3r, bucket, lo, hi, versions):
+    """Genera lotes (<=1000) de objetos a borrar con clave en [lo, hi)."""
+    in_range = (lambda k: True) if hi is None else (lambda k: k < hi)
+    kwargs = {"Bucket": bucket}
+    marker = _just_before(lo)
+    if versions:
+        if marker:
+            kwargs["KeyMarker"] = marker
+        while True:
+            page = s3r.list_object_versions(**kwargs)
+            entries = page.get("Versions", []) + page.get("DeleteMarkers", [])
+            batch = [{"Key": v["Key"], "VersionId": v["VersionId"]} for v in entries if in_range(v["Key"])]
+            if batch:
+                yield batch
+            if not page.get("IsTruncated") or len(batch) < len(entries):
+                return
+            kwargs["KeyMarker"] = page["NextKeyMarker"]
+            kwargs["VersionIdMarker"] = page.get("NextVersionIdMarker", "")
+    else:
+        if marker:
+            kwargs["StartAfter"] = marker
+        while True:
+            page = s3r.list_objects_v2(**kwargs)
+            contents = page.get("Contents", [])
+            batch = [{"Key": o["Key"]} for o in contents if in_range(o["Key"])]
+            if batch:
+                yield batch
+            if not page.get("IsTruncated") or len(batch) < len(contents):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+def top_level_prefixes(s3r, bucket, max_pages=1):
+    """
+    Prefijos de primer nivel ('thumbnails/', ...) vistos en las primeras `max_pages` páginas
+    del listado con Delimiter. Una sola página basta: un bucket plano no tiene prefijos (y
+    paginar todas sus claves en serie sería tan caro como borrarlas), y si algún prefijo queda
+    sin ver sus claves siguen cubiertas por los cortes de la raíz, sólo con menos paralelismo.
+    """
+    prefixes = []
+    pages = s3r.get_paginator("list_objects_v2").paginate(Bucket=bucket, Delimiter="/")
+    for n, page in enumerate(pages):
+        prefixes += [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+        if n + 1 >= max_pages:
+            break
+    return prefixes
+
+class DeleteProgress:
+    """Contador compartido con informe periódico del progreso de borrado."""
+
+    def __init__(self, bucket, interval=5.0):
+        self.bucket = bucket
+        self.interval = interval
+        self.deleted = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._report, daemon=True)
+
+    def add(self, deleted, errors=0):
+        with self._lock:
+            self.deleted += deleted
+            self.errors += errors
+
+    def _report(self):
+        while not self._stop.wait(self.interval):
+            self.print()
+
+    def print(self, final=False):
+        elapsed = max(time.time() - self._start, 1e-6)
+        label = "borrados en total" if final else "borrados"
+        print(f"[S3] {self.bucket}: {self.deleted} objetos {label} ({self.deleted / elapsed:.0f}/s)"
+              + (f", {self.errors} errores" if self.errors else ""))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.print(final=True)
+        return False
+
+def _delete_pass(s3r, s3d, bucket, versions, ranges, workers, progress):
+    """
+    Lista los rangos de claves en paralelo (con `s3r`) y borra los lotes con `workers` hilos
+    (con `s3d`, de un solo intento: los reintentos de delete_objects los lleva RetryPolicy).
+    """
+    batches = queue.Queue(maxsize=workers * 4)
+    retry = RetryPolicy(limiter=AdaptiveRateLimiter(rate=200.0))
+
+    def deleter():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            try:
+                resp = retry.call(s3d.delete_objects, Bucket=bucket, Delete={"Objects": batch, "Quiet": True})
+                errors = resp.get("Errors", [])
+                for err in errors[:3]:
+                    print(f"[S3] No se pudo borrar {err.get('Key')}: {err.get('Code')}")
+                progress.add(len(batch) - len(errors), len(errors))
+            except Exception as e:
+                print(f"[S3] Error en delete_objects ({len(batch)} claves): {e}")
+                progress.add(0, len(batch))
+
+    def lister(lo, hi):
+        for batch in list_shard(s3r, bucket, lo, hi, versions):
+            batches.put(batch)
+
+    deleters = [threading.Thread(target=deleter, daemon=True) for _ in range(workers)]
+    for t in deleters:
+        t.start()
     try:
-        paginator = s3r.get_paginator("list_object_versions")
-        for page in paginator.paginate(Bucket=bucket):
-            objs = []
-            for v in page.get("Versions", []):
-                objs.append({"Key": v["Key"], "VersionId": v["VersionId"]})
-            for m in page.get("DeleteMarkers", []):
-                objs.append({"Key": m["Key"], "VersionId": m["VersionId"]})
-            if objs:
-                for i in range(0, len(objs), 1000):
-                    s3r.delete_objects(Bucket=bucket, Delete={"Objects": objs[i:i+1000], "Quiet": True})
-    except ClientError as e:
-        if e.response.get("Error", {}).get("Code") not in ("NoSuchBucket",):
-            raise
-    # unversioned sweep
+        with ThreadPoolExecutor(max_workers=min(len(ranges), workers)) as pool:
+            for future in [pool.submit(lister, lo, hi) for lo, hi in ranges]:
+                future.result()
+    finally:
+        for _ in deleters:
+            batches.put(None)
+        for t in deleters:
+            t.join()
+
+def empty_bucket(bucket, region=REGION, workers=16, shards=16):
+    """
+    Vacía el bucket: versiones/delete markers, barrido sin versiones y MPUs abiertos.
+    El listado se reparte en rangos de claves (en la raíz y bajo cada prefijo) que se
+    recorren en paralelo, y `workers` hilos van lanzando delete_objects de 1000 claves.
+    """
+    # Pools con sitio para todos los listadores y todos los borradores a la vez
+    s3r = get_client("s3", region, max_pool_connections=max(10, shards))
+    s3d = get_client("s3", region, max_pool_connections=max(10, workers), retries=SINGLE_ATTEMPT)
     try:
-        paginator2 = s3r.get_paginator("list_objects_v2")
-        for page in paginator2.paginate(Bucket=bucket):
-            keys = [{"Key": o["Key"]} for o in page.get("Contents", [])]
-            if keys:
-                for i in range(0, len(keys), 1000):
-                    s3r.delete_objects(Bucket=bucket, Delete={"Objects": keys[i:i+1000], "Quiet": True})
+        ranges = key_ranges(top_level_prefixes(s3r, bucket), shards)
     except ClientError as e:
-        if e.response.get("Error", {}).get("Code") not in ("NoSuchBucket",):
-            raise
+        _ignore_missing(e)
+        return
+    with DeleteProgress(bucket) as progress:
+        # versions/delete markers
+        try:
+            _delete_pass(s3r, s3d, bucket, True, ranges, workers, progress)
+        except ClientError as e:
+            _ignore_missing(e)
+        # unversioned sweep
+        try:
+            _delete_pass(s3r, s3d, bucket, False, ranges, workers, progress)
+        except ClientError as e:
+            _ignore_missing(e)
     # abort MPUs
     try:
         mp = s3r.get_paginator("list_multipart_uploads")
@@ -50,12 +209,14 @@ def empty_bucket(bucket, region=REGION):
             for u in page.get("Uploads", []):
                 s3r.abort_multipart_upload(Bucket=bucket, Key=u["Key"], UploadId=u["UploadId"])
     except ClientError as e:
-        if e.response.get("Error", {}).get("Code") not in ("NoSuchUpload", "NoSuchBucket"):
-            raise
+        _ignore_missing(e, ("NoSuchUpload", "NoSuchBucket"))
 
-def bucket_region(name):
-    loc = s3.get_bucket_location(Bucket=name).get("LocationConstraint")
-    return "us-east-1" if loc in (None, "", "US") else loc
+def bucket_region(name, state=None):
+    def lookup():
+        loc = s3.get_bucket_location(Bucket=name).get("LocationConstraint")
+        return "us-east-1" if loc in (None, "", "US") else loc
+    # La región de un bucket no cambia: se cachea en el registro como atributo derivado
+    return state.cached(f"bucket-region:{name}", name, lookup) if state else lookup()
 
 def delete_event_source_mapping(function_name, queue_arn):
     try:
@@ -68,55 +229,77 @@ def delete_event_source_mapping(function_name, queue_arn):
     except ClientError as e:
         print(f"[Lambda] No se pudo listar/eliminar mapping: {e}")
 
-if __name__ == "__main__":
-    with shelve.open(DB_PATH, flag="r") as db:
-        images_bucket = db.get("images-bucket")
-        thumbs_bucket = db.get("thumbnails-bucket")
-        queue_url = db.get("messages-queue")
-        queue_arn = db.get("messages-queue-arn")
-        table_name = db.get("dynamodb-table")
-        function_name = db.get("lambda-function")
-
-    # 1) Trigger (detach first)
-    if function_name and queue_arn:
-        delete_event_source_mapping(function_name, queue_arn)
-
-    # 2) Lambda
-    if function_name:
-        try:
-            lambda_client.delete_function(FunctionName=function_name)
-            print(f"[Lambda] Función eliminada: {function_name}")
-        except ClientError as e:
-            print(f"[Lambda] Error eliminando función: {e}")
+def delete_function(function_name):
+    try:
+        lambda_client.delete_function(FunctionName=function_name)
+        print(f"[Lambda] Función eliminada: {function_name}")
+    except ClientError as e:
+        print(f"[Lambda] Error eliminando función: {e}")
 
-    # 3) DynamoDB
-    if table_name:
-        try:
-            dynamodb.delete_table(TableName=table_name)
-            print(f"[DDB] Tabla eliminada: {table_name}")
-        except ClientError as e:
-            if e.response.get("Error", {}).get("Code") != "ResourceNotFoundException":
-                print(f"[DDB] Error eliminando tabla: {e}")
+def delete_table(table_name, provisioned=False):
+    if provisioned and autoscaling:
+        # Los objetivos de auto scaling no se borran con la tabla
+        remove_autoscaling(autoscaling, table_name)
+    try:
+        dynamodb.delete_table(TableName=table_name)
+        print(f"[DDB] Tabla eliminada: {table_name}")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ResourceNotFoundException":
+            print(f"[DDB] Error eliminando tabla: {e}")
 
-    # 4) SQS
-    if queue_url:
-        try:
-            sqs.delete_queue(QueueUrl=queue_url)
-            print(f"[SQS] Cola eliminada: {queue_url}")
-        except ClientError as e:
-            print(f"[SQS] Error eliminando cola: {e}")
+def delete_queue(queue_url):
+    try:
+        sqs.delete_queue(QueueUrl=queue_url)
+        print(f"[SQS] Cola eliminada: {queue_url}")
+    except ClientError as e:
+        print(f"[SQS] Error eliminando cola: {e}")
 
-    # 5) S3 buckets (vaciar y borrar)
-    for b in [images_bucket, thumbs_bucket]:
-        if not b:
-            continue
-        try:
-            r = bucket_region(b)
-            print(f"[S3] Vaciando y borrando bucket {b} (region {r})")
-            empty_bucket(b, r)
-            boto3.client("s3", region_name=r).delete_bucket(Bucket=b)
-            print(f"[S3] Bucket eliminado: {b}")
-        except ClientError as e:
-            print(f"[S3] Error eliminando bucket {b}: {e}")
+def delete_bucket(bucket, workers=16, shards=16, state=None):
+    try:
+        r = bucket_region(bucket, state)
+        print(f"[S3] Vaciando y borrando bucket {bucket} (region {r})")
+        empty_bucket(bucket, r, workers=workers, shards=shards)
+        get_client("s3", r).delete_bucket(Bucket=bucket)
+        print(f"[S3] Bucket eliminado: {bucket}")
+    except ClientError as e:
+        print(f"[S3] Error eliminando bucket {bucket}: {e}")
+
+def teardown_steps(resources, workers=16, shards=16, state=None):
+    """
+    Grafo de borrado: el trigger se quita antes que la función y la DLQ después de la cola;
+    tabla, cola y buckets no dependen de nada y se borran a la vez.
+    """
+    function_name = resources.get("lambda-function")
+    queue_arn = resources.get("messages-queue-arn")
+    steps = {}
+    if lambda_client and function_name:
+        deps = []
+        if queue_arn:
+            steps["trigger"] = ([], lambda r: delete_event_source_mapping(function_name, queue_arn))
+            deps = ["trigger"]
+        steps["lambda"] = (deps, lambda r: delete_function(function_name))
+    if resources.get("dynamodb-table"):
+        provisioned = (resources.get("dynamodb-capacity") or {}).get("mode") == "provisioned"
+        steps["table"] = ([], lambda r: delete_table(resources["dynamodb-table"], provisioned))
+    if resources.get("messages-queue"):
+        steps["queue"] = ([], lambda r: delete_queue(resources["messages-queue"]))
+    if resources.get("dead-letter-queue"):
+        # La DLQ después de la cola cuya RedrivePolicy apunta a ella
+        steps["dlq"] = (["queue"] if "queue" in steps else [], lambda r: delete_queue(resources["dead-letter-queue"]))
+    for key in ("images-bucket", "thumbnails-bucket"):
+        bucket = resources.get(key)
+        if bucket:
+            steps[key] = ([], lambda r, b=bucket: delete_bucket(b, workers, shards, state))
+    return steps
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Elimina todos los recursos del pipeline.")
+    parser.add_argument("--workers", type=int, default=16, help="Hilos de delete_objects por bucket")
+    parser.add_argument("--shards", type=int, default=16, help="Rangos de listado en paralelo por prefijo")
+    args = parser.parse_args()
+
+    state = open_state()
+    resources = state.as_dict()
 
+    run_graph(teardown_steps(resources, args.workers, args.shards, state), title="Teardown")
     print("Teardown completo.")
@@ -0,0 +1,23 @@
+"""
+Configuración común de los tests: los módulos del proyecto se importan desde la raíz del
+repositorio y la Lambda desde lambda_function/ con el backend local (sin red ni AWS).
+"""
+import os
+import sys
+import importlib
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def lambda_function(tmp_path_factory):
+    """lambda_function importado como en local_worker.py: backend local en un directorio temporal."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("PIPELINE_BACKEND", "local")
+        mp.setenv("LOCAL_AWS_DIR", str(tmp_path_factory.mktemp("aws")))
+        mp.setenv("THUMB_BUCKET", "test-thumbnails")
+        mp.syspath_prepend(os.path.join(ROOT, "lambda_function"))
+        yield importlib.import_module("lambda_function")
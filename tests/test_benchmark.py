@@ -0,0 +1,15 @@
+from benchmark import percentile, summarize
+
+
+def test_nearest_rank_percentile():
+    values = list(range(1, 101))
+    assert [percentile(values, p) for p in (1, 7, 50, 90, 99, 100)] == [1, 7, 50, 90, 99, 100]
+    assert percentile([5, 1, 3], 50) == 3
+    assert percentile([5, 1, 3], 0) == 1
+    assert percentile([], 50) is None
+
+
+def test_summarize_reports_milliseconds():
+    stats = summarize([0.001, 0.002, 0.003, 0.004])
+    assert stats == {"n": 4, "mean": 2.5, "p50": 2.0, "p90": 4.0, "p99": 4.0, "max": 4.0}
+    assert summarize([]) == {"n": 0}
@@ -0,0 +1,59 @@
+from gallery_manifest import DELTAS_PREFIX, delta_time_ms, merge_into_chunks, settled_deltas, split_entries
+
+
+def entry(key, etag="e"):
+    return [key, 100, 80, "#000000", etag, 0, 0]
+
+
+def test_merge_into_empty_manifest_splits_sorted():
+    updates = {k: entry(k) for k in ("c", "a", "b", "d", "e")}
+    chunks = merge_into_chunks([], updates, shard_size=2)
+    assert [[e[0] for e in chunk] for chunk in chunks] == [["a", "b"], ["c", "d"], ["e"]]
+
+
+def test_merge_only_touches_the_shards_that_receive_entries():
+    chunks = [[entry("a"), entry("c")], [entry("m"), entry("p")], [entry("x")]]
+    merged = merge_into_chunks(chunks, {"n": entry("n"), "0": entry("0")}, shard_size=10)
+    assert [[e[0] for e in chunk] for chunk in merged] == [["0", "a", "c"], ["m", "n", "p"], ["x"]]
+    assert merged[2] is chunks[2]                   # intacto: mismo hash, misma caché
+
+
+def test_merge_updates_existing_entries():
+    chunks = [[entry("a", "old"), entry("b")]]
+    merged = merge_into_chunks(chunks, {"a": entry("a", "new")}, shard_size=10)
+    assert merged == [[entry("a", "new"), entry("b")]]
+
+
+def test_merge_splits_oversized_shards():
+    chunks = [[entry("a")], [entry("m")]]
+    updates = {f"a{n}": entry(f"a{n}") for n in range(5)}
+    merged = merge_into_chunks(chunks, updates, shard_size=2)
+    assert [len(chunk) for chunk in merged] == [2, 2, 2, 1]
+    assert [e[0] for chunk in merged for e in chunk] == ["a", "a0", "a1", "a2", "a3", "a4", "m"]
+
+
+def test_split_entries():
+    assert split_entries(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+    assert split_entries([], 2) == []
+
+
+def delta(ms):
+    return f"{DELTAS_PREFIX}{ms:013d}-abcd1234.json"
+
+
+def test_delta_time_ms():
+    assert delta_time_ms(delta(1700000000123)) == 1700000000123
+    assert delta_time_ms(f"{DELTAS_PREFIX}manual.json") is None
+
+
+def test_settled_deltas_skip_recent_ones():
+    now = 1_700_000_100.0
+    keys = [delta(1_700_000_000_000), delta(1_700_000_039_999), delta(1_700_000_040_000), delta(1_700_000_090_000)]
+    assert settled_deltas(keys, settle_s=60, now=now) == keys[:2]
+    assert settled_deltas(keys, settle_s=0, now=now) == keys
+
+
+def test_settled_deltas_keep_order_and_unnamed_keys():
+    # Un delta sin instante en el nombre cuenta como antiguo
+    keys = [f"{DELTAS_PREFIX}manual.json", delta(1_000)]
+    assert settled_deltas(keys, settle_s=60, now=1_700_000_000.0) == keys
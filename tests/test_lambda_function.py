@@ -0,0 +1,96 @@
+import io
+import json
+import struct
+
+import pytest
+
+
+def encoded(fmt, size=(40, 30), exif=None):
+    Image = pytest.importorskip("PIL.Image")
+    out = io.BytesIO()
+    kwargs = {"exif": exif} if exif is not None else {}
+    Image.new("RGB", size, "red").save(out, fmt, **kwargs)
+    return out.getvalue()
+
+
+def exif_block(orientation, byte_order="II"):
+    """Segmento APP1 (sin marcador ni longitud) con un IFD0 de dos entradas: Make y Orientation."""
+    e = "<" if byte_order == "II" else ">"
+    tiff = byte_order.encode() + struct.pack(e + "HI", 42, 8) + struct.pack(e + "H", 2)
+    tiff += struct.pack(e + "HHI", 0x010F, 2, 4) + b"cam\0"
+    tiff += struct.pack(e + "HHI", 0x0112, 3, 1) + struct.pack(e + "HH", orientation, 0)
+    return b"Exif\0\0" + tiff + b"\0\0\0\0"
+
+
+def with_app1(jpeg, segment):
+    """Inserta un APP1 justo después de SOI, como hacen las cámaras."""
+    return jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(segment) + 2) + segment + jpeg[2:]
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "GIF", "BMP", "WEBP", "JPEG"])
+def test_image_size_from_header(lambda_function, fmt):
+    data = encoded(fmt, (40, 30))
+    assert lambda_function.image_size(data[:lambda_function.HEADER_BYTES]) == (40, 30)
+
+
+def test_image_size_unknown_or_truncated(lambda_function):
+    assert lambda_function.image_size(b"not an image") is None
+    assert lambda_function.image_size(encoded("JPEG")[:20]) is None
+
+
+@pytest.mark.parametrize("orientation, size", [(1, (40, 30)), (3, (40, 30)), (5, (30, 40)),
+                                               (6, (30, 40)), (8, (30, 40))])
+@pytest.mark.parametrize("byte_order", ["II", "MM"])
+def test_jpeg_size_honours_exif_orientation(lambda_function, orientation, size, byte_order):
+    data = with_app1(encoded("JPEG", (40, 30)), exif_block(orientation, byte_order))
+    assert lambda_function.image_size(data) == size
+
+
+def test_jpeg_size_with_exif_written_by_pillow(lambda_function):
+    Image = pytest.importorskip("PIL.Image")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    assert lambda_function.image_size(encoded("JPEG", (40, 30), exif.tobytes())) == (30, 40)
+
+
+def test_exif_orientation_ignores_other_app1_segments(lambda_function):
+    assert lambda_function._exif_orientation(b"http://ns.adobe.com/xap/1.0/\0<x:xmpmeta/>") == 1
+    assert lambda_function._exif_orientation(b"Exif\0\0MM") == 1
+
+
+def test_read_dimensions_falls_back_to_the_header(lambda_function, monkeypatch):
+    # Pillow rechaza el original (p. ej. demasiados píxeles): las dimensiones salen de la cabecera
+    data = encoded("PNG", (40, 30))
+    monkeypatch.setattr(lambda_function.Image, "MAX_IMAGE_PIXELS", 100)
+    assert lambda_function.read_dimensions("src", "big.png", data) == (40, 30, None, 0)
+
+
+def test_parse_message_uploader_formats(lambda_function):
+    parse = lambda body: list(lambda_function.parse_message(body))
+    assert parse({"bucket_name": "b", "image_key": "a.jpg"}) == [("b", "a.jpg", None)]
+    assert parse({"v": 2, "b": "b", "k": ["a.jpg", "c.png"]}) == [("b", "a.jpg", None), ("b", "c.png", None)]
+
+
+def test_parse_message_s3_events(lambda_function):
+    body = {"Records": [
+        {"eventSource": "aws:s3", "eventName": "ObjectCreated:Put", "eventTime": "2025-10-20T10:00:00.500Z",
+         "s3": {"bucket": {"name": "b"}, "object": {"key": "my+photo%281%29.jpg"}}},
+        {"eventSource": "aws:s3", "eventName": "ObjectRemoved:Delete",
+         "s3": {"bucket": {"name": "b"}, "object": {"key": "gone.jpg"}}},
+        {"eventSource": "aws:sns"},
+    ]}
+    assert list(lambda_function.parse_message(body)) == [("b", "my photo(1).jpg", 1760954400500)]
+    assert list(lambda_function.parse_message({"Event": "s3:TestEvent"})) == []
+
+
+def test_parse_message_rejects_unknown_bodies(lambda_function):
+    with pytest.raises(KeyError):
+        list(lambda_function.parse_message(json.loads('{"hello": "world"}')))
+
+
+def test_trace_context(lambda_function):
+    record = {"messageId": "m1", "attributes": {"SentTimestamp": "1760954400900"},
+              "messageAttributes": {"TraceId": {"stringValue": "t1"},
+                                    "UploadedAt": {"stringValue": "1760954400100,,1760954400300"}}}
+    assert lambda_function.trace_context(record) == ("t1", [1760954400100, None, 1760954400300], 1760954400900)
+    assert lambda_function.trace_context({"messageId": "m2"}) == ("m2", [], None)
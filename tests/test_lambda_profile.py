@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from lambda_profile import (
+    DEFAULTS, check_pillow, function_drift, function_environment, mapping_drift, queue_drift, validate,
+)
+
+LAYER = "arn:aws:lambda:us-east-1:123456789012:layer:pillow:1"
+
+
+def profile(**overrides):
+    return validate(dict(DEFAULTS, **overrides))
+
+
+def deployed_function(p):
+    return {"Runtime": p["runtime"], "Timeout": p["timeout_s"], "MemorySize": p["memory_mb"],
+            "Architectures": [p["architecture"]],
+            "Layers": [{"Arn": arn, "CodeSize": 1} for arn in p["layers"]]}
+
+
+def test_function_drift():
+    p = profile(layers=[LAYER])
+    assert function_drift(deployed_function(p), p) == {}
+    assert function_drift(deployed_function(p), dict(p, memory_mb=1024)) == {"MemorySize": 1024}
+    assert function_drift(deployed_function(p), dict(p, architecture="arm64")) == {"Architectures": ["arm64"]}
+    assert function_drift(deployed_function(p), dict(p, layers=[])) == {"Layers": []}
+
+
+def test_function_drift_without_layers_or_architectures():
+    p = profile()
+    config = {"Runtime": p["runtime"], "Timeout": p["timeout_s"], "MemorySize": p["memory_mb"]}
+    assert function_drift(config, p) == {}
+
+
+def test_mapping_drift():
+    p = profile(batch_size=10, max_concurrency=5)
+    deployed = {"BatchSize": 10, "FunctionResponseTypes": ["ReportBatchItemFailures"],
+                "ScalingConfig": {"MaximumConcurrency": 5}}
+    assert mapping_drift(deployed, p) == {}          # sin ventana = 0
+    assert mapping_drift(deployed, dict(p, max_concurrency=None)) == {"ScalingConfig": {}}
+    assert mapping_drift(dict(deployed, BatchSize=3), p) == {"BatchSize": 10}
+
+
+def test_queue_drift():
+    p = profile(timeout_s=30, max_receive_count=5)
+    policy = {"deadLetterTargetArn": "arn:dlq", "maxReceiveCount": 5}   # SQS puede devolver número
+    attributes = {"VisibilityTimeout": "180", "RedrivePolicy": json.dumps(policy)}
+    assert queue_drift(attributes, p, "arn:dlq") == {}
+    drift = queue_drift(attributes, dict(p, max_receive_count=3, timeout_s=60), "arn:dlq")
+    assert drift["VisibilityTimeout"] == "360"
+    assert json.loads(drift["RedrivePolicy"])["maxReceiveCount"] == "3"
+
+
+@pytest.mark.parametrize("overrides", [
+    {"memory_mb": 64},
+    {"batch_size": 50, "batch_window_s": 0},
+    {"dzi_min_megapixels": 0},
+    {"layers": ["not-an-arn"]},
+    {"layers": LAYER},
+    {"unknown": 1},
+])
+def test_validate_rejects(overrides):
+    with pytest.raises(ValueError):
+        profile(**overrides)
+
+
+def test_function_environment():
+    assert function_environment(profile()) == {}
+    assert function_environment(profile(dzi_min_megapixels=50)) == {"DZI_MIN_PIXELS": "50000000"}
+
+
+def test_check_pillow():
+    assert check_pillow(profile(), ["lambda_function.py", "PIL/__init__.py"]) is None
+    assert check_pillow(profile(layers=[LAYER], dzi_min_megapixels=50), ["lambda_function.py"]) is None
+    assert "Pillow" in check_pillow(profile(), ["lambda_function.py"])
+    with pytest.raises(ValueError):
+        check_pillow(profile(dzi_min_megapixels=50), ["lambda_function.py"])
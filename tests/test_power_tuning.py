@@ -0,0 +1,22 @@
+from lambda_profile import DEFAULTS, validate
+from power_tuning import recommended_profile
+
+
+def row(**overrides):
+    return dict({"memory_mb": 1024, "batch_size": 20, "concurrency": 4, "estimated_ms": {"p99": 12000.0}},
+                **overrides)
+
+
+def test_recommended_profile_keeps_max_concurrency():
+    base = validate(dict(DEFAULTS, max_concurrency=50))
+    profile = recommended_profile(base, row())
+    assert profile["max_concurrency"] == 50
+    assert recommended_profile(validate(dict(DEFAULTS)), row(concurrency=8))["max_concurrency"] is None
+
+
+def test_recommended_profile_applies_memory_batch_and_timeout():
+    base = validate(dict(DEFAULTS, batch_window_s=0))
+    profile = recommended_profile(base, row())
+    assert (profile["memory_mb"], profile["batch_size"]) == (1024, 20)
+    assert profile["batch_window_s"] == 1                   # lotes > 10 necesitan ventana
+    assert profile["timeout_s"] == max(base["timeout_s"], 36)
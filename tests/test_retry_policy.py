@@ -0,0 +1,154 @@
+import json
+import time
+
+import boto3
+import pytest
+from botocore.config import Config
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+import retry_policy
+from retry_policy import (
+    SINGLE_ATTEMPT, CircuitBreaker, FailedItemsLog, RetryError, RetryPolicy, backoff_delay, classify,
+)
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": "x"}}, "PutObject")
+
+
+@pytest.mark.parametrize("code, kind", [
+    ("SlowDown", "throttle"),
+    ("ProvisionedThroughputExceededException", "throttle"),
+    ("InternalError", "transient"),
+    ("503", "throttle"),
+    ("AccessDenied", "fatal"),
+    ("NoSuchBucket", "fatal"),
+])
+def test_classify_client_errors(code, kind):
+    assert classify(client_error(code)) == kind
+
+
+def test_classify_network_errors_are_transient():
+    assert classify(ReadTimeoutError(endpoint_url="https://s3.amazonaws.com")) == "transient"
+
+
+def test_classify_wrapped_errors():
+    # S3Transfer sólo conserva el mensaje, o el ClientError como causa
+    assert classify(Exception("An error occurred (SlowDown) when calling the PutObject operation")) == "throttle"
+    try:
+        try:
+            raise client_error("InternalError")
+        except ClientError as e:
+            raise RuntimeError("upload failed") from e
+    except RuntimeError as wrapped:
+        assert classify(wrapped) == "transient"
+    assert classify(ValueError("bad input")) == "fatal"
+
+
+def test_backoff_delay_is_capped_full_jitter():
+    for attempt in range(12):
+        bound = min(20.0, 0.2 * 2 ** attempt)
+        delays = [backoff_delay(attempt) for _ in range(50)]
+        assert all(0 <= d <= bound for d in delays)
+    assert max(backoff_delay(40, base=1.0, cap=5.0) for _ in range(50)) <= 5.0
+
+
+def test_circuit_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(threshold=3, window=10.0, cooldown=0.05)
+    breaker.record_throttle()
+    breaker.record_throttle()
+    start = time.monotonic()
+    breaker.wait_if_open()
+    assert time.monotonic() - start < 0.02          # aún cerrado
+    breaker.record_throttle()
+    start = time.monotonic()
+    breaker.wait_if_open()
+    assert time.monotonic() - start >= 0.04         # abierto durante el cooldown
+
+
+def test_circuit_breaker_doubles_cooldown_when_throttling_continues():
+    breaker = CircuitBreaker(threshold=2, window=10.0, cooldown=0.01, max_cooldown=0.03)
+    for _ in range(2):
+        breaker.record_throttle()
+    breaker.wait_if_open()
+    for _ in range(2):
+        breaker.record_throttle()
+    assert breaker.cooldown == pytest.approx(0.02)
+    breaker.wait_if_open()
+    for _ in range(2):
+        breaker.record_throttle()
+    assert breaker.cooldown == pytest.approx(0.03)  # limitado por max_cooldown
+    breaker.wait_if_open()
+    breaker.record_success()
+    assert breaker.cooldown == pytest.approx(0.01)
+
+
+def test_retry_policy_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(retry_policy.time, "sleep", lambda s: None)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise client_error("InternalError")
+        return "ok"
+
+    assert RetryPolicy(max_attempts=5).call(flaky) == "ok"
+    assert len(calls) == 3
+
+
+def test_retry_policy_gives_up(monkeypatch):
+    monkeypatch.setattr(retry_policy.time, "sleep", lambda s: None)
+    with pytest.raises(RetryError) as info:
+        RetryPolicy(max_attempts=3).call(lambda: (_ for _ in ()).throw(client_error("SlowDown")))
+    assert classify(info.value.last_error) == "throttle"
+    with pytest.raises(ClientError):
+        RetryPolicy(max_attempts=3).call(lambda: (_ for _ in ()).throw(client_error("AccessDenied")))
+
+
+def test_single_attempt_means_one_request():
+    # max_attempts de botocore no cuenta la primera petición; total_max_attempts sí
+    client = boto3.session.Session(region_name="us-east-1").client("s3", config=Config(retries=SINGLE_ATTEMPT))
+    assert client.meta.config.retries["total_max_attempts"] == 1
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_replaying_rewrites_only_what_failed_again(tmp_path):
+    log = FailedItemsLog(str(tmp_path / "failed.jsonl"))
+    for n in range(3):
+        log.record({"key": f"k{n}"}, "SlowDown")
+    with log.replaying() as items:
+        assert [item["key"] for item in items] == ["k0", "k1", "k2"]
+        assert all("error" not in item and "failed_at" not in item for item in items)
+        assert len(read_lines(log.path)) == 3       # el original no cambia durante el replay
+        log.record(items[1], "SlowDown")
+    assert [entry["key"] for entry in read_lines(log.path)] == ["k1"]
+    assert not (tmp_path / "failed.jsonl.replay").exists()
+
+
+def test_replaying_keeps_the_log_when_interrupted(tmp_path):
+    log = FailedItemsLog(str(tmp_path / "failed.jsonl"))
+    for n in range(3):
+        log.record({"key": f"k{n}"}, "SlowDown")
+    with pytest.raises(KeyboardInterrupt):
+        with log.replaying() as items:
+            log.record(items[0], "SlowDown")
+            raise KeyboardInterrupt
+    assert [entry["key"] for entry in read_lines(log.path)] == ["k0", "k1", "k2"]
+    assert not (tmp_path / "failed.jsonl.replay").exists()
+    log.record({"key": "k3"}, "SlowDown")            # record() vuelve a escribir en el fichero real
+    assert len(read_lines(log.path)) == 4
+
+
+def test_replaying_removes_the_log_when_everything_succeeds(tmp_path):
+    log = FailedItemsLog(str(tmp_path / "failed.jsonl"))
+    with log.replaying() as items:
+        assert items == []
+    log.record({"key": "k0"}, "SlowDown")
+    with log.replaying() as items:
+        assert len(items) == 1
+    assert not (tmp_path / "failed.jsonl").exists()
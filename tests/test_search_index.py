@@ -0,0 +1,55 @@
+import struct
+
+from search_index import pack
+
+SIZES = {"u32": 4, "u16": 2, "u8": 1}
+
+
+def items():
+    return [
+        {"ImageID": "b.png", "Bytes": 2048, "ContentType": "image/png", "ProcessedAt": "2025-10-20T10:00:00.000Z",
+         "Width": 70000, "Height": 480},
+        {"ImageID": "a.jpg", "Bytes": 1024, "ContentType": "image/jpeg", "ProcessedAt": "2025-10-20T09:00:00Z",
+         "Width": 640, "Height": 480},
+        {"ImageID": "c.gif", "ContentType": "image/gif"},          # sin dimensiones ni fecha
+    ]
+
+
+def column(data, layout, name, count):
+    kind = layout[name]["type"]
+    fmt = "<" + {"u32": "I", "u16": "H", "u8": "B"}[kind] * count
+    return list(struct.unpack_from(fmt, data, layout[name]["offset"]))
+
+
+def test_columns_are_aligned_to_their_element_size():
+    # 3 filas: sin el orden de mayor a menor tamaño, las columnas u16/u32 quedarían desalineadas
+    data, layout, _, count = pack(items())
+    assert count == 3
+    for name, spec in layout.items():
+        if spec["type"] in SIZES:
+            assert spec["offset"] % SIZES[spec["type"]] == 0, name
+    offsets = sorted(spec["offset"] for spec in layout.values())
+    assert offsets[0] == 0 and len(set(offsets)) == len(offsets)
+
+
+def test_rows_are_sorted_by_name():
+    data, layout, formats, count = pack(items())
+    names = data[layout["names"]["offset"]:layout["names"]["offset"] + layout["names"]["length"]]
+    assert names.decode("utf-8").split("\n") == ["a.jpg", "b.png", "c.gif"]
+    assert column(data, layout, "bytes", count) == [1024, 2048, 0]
+    assert formats == ["image/gif", "image/jpeg", "image/png"]
+    assert column(data, layout, "format", count) == [1, 2, 0]
+
+
+def test_values_saturate_and_default_to_zero():
+    data, layout, _, count = pack(items())
+    assert column(data, layout, "width", count) == [640, 0xFFFF, 0]
+    assert column(data, layout, "height", count) == [480, 480, 0]
+    dates = column(data, layout, "date", count)
+    assert dates[1] - dates[0] == 3600 and dates[2] == 0
+
+
+def test_empty_table():
+    data, layout, formats, count = pack([])
+    assert (data, formats, count) == (b"", [], 0)
+    assert layout["names"] == {"type": "utf8", "offset": 0, "length": 0}
@@ -0,0 +1,50 @@
+from sprite_sheets import plan_sheets
+
+
+def entries(*keys, etag="e"):
+    return [[key, 100, 80, None, f"{etag}-{key}", 0, 0] for key in keys]
+
+
+def keys(sheets):
+    return [[slot[0] if slot else None for slot in slots] for slots in sheets]
+
+
+def index(sheets):
+    """Lo que build() guarda en sprites/index.json (sólo interesan las claves)."""
+    return {"sheets": [{"k": [slot[0] if slot else None for slot in slots]} for slots in sheets]}
+
+
+def test_first_plan_is_sorted_and_chunked():
+    sheets = plan_sheets(None, entries("d", "a", "c", "b", "e"), per_sheet=2)
+    assert keys(sheets) == [["a", "b"], ["c", "d"], ["e"]]
+    assert sheets[0][0] == ("a", "e-a")
+
+
+def test_placed_images_keep_their_slot():
+    previous = index(plan_sheets(None, entries("a", "b", "c"), per_sheet=2))
+    sheets = plan_sheets(previous, entries("0", "a", "b", "c"), per_sheet=2)
+    # "0" ordena antes que todo, pero no desplaza a nadie: va al hueco de la última hoja
+    assert keys(sheets) == [["a", "b"], ["c", "0"]]
+
+
+def test_deleted_images_leave_holes_that_new_ones_fill():
+    previous = index(plan_sheets(None, entries("a", "b", "c", "d"), per_sheet=2))
+    assert keys(plan_sheets(previous, entries("a", "c", "d"), per_sheet=2)) == [["a", None], ["c", "d"]]
+    assert keys(plan_sheets(previous, entries("a", "c", "d", "x", "y"), per_sheet=2)) == [["a", "x"], ["c", "d"], ["y"]]
+
+
+def test_empty_sheets_are_dropped():
+    previous = index(plan_sheets(None, entries("a", "b", "c", "d"), per_sheet=2))
+    assert keys(plan_sheets(previous, entries("c", "d"), per_sheet=2)) == [["c", "d"]]
+
+
+def test_new_etag_is_picked_up_in_place():
+    previous = index(plan_sheets(None, entries("a", "b"), per_sheet=2))
+    sheets = plan_sheets(previous, entries("a", "b", etag="v2"), per_sheet=2)
+    assert sheets == [[("a", "v2-a"), ("b", "v2-b")]]
+
+
+def test_rebuild_ignores_previous_positions():
+    previous = index(plan_sheets(None, entries("a", "b", "c", "d"), per_sheet=2))
+    sheets = plan_sheets(previous, entries("b", "c", "d", "0"), per_sheet=2, rebuild=True)
+    assert keys(sheets) == [["0", "b"], ["c", "d"]]
@@ -0,0 +1,105 @@
+import argparse
+
+import pytest
+from botocore.exceptions import ClientError
+
+import table_schema
+from table_schema import (
+    DEFAULT_CAPACITY, INDEXES, ON_DEMAND, PROVISIONED, add_capacity_arguments, capacity_from_args, ensure_table,
+    table_capacity,
+)
+
+
+class FakeDynamoDB:
+    """Tabla existente en modo `mode` con sólo el primer GSI; el cambio de modo puede fallar."""
+
+    def __init__(self, mode, switch_fails=False):
+        self.mode = mode
+        self.switch_fails = switch_fails
+        self.indexes = [INDEXES[0][0]]
+        self.created = []
+
+    def create_table(self, **kwargs):
+        raise ClientError({"Error": {"Code": "ResourceInUseException"}}, "CreateTable")
+
+    def describe_table(self, TableName):
+        return {"Table": {"TableName": TableName, "TableArn": f"arn:{TableName}", "TableStatus": "ACTIVE",
+                          "BillingModeSummary": {"BillingMode": self.mode},
+                          "GlobalSecondaryIndexes": [{"IndexName": name} for name in self.indexes]}}
+
+    def update_table(self, **kwargs):
+        if "BillingMode" in kwargs:
+            if self.switch_fails:
+                raise ClientError({"Error": {"Code": "LimitExceededException"}}, "UpdateTable")
+            self.mode = kwargs["BillingMode"]
+        for update in kwargs.get("GlobalSecondaryIndexUpdates", []):
+            if "Create" in update:
+                index = update["Create"]
+                if ("ProvisionedThroughput" in index) != (self.mode == "PROVISIONED"):
+                    raise ClientError({"Error": {"Code": "ValidationException"}}, "UpdateTable")
+                self.indexes.append(index["IndexName"])
+                self.created.append(index)
+
+
+class FakeAutoscaling:
+    def __init__(self):
+        self.calls = []
+
+    def register_scalable_target(self, **kwargs):
+        self.calls.append("register")
+
+    def put_scaling_policy(self, **kwargs):
+        self.calls.append("policy")
+
+    def deregister_scalable_target(self, **kwargs):
+        self.calls.append("deregister")
+
+
+@pytest.fixture(autouse=True)
+def no_waits(monkeypatch):
+    monkeypatch.setattr(table_schema, "wait_table_active", lambda dynamodb, name: None)
+
+
+def test_failed_switch_to_on_demand_keeps_provisioned_table_as_is():
+    dynamodb, autoscaling = FakeDynamoDB("PROVISIONED", switch_fails=True), FakeAutoscaling()
+    capacity = dict(DEFAULT_CAPACITY, mode=ON_DEMAND)
+    desc = ensure_table(dynamodb, "T", capacity, autoscaling, log=lambda msg: None)
+    # El GSI que faltaba se crea con ProvisionedThroughput, y el auto scaling no se quita
+    assert "ProvisionedThroughput" in dynamodb.created[0]
+    assert autoscaling.calls == []
+    assert table_capacity(desc, capacity)["mode"] == PROVISIONED
+
+
+def test_failed_switch_to_provisioned_does_not_register_autoscaling():
+    dynamodb, autoscaling = FakeDynamoDB("PAY_PER_REQUEST", switch_fails=True), FakeAutoscaling()
+    capacity = dict(DEFAULT_CAPACITY, mode=PROVISIONED)
+    desc = ensure_table(dynamodb, "T", capacity, autoscaling, log=lambda msg: None)
+    assert "ProvisionedThroughput" not in dynamodb.created[0]
+    assert autoscaling.calls == []
+    assert table_capacity(desc, capacity)["mode"] == ON_DEMAND
+
+
+def test_switch_to_on_demand_removes_autoscaling():
+    dynamodb, autoscaling = FakeDynamoDB("PROVISIONED"), FakeAutoscaling()
+    ensure_table(dynamodb, "T", dict(DEFAULT_CAPACITY, mode=ON_DEMAND), autoscaling, log=lambda msg: None)
+    assert dynamodb.mode == "PAY_PER_REQUEST"
+    assert "ProvisionedThroughput" not in dynamodb.created[0]
+    assert set(autoscaling.calls) == {"deregister"}
+
+
+def parse(*argv):
+    return add_capacity_arguments(argparse.ArgumentParser()).parse_args(argv)
+
+
+def test_capacity_defaults_to_the_stored_one():
+    stored = dict(DEFAULT_CAPACITY, mode=PROVISIONED, write=25, max_write=1000)
+    assert capacity_from_args(parse(), stored) == stored
+    assert capacity_from_args(parse("--write-capacity", "50"), stored)["write"] == 50
+    assert capacity_from_args(parse("--capacity-mode", ON_DEMAND), stored)["mode"] == ON_DEMAND
+    assert capacity_from_args(parse()) == DEFAULT_CAPACITY
+
+
+def test_capacity_from_args_validates():
+    assert capacity_from_args(parse("--read-capacity", "200"))["max_read"] == 200
+    with pytest.raises(ValueError):
+        capacity_from_args(parse("--target-utilization", "95"))
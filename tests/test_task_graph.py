@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from task_graph import run_graph
+
+
+def test_results_flow_along_dependencies():
+    steps = {
+        "bucket": ([], lambda r: "b"),
+        "queue": ([], lambda r: "q"),
+        "trigger": (["bucket", "queue"], lambda r: r["bucket"] + r["queue"]),
+    }
+    assert run_graph(steps) == {"bucket": "b", "queue": "q", "trigger": "bq"}
+
+
+def test_independent_steps_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    steps = {"a": ([], lambda r: barrier.wait()), "b": ([], lambda r: barrier.wait())}
+    run_graph(steps, max_workers=2)                 # en serie, la barrera nunca se abriría
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError, match="desconocidas"):
+        run_graph({"a": (["missing"], lambda r: 1)})
+
+
+def test_cycle_is_reported():
+    steps = {
+        "ok": ([], lambda r: 1),
+        "a": (["b"], lambda r: 1),
+        "b": (["a"], lambda r: 1),
+    }
+    with pytest.raises(ValueError, match="Ciclo"):
+        run_graph(steps)
+
+
+def test_failure_stops_dependents_and_is_raised():
+    ran = []
+
+    def fail(r):
+        raise RuntimeError("boom")
+
+    steps = {
+        "fails": ([], fail),
+        "after": (["fails"], lambda r: ran.append("after")),
+    }
+    with pytest.raises(RuntimeError, match="boom"):
+        run_graph(steps)
+    assert ran == []
+
+
+def test_running_steps_finish_before_the_error_is_raised():
+    release = threading.Event()
+    finished = []
+
+    def fail(r):
+        raise RuntimeError("boom")
+
+    def slow(r):
+        release.wait(5)
+        finished.append("slow")
+
+    def trigger_failure(r):
+        release.set()
+        fail(r)
+
+    steps = {"slow": ([], slow), "fails": ([], trigger_failure)}
+    with pytest.raises(RuntimeError):
+        run_graph(steps, max_workers=2)
+    assert finished == ["slow"]
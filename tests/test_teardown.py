@@ -0,0 +1,25 @@
+from teardown import key_ranges
+
+
+def covers_everything(ranges):
+    return ranges[0][0] == "" and ranges[-1][1] is None and all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def test_flat_bucket_is_split_at_the_root():
+    ranges = key_ranges([], 16)
+    assert len(ranges) == 16
+    assert covers_everything(ranges)
+
+
+def test_prefixes_add_their_own_cut_points():
+    ranges = key_ranges(["thumbnails/", "renditions/"], 16)
+    assert covers_everything(ranges)
+    assert len(ranges) == 48
+    assert {"renditions/", "thumbnails/"} <= {lo for lo, _ in ranges}
+
+
+def test_every_key_falls_in_exactly_one_range():
+    ranges = key_ranges(["thumbnails/"], 8)
+    for key in ("a.jpg", "thumbnails/a.jpg", "thumbnails/~", "~x", "Z", " "):
+        inside = [r for r in ranges if r[0] <= key and (r[1] is None or key < r[1])]
+        assert len(inside) == 1, key
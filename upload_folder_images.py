@@ -1,33 +1,149 @@
 import os
 import json
-import shelve
-import boto3
+import time
+import uuid
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from aws_clients import get_client
+from state_store import open_state
+from retry_policy import SINGLE_ATTEMPT, RetryPolicy, FailedItemsLog
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Mensajes multi-imagen: {"v": 2, "b": "<bucket>", "k": ["clave1", "clave2", ...]}
+MESSAGE_VERSION = 2
+# Límite de SQS (256 KB), dejando margen para los atributos del mensaje
+MAX_MESSAGE_BYTES = 256 * 1024 - 4 * 1024
+# Cada clave añade su instante de subida al atributo UploadedAt: 13 dígitos + ","
+UPLOADED_AT_BYTES = 14
 
 class ImageUploader:
-    def __init__(self, s3_client, sqs_client, queue_url):
+    def __init__(self, s3_client, sqs_client, queue_url, retry_policy=None, failed_log=None, max_workers=1,
+                 send_messages=True, keys_per_message=1):
         self.s3_client = s3_client
         self.sqs_client = sqs_client
-        self.queue_url = queue_url  # pulled from shelve
+        self.queue_url = queue_url  # pulled from the state store
+        self.retry = retry_policy or RetryPolicy()
+        self.failed_log = failed_log or FailedItemsLog()
+        self.max_workers = max_workers
+        # False si el bucket notifica a SQS por sí mismo (setup.py --s3-events)
+        self.send_messages = send_messages
+        # >1: empaqueta varias claves por mensaje (formato v2) hasta MAX_MESSAGE_BYTES
+        self.keys_per_message = keys_per_message
+        self._pending = {}          # bucket -> {"items": [...], "bytes": n}
+        self._lock = threading.Lock()
+        self._failed = 0
 
     def upload_file_to_bucket(self, bucket_name, local_path, s3_key):
-        """Sube un archivo local a un bucket S3."""
+        """Sube un archivo local a un bucket S3 (con reintentos; RetryError si se agotan)."""
+        self.retry.call(self.s3_client.upload_file, local_path, bucket_name, s3_key)
+        print(f"Archivo {local_path} subido a s3://{bucket_name}/{s3_key}")
+
+    def send_message_to_sqs(self, message_dict, uploaded_at=()):
+        """
+        Envía un mensaje JSON a la cola SQS (URL del registro de recursos), con reintentos.
+        Atributos para la traza de punta a punta (ver latency_report.py): TraceId, nuevo por
+        mensaje, y UploadedAt, el instante de subida de cada clave en ms Unix, separados por
+        comas en el orden del cuerpo (vacío si no se conoce, p. ej. en un replay antiguo).
+        """
+        trace_id = uuid.uuid4().hex
+        attributes = {"TraceId": {"DataType": "String", "StringValue": trace_id}}
+        if any(uploaded_at):
+            attributes["UploadedAt"] = {"DataType": "String",
+                                        "StringValue": ",".join(str(t or "") for t in uploaded_at)}
+        response = self.retry.call(
+            self.sqs_client.send_message,
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps(message_dict),
+            MessageAttributes=attributes,
+        )
+        print(f"Mensaje enviado a SQS: {response['MessageId']} (traza {trace_id})")
+
+    def _record_failure(self, item, stage, error):
+        print(f"Error al procesar la imagen {item['local_path']}: {error}")
+        self.failed_log.record(dict(item, stage=stage), error)
+        with self._lock:
+            self._failed += 1
+
+    def _send_batch(self, bucket_name, items):
+        """Envía un mensaje v2 con todas las claves de `items`; si falla, las registra todas."""
         try:
-            self.s3_client.upload_file(local_path, bucket_name, s3_key)
-            print(f"Archivo {local_path} subido a s3://{bucket_name}/{s3_key}")
+            self.send_message_to_sqs(
+                {"v": MESSAGE_VERSION, "b": bucket_name, "k": [i["image_key"] for i in items]},
+                [i.get("uploaded_at") for i in items],
+            )
+            print(f"  ({len(items)} imágenes en el mensaje)")
         except Exception as e:
-            raise Exception(f"Error al subir el archivo {local_path}: {e}")
-
-    def send_message_to_sqs(self, message_dict):
-        """Envía un mensaje JSON a la cola SQS (URL desde shelve)."""
+            for item in items:
+                self._record_failure(item, "send", e)
+
+    def _enqueue(self, item):
+        """Acumula la clave en el mensaje pendiente de su bucket y lo envía cuando se llena."""
+        bucket = item["bucket_name"]
+        key_bytes = len(json.dumps(item["image_key"])) + 1 + UPLOADED_AT_BYTES   # + separador ","
+        ready = None
+        with self._lock:
+            batch = self._pending.get(bucket)
+            if batch and (len(batch["items"]) >= self.keys_per_message
+                          or batch["bytes"] + key_bytes > MAX_MESSAGE_BYTES):
+                ready = self._pending.pop(bucket)["items"]
+                batch = None
+            if batch is None:
+                empty = {"v": MESSAGE_VERSION, "b": bucket, "k": []}
+                batch = self._pending[bucket] = {"items": [], "bytes": len(json.dumps(empty))}
+            batch["items"].append(item)
+            batch["bytes"] += key_bytes
+        if ready:
+            self._send_batch(bucket, ready)
+
+    def flush(self):
+        """Envía los mensajes multi-imagen que quedan a medio llenar."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for bucket, batch in pending.items():
+            self._send_batch(bucket, batch["items"])
+
+    def process_item(self, item):
+        """
+        Sube una imagen y envía (o encola en un mensaje multi-imagen) su mensaje.
+        `item` = {bucket_name, local_path, image_key, stage}; con stage="send" la subida
+        ya se hizo y sólo falta el mensaje (replay). Los fallos van al fichero de fallidos.
+        """
+        stage = item.get("stage", "upload")
         try:
-            response = self.sqs_client.send_message(
-                QueueUrl=self.queue_url,
-                MessageBody=json.dumps(message_dict)
-            )
-            print(f"Mensaje enviado a SQS: {response['MessageId']}")
+            if stage == "upload":
+                self.upload_file_to_bucket(item["bucket_name"], item["local_path"], item["image_key"])
+                # Se guarda en el item: si el envío falla, el replay conserva el instante original
+                item["uploaded_at"] = int(time.time() * 1000)
+                stage = "send"
+            if not self.send_messages:
+                return
+            if self.keys_per_message > 1:
+                self._enqueue(item)
+                return
+            # Mensaje para procesamiento (coincide con tu Lambda: bucket_name + image_key)
+            self.send_message_to_sqs({
+                "bucket_name": item["bucket_name"],
+                "image_key": item["image_key"]
+            }, [item.get("uploaded_at")])
         except Exception as e:
-            raise Exception(f"Error al enviar mensaje a SQS: {e}")
+            self._record_failure(item, stage, e)
+
+    def _run(self, items):
+        self._failed = 0
+        if self.max_workers <= 1:
+            for item in items:
+                self.process_item(item)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                list(pool.map(self.process_item, items))
+        self.flush()
+        failed = self._failed
+        ok = len(items) - failed
+        print(f"Completado: {ok} ok, {failed} fallidos" + (f" (ver {self.failed_log.path})" if failed else ""))
+        return ok, failed
 
     def upload_folder_images(self, bucket_name, path):
         """Sube todas las imágenes de una carpeta a S3 y envía mensajes a SQS."""
@@ -36,65 +152,72 @@ class ImageUploader:
         except FileNotFoundError:
             raise RuntimeError(f"La carpeta local no existe: {path}")
 
-        for file in entries:
-            if file.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
-                try:
-                    local_path = os.path.join(path, file)
-                    s3_key = file
-
-                    # 1) Subir archivo al bucket
-                    self.upload_file_to_bucket(bucket_name, local_path, s3_key)
-
-                    # 2) Enviar mensaje para procesamiento (coincide con tu Lambda: bucket_name + image_key)
-                    message = {
-                        "bucket_name": bucket_name,
-                        "image_key": s3_key
-                    }
-                    self.send_message_to_sqs(message)
-
-                except Exception as e:
-                    print(f"Error al procesar la imagen {file}: {e}")
+        items = [
+            {"bucket_name": bucket_name, "local_path": os.path.join(path, file), "image_key": file}
+            for file in entries
+            if file.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        return self._run(items)
+
+    def replay_failed(self):
+        """
+        Reintenta los elementos del fichero de fallidos. Al terminar, el fichero queda sólo con
+        los que vuelven a fallar; si se interrumpe, no se pierde ninguno.
+        """
+        with self.failed_log.replaying() as items:
+            if not items:
+                print(f"No hay elementos pendientes en {self.failed_log.path}")
+                return 0, 0
+            print(f"Reprocesando {len(items)} elementos de {self.failed_log.path}")
+            return self._run(items)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sube las imágenes de una carpeta a S3 y encola su procesamiento.")
+    parser.add_argument("--folder", default="img", help="Carpeta local con imágenes (por defecto: img)")
+    parser.add_argument("--workers", type=int, default=4, help="Subidas concurrentes (por defecto: 4)")
+    parser.add_argument("--failed-file", default="failed_uploads.jsonl", help="Fichero de elementos fallidos")
+    parser.add_argument(
+        "--keys-per-message", type=int, default=1,
+        help="Claves por mensaje SQS (>1 usa mensajes multi-imagen hasta 256 KB; por defecto: 1)",
+    )
+    parser.add_argument("--replay", action="store_true", help="Reprocesar sólo los elementos del fichero de fallidos")
+    args = parser.parse_args()
+
     # Cargar variables de entorno (opcional)
     load_dotenv()
 
-    # --- Recuperar recursos desde shelve ---
-    with shelve.open("aws_resources.db", flag="r") as db:
+    # --- Recuperar recursos del registro (state_store) ---
+    with open_state() as db:
         queue_url = db.get("messages-queue")       # SQS QueueUrl
         images_bucket = db.get("images-bucket")    # S3 bucket para uploads
+        s3_events = db.get("s3-event-notifications", False)
 
     if not queue_url:
-        raise RuntimeError("Falta 'messages-queue' (QueueUrl) en aws_resources.db.")
+        raise RuntimeError(f"Falta 'messages-queue' (QueueUrl) en el entorno '{db.env}' de {db.path}.")
     if not images_bucket:
-        raise RuntimeError("Falta 'images-bucket' (nombre del bucket) en aws_resources.db.")
-
-    # --- Clientes AWS (boto3) ---
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        aws_session_token=os.getenv("AWS_SESSION_TOKEN"),
-        region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
-    )
-    sqs_client = boto3.client(
-        "sqs",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        aws_session_token=os.getenv("AWS_SESSION_TOKEN"),
-        region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
+        raise RuntimeError(f"Falta 'images-bucket' (nombre del bucket) en el entorno '{db.env}' de {db.path}.")
+
+    # --- Clientes AWS (boto3, o locales con PIPELINE_BACKEND=local) ---
+    # Cada upload_file puede abrir varias conexiones: pool holgado respecto a --workers.
+    # Los reintentos los hace RetryPolicy: botocore, un solo intento por llamada.
+    s3_client = get_client("s3", max_pool_connections=max(10, args.workers * 2), retries=SINGLE_ATTEMPT)
+    sqs_client = get_client("sqs", max_pool_connections=max(10, args.workers), retries=SINGLE_ATTEMPT)
+
+    # Instanciar uploader con QueueUrl del registro
+    uploader = ImageUploader(
+        s3_client, sqs_client, queue_url,
+        failed_log=FailedItemsLog(args.failed_file),
+        max_workers=args.workers,
+        send_messages=not s3_events,
+        keys_per_message=args.keys_per_message,
     )
 
-    # Instanciar uploader con QueueUrl desde shelve
-    uploader = ImageUploader(s3_client, sqs_client, queue_url)
-
-    # Carpeta local y bucket desde shelve
-    local_folder = "img"
-    bucket_name = images_bucket
-
-    # Subir imágenes y enviar mensajes
-    uploader.upload_folder_images(bucket_name, local_folder)
+    if args.replay:
+        uploader.replay_failed()
+    else:
+        # Subir imágenes y enviar mensajes
+        uploader.upload_folder_images(images_bucket, args.folder)
 
 
 
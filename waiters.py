@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Esperas compartidas por los scripts de provisionado.
+
+En lugar de sondear cada N segundos fijos (o reintentar para siempre), todas las esperas
+usan backoff exponencial con jitter, un plazo máximo global y registran cada cambio de
+estado del recurso:
+
+    [Wait] ImageProcessingFunction: Pending/InProgress (0.0s)
+    [Wait] ImageProcessingFunction: Active/Successful (4.7s)
+
+- wait_for(check, ...): espera genérica; check() devuelve (listo, estado).
+- retry_on_conflict(fn, ...): reintenta fn mientras AWS responda con un conflicto
+  ("hay otra actualización en curso").
+- wait_lambda_ready / wait_table_active / wait_bucket_exists / wait_queue_exists /
+  wait_mapping_ready: esperas concretas de cada recurso.
+"""
+import time
+import random
+from botocore.exceptions import ClientError
+
+from retry_policy import error_code
+
+DEFAULT_TIMEOUT = 300
+CONFLICT_CODES = ("ResourceConflictException", "ResourceInUseException")
+
+
+class WaitTimeout(TimeoutError):
+    """El recurso no llegó al estado esperado dentro del plazo."""
+
+    def __init__(self, message, last_state=None):
+        super().__init__(message)
+        self.last_state = last_state
+
+
+def next_delay(attempt, initial=0.5, max_delay=10.0):
+    """Backoff exponencial con "equal jitter": entre d/2 y d, con d = min(max, initial * 2^n)."""
+    delay = min(max_delay, initial * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _sleep_within(deadline, delay):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return False
+    time.sleep(min(delay, remaining))
+    return True
+
+
+def wait_for(check, description, timeout=DEFAULT_TIMEOUT, initial=0.5, max_delay=10.0, log=print):
+    """
+    Llama a check() hasta que devuelva (True, estado). Cada estado distinto del anterior se
+    registra con el tiempo transcurrido. check() puede lanzar para abortar (p. ej. estado
+    Failed). Devuelve el último estado; lanza WaitTimeout si se agota el plazo.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    last_state = None
+    attempt = 0
+    while True:
+        done, state = check()
+        if state != last_state:
+            log(f"[Wait] {description}: {state} ({time.monotonic() - start:.1f}s)")
+            last_state = state
+        if done:
+            return state
+        if not _sleep_within(deadline, next_delay(attempt, initial, max_delay)):
+            raise WaitTimeout(
+                f"Tiempo agotado ({timeout}s) esperando a {description} (último estado: {state})",
+                last_state=state,
+            )
+        attempt += 1
+
+
+def retry_on_conflict(fn, *args, description=None, timeout=DEFAULT_TIMEOUT, codes=CONFLICT_CODES,
+                      initial=1.0, max_delay=15.0, log=print, **kwargs):
+    """
+    Ejecuta fn(*args, **kwargs) reintentando con backoff mientras el error sea un conflicto
+    (otra actualización en curso). Cualquier otro error se propaga tal cual.
+    """
+    description = description or getattr(fn, "__name__", "operación")
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except ClientError as e:
+            if error_code(e) not in codes:
+                raise
+            delay = next_delay(attempt, initial, max_delay)
+            log(f"[Wait] {description}: {error_code(e)}, reintento en {delay:.1f}s")
+            if not _sleep_within(deadline, delay):
+                raise WaitTimeout(f"Tiempo agotado ({timeout}s) reintentando {description}", last_state=error_code(e)) from e
+            attempt += 1
+
+
+# ---------- Recursos concretos ----------
+
+def wait_lambda_ready(lambda_client, function_name, timeout=DEFAULT_TIMEOUT):
+    """Espera a State=Active y LastUpdateStatus=Successful; falla en cuanto algo pasa a Failed."""
+    def check():
+        cfg = lambda_client.get_function_configuration(FunctionName=function_name)
+        state = cfg.get("State")
+        update = cfg.get("LastUpdateStatus")
+        if state == "Failed" or update == "Failed":
+            reason = cfg.get("StateReason") or cfg.get("LastUpdateStatusReason", "Unknown")
+            raise RuntimeError(f"La Lambda {function_name} falló: {reason}")
+        return state == "Active" and update in (None, "Successful"), f"{state}/{update}"
+    return wait_for(check, function_name, timeout=timeout)
+
+
+def wait_table_active(dynamodb, table_name, timeout=DEFAULT_TIMEOUT):
+    """Espera a que la tabla y todos sus GSIs estén ACTIVE."""
+    def check():
+        try:
+            desc = dynamodb.describe_table(TableName=table_name)["Table"]
+        except ClientError as e:
+            if error_code(e) == "ResourceNotFoundException":
+                return False, "NOT_FOUND"
+            raise
+        status = desc.get("TableStatus")
+        indexes = [i.get("IndexStatus", "ACTIVE") for i in desc.get("GlobalSecondaryIndexes", [])]
+        pending = sum(1 for s in indexes if s != "ACTIVE")
+        state = status if not pending else f"{status} ({pending} GSI pendientes)"
+        return status == "ACTIVE" and not pending, state
+    return wait_for(check, table_name, timeout=timeout)
+
+
+def wait_bucket_exists(s3, bucket, timeout=60):
+    def check():
+        try:
+            s3.head_bucket(Bucket=bucket)
+            return True, "exists"
+        except ClientError as e:
+            if error_code(e) in ("404", "NoSuchBucket", "NotFound"):
+                return False, "not found"
+            raise
+    return wait_for(check, bucket, timeout=timeout, initial=0.25)
+
+
+def wait_queue_exists(sqs, queue_name, timeout=60):
+    """Espera a que la cola se pueda resolver por nombre (create_queue es eventual). Devuelve su URL."""
+    result = {}
+
+    def check():
+        try:
+            result["url"] = sqs.get_queue_url(QueueName=queue_name)["QueueUrl"]
+            return True, "exists"
+        except ClientError as e:
+            if error_code(e) not in ("AWS.SimpleQueueService.NonExistentQueue", "QueueDoesNotExist"):
+                raise
+            return False, "not found"
+    wait_for(check, queue_name, timeout=timeout, initial=0.25)
+    return result["url"]
+
+
+def wait_mapping_ready(lambda_client, uuid, timeout=DEFAULT_TIMEOUT):
+    """Espera a que un event source mapping salga de Creating/Enabling/Updating/Disabling."""
+    def check():
+        state = lambda_client.get_event_source_mapping(UUID=uuid).get("State")
+        return state in ("Enabled", "Disabled"), state
+    return wait_for(check, f"trigger {uuid}", timeout=timeout)
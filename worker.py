@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Consumidor de larga duración como alternativa a Lambda para backfills grandes.
+
+Lanza un pool de procesos (y opcionalmente varios hilos por proceso, cada uno con su propio
+resource de DynamoDB: ver lambda_function.metadata_table); cada uno hace long polling de
+la cola (WaitTimeSeconds=20, 10 mensajes por receive), pasa el lote a
+lambda_handler, extiende el visibility timeout de los mensajes mientras se procesan y
+borra los terminados con delete_message_batch. Funciona igual con AWS real y con el
+backend local (PIPELINE_BACKEND=local).
+
+Uso:
+  python worker.py                       # un proceso por CPU
+  python worker.py --processes 8 --threads 4
+  python worker.py --drain               # termina cuando la cola queda vacía
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import multiprocessing
+from dotenv import load_dotenv
+
+from aws_clients import get_client
+from lambda_profile import function_environment, load_profile
+from state_store import open_state
+from sqs_event import to_lambda_event, successful_messages
+
+WAIT_TIME_SECONDS = 20
+MAX_MESSAGES = 10
+
+def load_handler(thumbs_bucket, table_name):
+    """Importa lambda_function con las variables de entorno que tendría en Lambda (perfil incluido)."""
+    os.environ["THUMB_BUCKET"] = thumbs_bucket
+    os.environ["TABLE_NAME"] = table_name
+    profile = load_profile()
+    for name, value in function_environment(profile).items():
+        os.environ.setdefault(name, value)
+    # Lambda la define sola; el handler limita con ella el tamaño de lo que decodifica
+    os.environ.setdefault("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", str(profile["memory_mb"]))
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lambda_function"))
+    import lambda_function
+    return lambda_function.lambda_handler
+
+
+class VisibilityHeartbeat(threading.Thread):
+    """Mientras se procesa un lote, renueva su visibility timeout cada timeout/2 segundos."""
+
+    def __init__(self, sqs, queue_url, messages, visibility_timeout):
+        super().__init__(daemon=True)
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.messages = messages
+        self.visibility_timeout = visibility_timeout
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = max(1.0, self.visibility_timeout / 2)
+        while not self._stop_event.wait(interval):
+            try:
+                resp = self.sqs.change_message_visibility_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {"Id": str(i), "ReceiptHandle": m["ReceiptHandle"], "VisibilityTimeout": self.visibility_timeout}
+                        for i, m in enumerate(self.messages)
+                    ],
+                )
+            except Exception as e:
+                # Un fallo puntual (red, throttling) no debe parar el latido: se reintenta en el siguiente
+                print(f"[Worker] Error al extender la visibilidad: {e}")
+                continue
+            for failure in resp.get("Failed", []):
+                print(f"[Worker] No se pudo extender la visibilidad ({failure.get('Code')})")
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def process_messages(sqs, queue_url, queue_arn, region, handler, messages, visibility_timeout):
+    """Procesa un lote con lambda_handler y borra los mensajes sin error. Devuelve (ok, fallidos)."""
+    heartbeat = VisibilityHeartbeat(sqs, queue_url, messages, visibility_timeout)
+    heartbeat.start()
+    try:
+        result = handler(to_lambda_event(messages, queue_arn, region), None)
+    except Exception as e:
+        # Igual que en Lambda: si el handler lanza, todo el lote vuelve a la cola
+        print(f"[Worker] Error en el handler: {e}")
+        result = {"batchItemFailures": [{"itemIdentifier": m["MessageId"]} for m in messages]}
+    finally:
+        heartbeat.stop()
+
+    done = successful_messages(messages, result)
+    if done:
+        resp = sqs.delete_message_batch(
+            QueueUrl=queue_url,
+            Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(done)],
+        )
+        for failure in resp.get("Failed", []):
+            print(f"[Worker] No se pudo borrar el mensaje {failure.get('Id')}: {failure.get('Code')}")
+    return len(done), len(messages) - len(done)
+
+
+def poll_loop(sqs, queue_url, queue_arn, region, handler, visibility_timeout, stop, counters, drain=False,
+              wait_seconds=WAIT_TIME_SECONDS):
+    while not stop.is_set():
+        resp = sqs.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=MAX_MESSAGES,
+            WaitTimeSeconds=wait_seconds,
+            AttributeNames=["All"],
+            MessageAttributeNames=["All"],
+        )
+        messages = resp.get("Messages", [])
+        if not messages:
+            if drain:
+                return
+            continue
+        ok, failed = process_messages(sqs, queue_url, queue_arn, region, handler, messages, visibility_timeout)
+        with counters.get_lock():
+            counters[0] += ok
+            counters[1] += failed
+
+
+def worker_main(config, stop, counters):
+    """Punto de entrada de cada proceso: sus propios clientes, handler e hilos de polling."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # el padre coordina el apagado
+    load_dotenv()
+    handler = load_handler(config["thumbs_bucket"], config["table_name"])
+    sqs = get_client("sqs")
+    region = sqs.meta.region_name
+    threads = [
+        threading.Thread(
+            target=poll_loop,
+            args=(sqs, config["queue_url"], config["queue_arn"], region, handler,
+                  config["visibility_timeout"], stop, counters, config["drain"], config["wait_seconds"]),
+        )
+        for _ in range(config["threads"])
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def queue_visibility_timeout(sqs, queue_url):
+    attrs = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=["VisibilityTimeout"])["Attributes"]
+    return int(attrs.get("VisibilityTimeout", 30))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pool de workers que consume la cola con lambda_handler.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Procesos (por defecto: nº de CPUs)")
+    parser.add_argument("--threads", type=int, default=1, help="Hilos de polling por proceso")
+    parser.add_argument("--visibility-timeout", type=int,
+                        help="Segundos a los que se renueva la visibilidad (por defecto: el de la cola)")
+    parser.add_argument("--wait-seconds", type=int, default=WAIT_TIME_SECONDS, help="Long polling (máx. 20)")
+    parser.add_argument("--drain", action="store_true", help="Terminar cuando la cola esté vacía")
+    args = parser.parse_args()
+
+    load_dotenv()
+    with open_state() as db:
+        config = {
+            "queue_url": db.get("messages-queue"),
+            "queue_arn": db.get("messages-queue-arn", ""),
+            "thumbs_bucket": db.get("thumbnails-bucket"),
+            "table_name": db.get("dynamodb-table"),
+        }
+    if not config["queue_url"] or not config["thumbs_bucket"] or not config["table_name"]:
+        raise RuntimeError(f"Faltan recursos en el entorno '{db.env}' de {db.path}: ejecuta antes 'python setup.py'.")
+
+    config.update(
+        threads=args.threads,
+        drain=args.drain,
+        wait_seconds=args.wait_seconds,
+        visibility_timeout=args.visibility_timeout
+        or queue_visibility_timeout(get_client("sqs"), config["queue_url"]),
+    )
+
+    # spawn: cada proceso crea sus propios clientes boto3 / conexiones SQLite desde cero
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    counters = ctx.Array("q", 2)  # [procesados, fallidos]
+    procs = [ctx.Process(target=worker_main, args=(config, stop, counters)) for _ in range(args.processes)]
+    print(f"[Worker] {args.processes} procesos x {args.threads} hilos sobre {config['queue_url']}")
+    start = time.time()
+    for p in procs:
+        p.start()
+
+    def shutdown(signum, frame):
+        print("\n[Worker] Parando: se terminan los lotes en curso…")
+        stop.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    last = 0
+    while any(p.is_alive() for p in procs):
+        time.sleep(5 if not args.drain else 1)
+        done = counters[0]
+        if done != last:
+            elapsed = time.time() - start
+            print(f"[Worker] {done} mensajes ok, {counters[1]} fallidos ({done / elapsed:.1f} msg/s)")
+            last = done
+    for p in procs:
+        p.join()
+    print(f"[Worker] Fin: {counters[0]} mensajes ok, {counters[1]} fallidos en {time.time() - start:.1f}s")